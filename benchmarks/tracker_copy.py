@@ -0,0 +1,61 @@
+"""Compares copying trackers by sharing their events with replaying them.
+
+Copying a tracker used to replay all of its events into a fresh tracker
+(`travel_back_in_time`). `DialogueStateTracker.copy` shares the events,
+the cached states and the applied events with the copy instead. Like in
+the training data generator, every copy gets updated right away.
+
+    python -m benchmarks.tracker_copy
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import timeit
+
+from rasa_core.actions.action import ACTION_LISTEN_NAME
+from rasa_core.domain import TemplateDomain
+from rasa_core.events import ActionExecuted, UserUttered
+from rasa_core.trackers import DialogueStateTracker
+
+DOMAIN_PATH = "data/test_domains/default_with_topic.yml"
+
+
+def create_tracker(domain, num_turns):
+    tracker = DialogueStateTracker("default", domain.slots,
+                                   domain.topics, domain.default_topic)
+    for _ in range(num_turns):
+        tracker.update(ActionExecuted(ACTION_LISTEN_NAME))
+        tracker.update(UserUttered("/greet", {"name": "greet"}, []))
+        tracker.update(ActionExecuted("utter_greet"))
+    # fills the cached states, like featurizing the tracker does
+    tracker.past_states(domain)
+    return tracker
+
+
+def copy_and_update(tracker, copy):
+    duplicate = copy(tracker)
+    duplicate.update(ActionExecuted("utter_goodbye"))
+
+
+def main():
+    domain = TemplateDomain.load(DOMAIN_PATH)
+    number = 200
+
+    print("{:>8} {:>14} {:>14}".format("events", "replay [ms]", "share [ms]"))
+    for num_turns in [10, 100, 1000]:
+        tracker = create_tracker(domain, num_turns)
+        timings = []
+        for copy in [lambda t: t.travel_back_in_time(float("inf")),
+                     lambda t: t.copy()]:
+            seconds = timeit.timeit(lambda: copy_and_update(tracker, copy),
+                                    number=number)
+            timings.append(1000 * seconds / number)
+        print("{:>8} {:>14.3f} {:>14.3f}".format(len(tracker.events),
+                                                 *timings))
+
+
+if __name__ == '__main__':
+    main()
@@ -27,6 +27,7 @@ logger = logging.getLogger(__name__)
 
 if typing.TYPE_CHECKING:
     from rasa_core.interpreter import NaturalLanguageInterpreter as NLI
+    from rasa_core.processor import PredictionRequest
 
 
 class Agent(object):
@@ -53,10 +54,14 @@ class Agent(object):
              path,  # type: Text
              interpreter=None,  # type: Union[NLI, Text, None]
              tracker_store=None,  # type: Optional[TrackerStore]
-             action_factory=None  # type: Optional[Text]
+             action_factory=None,  # type: Optional[Text]
+             lazy_policy_loading=False  # type: bool
              ):
         # type: (Text, Any, Optional[TrackerStore]) -> Agent
-        """Load a persisted model from the passed path."""
+        """Load a persisted model from the passed path.
+
+        If `lazy_policy_loading` is set, slow to load policies are loaded
+        in the background, see `PolicyEnsemble.load`."""
 
         if path is None:
             raise ValueError("No domain path specified.")
@@ -70,7 +75,7 @@ class Agent(object):
                              "a model, use `agent.load_data(...)` "
                              "instead.".format(path))
 
-        ensemble = PolicyEnsemble.load(path)
+        ensemble = PolicyEnsemble.load(path, lazy=lazy_policy_loading)
         domain = TemplateDomain.load(os.path.join(path, "domain.yml"),
                                      action_factory)
         # ensures the domain hasn't changed between test and train
@@ -134,6 +139,40 @@ class Agent(object):
                                                    executed_action,
                                                    events)
 
+    def handle_prediction_requests(self, requests):
+        # type: (List[PredictionRequest]) -> List[Any]
+        """Handle the prediction requests of several conversations.
+
+        The next actions of all conversations are predicted in a single
+        batch. Returns the response of every request in the same format
+        as `start_message_handling` and `continue_message_handling`, a
+        request that failed gets the raised exception instead."""
+
+        processor = self._create_processor()
+        return processor.handle_prediction_requests(requests)
+
+    def predict_next_actions(self, trackers):
+        # type: (List[DialogueStateTracker]) -> List[Text]
+        """Predicts the next action of several conversations at once.
+
+        All trackers are featurized together and every policy predicts
+        them with a single call of its model. Follow up actions that are
+        set on a tracker are returned (and cleared) instead of a
+        prediction, the same way as during message handling.
+
+        :Example:
+
+            >>> trackers = [agent.tracker_store.retrieve(sender_id)
+            ...             for sender_id in ["alice", "bob"]]
+            >>> agent.predict_next_actions(trackers)
+            ['utter_greet', 'action_listen']
+
+        """
+
+        processor = self._create_processor()
+        return [action.name()
+                for action in processor.predict_next_actions(trackers)]
+
     def handle_channel(self, input_channel,
                        message_preprocessor=None):
         # type: (InputChannel, Optional[Callable[[Text], Text]]) -> None
@@ -165,14 +204,17 @@ class Agent(object):
                   augmentation_factor=20,  # type: int
                   max_number_of_trackers=2000,  # type: int
                   tracker_limit=None,  # type: Optional[int]
-                  use_story_concatenation=True  # type: bool
+                  use_story_concatenation=True,  # type: bool
+                  num_workers=1,  # type: int
+                  cache_dir=None  # type: Optional[Text]
                   ):
         # type: (...) -> List[DialogueStateTracker]
         """Load training data from a resource."""
 
         return training.load_data(resource_name, self.domain, remove_duplicates,
                                   augmentation_factor, max_number_of_trackers,
-                                  tracker_limit, use_story_concatenation)
+                                  tracker_limit, use_story_concatenation,
+                                  num_workers, cache_dir)
 
     def train(self,
               training_trackers,  # type: List[DialogueStateTracker]
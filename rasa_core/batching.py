@@ -0,0 +1,238 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import logging
+import threading
+import time
+from collections import deque
+
+from typing import Any, Callable, Dict, List, Optional, Text
+
+logger = logging.getLogger(__name__)
+
+
+class ScheduledRequest(object):
+    """A request submitted to the `MicroBatchScheduler`.
+
+    Once the batch of the request got processed, `result` or
+    `exception` are set and the callback of the request is called."""
+
+    def __init__(self,
+                 sender_id,  # type: Text
+                 request,  # type: Any
+                 callback=None  # type: Optional[Callable]
+                 ):
+        # type: (...) -> None
+        self.sender_id = sender_id
+        self.request = request
+        self.callback = callback
+        self.submitted_at = time.time()
+        self.result = None
+        self.exception = None
+        self._done = threading.Event()
+
+    def finish(self, result=None, exception=None):
+        # type: (Any, Optional[Exception]) -> None
+        self.result = result
+        self.exception = exception
+        self._done.set()
+
+        if self.callback is not None:
+            try:
+                self.callback(self)
+            except Exception as e:
+                logger.exception("Failed to run the callback of a request "
+                                 "of sender '{}': {}".format(self.sender_id, e))
+
+    def wait(self, timeout=None):
+        # type: (Optional[float]) -> Any
+        """Blocks until the request got processed and returns its result.
+
+        Raises the exception of the request if processing it failed."""
+
+        if not self._done.wait(timeout):
+            raise RuntimeError("Request of sender '{}' wasn't processed "
+                               "within {} seconds.".format(self.sender_id,
+                                                           timeout))
+        if self.exception is not None:
+            raise self.exception
+        return self.result
+
+
+class MicroBatchScheduler(object):
+    """Collects requests and processes them in batches on worker threads.
+
+    A batch is processed as soon as `max_batch_size` requests can be
+    batched or the oldest waiting request is queued for `max_latency`
+    seconds. A batch contains at most one request per sender and the
+    requests of a sender are processed one after another in the order
+    they were submitted, while requests of different senders are
+    processed by `num_workers` threads in parallel.
+
+    `process_batch` gets the list of requests of a batch and returns
+    their results in the same order. A result that is an exception
+    marks the request as failed."""
+
+    def __init__(self,
+                 process_batch,  # type: Callable[[List[Any]], List[Any]]
+                 max_batch_size=32,  # type: int
+                 max_latency=0.01,  # type: float
+                 num_workers=4  # type: int
+                 ):
+        # type: (...) -> None
+
+        self.process_batch = process_batch
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency
+
+        self.num_batches = 0
+        self.num_processed = 0
+        self.last_batch_size = 0
+        self.largest_batch_size = 0
+
+        # queued requests of every sender, in the order they were submitted
+        self._queues = {}  # type: Dict[Text, deque]
+        # senders with a request in a batch that is currently processed
+        self._busy_senders = set()
+        self._condition = threading.Condition()
+        self._stopped = False
+
+        self._workers = []
+        for i in range(num_workers):
+            worker = threading.Thread(target=self._work,
+                                      name="batch-worker-{}".format(i))
+            worker.daemon = True
+            worker.start()
+            self._workers.append(worker)
+
+    def submit(self, sender_id, request, callback=None):
+        # type: (Text, Any, Optional[Callable]) -> ScheduledRequest
+        """Queues a request, `callback` gets called once it got processed.
+
+        The callback is called with the `ScheduledRequest` from the
+        thread that processed the batch."""
+
+        scheduled = ScheduledRequest(sender_id, request, callback)
+        with self._condition:
+            if self._stopped:
+                raise RuntimeError("Can't submit a request to a scheduler "
+                                   "that has been stopped.")
+            self._queues.setdefault(sender_id, deque()).append(scheduled)
+            self._condition.notify()
+        return scheduled
+
+    def stop(self):
+        # type: () -> None
+        """Processes the queued requests and stops the workers."""
+
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+        for worker in self._workers:
+            worker.join()
+
+    @property
+    def queue_depth(self):
+        # type: () -> int
+        """Number of requests waiting to be processed."""
+
+        with self._condition:
+            return sum(len(q) for q in self._queues.values())
+
+    def metrics(self):
+        # type: () -> Dict[Text, Any]
+        """Returns the current queue depth and the sizes of the batches."""
+
+        with self._condition:
+            if self.num_batches:
+                avg_batch_size = self.num_processed / self.num_batches
+            else:
+                avg_batch_size = 0.0
+            return {
+                "queue_depth": sum(len(q) for q in self._queues.values()),
+                "num_batches": self.num_batches,
+                "num_processed": self.num_processed,
+                "last_batch_size": self.last_batch_size,
+                "largest_batch_size": self.largest_batch_size,
+                "avg_batch_size": avg_batch_size
+            }
+
+    def _work(self):
+        # type: () -> None
+
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            self._process(batch)
+
+    def _ready_requests(self):
+        # type: () -> List[ScheduledRequest]
+        """The oldest request of every sender that isn't busy, oldest first."""
+
+        ready = [queue[0] for sender_id, queue in self._queues.items()
+                 if sender_id not in self._busy_senders]
+        return sorted(ready, key=lambda r: r.submitted_at)
+
+    def _next_batch(self):
+        # type: () -> Optional[List[ScheduledRequest]]
+        """Waits until a batch is ready and removes it from the queues.
+
+        Returns `None` once the scheduler is stopped and all requests
+        got processed."""
+
+        with self._condition:
+            while True:
+                ready = self._ready_requests()
+                timeout = None
+                if ready:
+                    waited = time.time() - ready[0].submitted_at
+                    if (len(ready) >= self.max_batch_size or
+                            waited >= self.max_latency or self._stopped):
+                        return self._take(ready[:self.max_batch_size])
+                    timeout = self.max_latency - waited
+                elif self._stopped and not self._queues:
+                    return None
+
+                self._condition.wait(timeout)
+
+    def _take(self, batch):
+        # type: (List[ScheduledRequest]) -> List[ScheduledRequest]
+
+        for scheduled in batch:
+            queue = self._queues[scheduled.sender_id]
+            queue.popleft()
+            if not queue:
+                del self._queues[scheduled.sender_id]
+            self._busy_senders.add(scheduled.sender_id)
+        return batch
+
+    def _process(self, batch):
+        # type: (List[ScheduledRequest]) -> None
+
+        try:
+            results = self.process_batch([r.request for r in batch])
+        except Exception as e:
+            logger.exception("Failed to process batch of {} requests: {}"
+                             "".format(len(batch), e))
+            results = [e] * len(batch)
+
+        # results are set before the senders are released, so the
+        # callbacks of a sender are called in the order of its requests
+        for scheduled, result in zip(batch, results):
+            if isinstance(result, Exception):
+                scheduled.finish(exception=result)
+            else:
+                scheduled.finish(result)
+
+        with self._condition:
+            self.num_batches += 1
+            self.num_processed += len(batch)
+            self.last_batch_size = len(batch)
+            self.largest_batch_size = max(self.largest_batch_size,
+                                          len(batch))
+            for scheduled in batch:
+                self._busy_senders.discard(scheduled.sender_id)
+            self._condition.notify_all()
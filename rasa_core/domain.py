@@ -290,8 +290,7 @@ class Domain(with_metaclass(abc.ABCMeta, object)):
     def states_for_tracker_history(self, tracker):
         # type: (DialogueStateTracker) -> List[Dict[Text, float]]
         """Array of states for each state of the trackers history."""
-        return [self.get_active_states(tr) for tr in
-                tracker.generate_all_prior_trackers()]
+        return tracker.past_states(self)
 
     def slots_for_entities(self, entities):
         if self.store_entities_as_slots:
@@ -15,7 +15,8 @@ from builtins import str
 
 from rasa_core import utils
 from rasa_core.events import ActionExecuted
-from rasa_core.training.data import DialogueTrainingData
+from rasa_core.training.data import (
+    DialogueTrainingData, DialogueTrainingDataBatches)
 
 from rasa_core.actions.action import ACTION_LISTEN_NAME
 from rasa_core.domain import PREV_PREFIX
@@ -51,6 +52,20 @@ class SingleStateFeaturizer(object):
                                   "the capacity to "
                                   "encode states to a feature vector")
 
+    def encode_sparse(self, states):
+        # type: (Optional[Text, float]) -> Tuple[np.ndarray, np.ndarray]
+        """Returns the indices and values of the non zero features."""
+
+        encoded = self.encode(states)
+        indices = np.nonzero(encoded)[0]
+        return indices, encoded[indices]
+
+    def encode_batch(self, states_batch):
+        # type: (List[Optional[Dict[Text, float]]]) -> np.ndarray
+        """Encodes several states at once, one state per row."""
+
+        return np.array([self.encode(states) for states in states_batch])
+
     @staticmethod
     def action_as_one_hot(action, domain):
         # type: (Optional[Text, float], Domain) -> np.ndarray
@@ -115,45 +130,118 @@ class BinarySingleStateFeaturizer(SingleStateFeaturizer):
         else:
             # we are going to use floats and convert to int later if possible
             used_features = np.zeros(self.num_features, dtype=float)
-            using_only_ints = True
-            best_intent = None
-            best_intent_prob = 0.0
-
-            for state_name, prob in states.items():
-                if state_name.startswith('intent_'):
-                    if prob >= best_intent_prob:
-                        best_intent = state_name
-                        best_intent_prob = prob
-                elif state_name in self.input_state_map:
-                    if prob != 0.0:
-                        idx = self.input_state_map[state_name]
-                        used_features[idx] = prob
-                        using_only_ints = using_only_ints and utils.is_int(prob)
-                else:
-                    logger.debug(
-                            "Feature '{}' (value: '{}') could not be found in "
-                            "feature map. Make sure you added all intents and "
-                            "entities to the domain".format(state_name, prob))
-
-            if best_intent is not None:
-                # finding the maximum confidence intent and
-                # appending it to the states val
-                index_in_feature_list = self.input_state_map.get(best_intent)
-                if index_in_feature_list is not None:
-                    used_features[index_in_feature_list] = 1
-                else:
-                    logger.warning(
-                            "Couldn't set most probable feature '{}', "
-                            "it wasn't found in the feature list of the domain."
-                            " Make sure you added all intents and "
-                            "entities to the domain.".format(best_intent))
-
-            if using_only_ints:
+            active_features = self._active_features(states)
+            for idx, prob in active_features.items():
+                used_features[idx] = prob
+
+            if all(utils.is_int(prob) for prob in active_features.values()):
                 # this is an optimization - saves us a bit of memory
                 return used_features.astype(np.int32)
             else:
                 return used_features
 
+    def encode_sparse(self, states):
+        # type: (Optional[Text, float]) -> Tuple[np.ndarray, np.ndarray]
+        """Returns the indices and values of the active features.
+
+        Same as `encode`, but without creating a vector with an entry
+        for every feature of the domain."""
+
+        if not self.num_features:
+            raise Exception("BinarySingleStateFeaturizer "
+                            "was not prepared "
+                            "before encoding.")
+
+        if states is None or None in states:
+            return (np.arange(self.num_features),
+                    np.ones(self.num_features, dtype=np.int32) * -1)
+        else:
+            active_features = self._active_features(states)
+            indices = np.array(sorted(active_features), dtype=int)
+            values = np.array([active_features[idx] for idx in indices],
+                              dtype=float)
+            return indices, values
+
+    def encode_batch(self, states_batch):
+        # type: (List[Optional[Dict[Text, float]]]) -> np.ndarray
+        """Encodes several states at once, one state per row.
+
+        Collects the indices and values of the active features of all
+        states first and writes them into the resulting matrix in one go,
+        instead of creating a vector for every single state."""
+
+        if not self.num_features:
+            raise Exception("{} was not prepared before encoding."
+                            "".format(self.__class__.__name__))
+
+        rows = []
+        columns = []
+        values = []
+        padding_rows = []
+
+        for i, states in enumerate(states_batch):
+            if states is None or None in states:
+                padding_rows.append(i)
+            else:
+                active_features = self._active_features(states)
+                rows.extend([i] * len(active_features))
+                columns.extend(active_features.keys())
+                values.extend(active_features.values())
+
+        X = np.zeros((len(states_batch), self.num_features),
+                     dtype=self._batch_dtype(values))
+        X[rows, columns] = values
+        X[padding_rows] = -1
+        return X
+
+    @staticmethod
+    def _batch_dtype(values):
+        # type: (List[float]) -> type
+        """Same dtype `encode` chooses for states with these values."""
+
+        if all(utils.is_int(value) for value in values):
+            return np.int32
+        else:
+            return float
+
+    def _active_features(self, states):
+        # type: (Dict[Text, float]) -> Dict[int, float]
+        """Returns the values of the active features by their index."""
+
+        active_features = {}
+        best_intent = None
+        best_intent_prob = 0.0
+
+        for state_name, prob in states.items():
+            if state_name.startswith('intent_'):
+                if prob >= best_intent_prob:
+                    best_intent = state_name
+                    best_intent_prob = prob
+            elif state_name in self.input_state_map:
+                if prob != 0.0:
+                    idx = self.input_state_map[state_name]
+                    active_features[idx] = prob
+            else:
+                logger.debug(
+                        "Feature '{}' (value: '{}') could not be found in "
+                        "feature map. Make sure you added all intents and "
+                        "entities to the domain".format(state_name, prob))
+
+        if best_intent is not None:
+            # finding the maximum confidence intent and
+            # appending it to the states val
+            index_in_feature_list = self.input_state_map.get(best_intent)
+            if index_in_feature_list is not None:
+                active_features[index_in_feature_list] = 1
+            else:
+                logger.warning(
+                        "Couldn't set most probable feature '{}', "
+                        "it wasn't found in the feature list of the domain."
+                        " Make sure you added all intents and "
+                        "entities to the domain.".format(best_intent))
+
+        return active_features
+
     def create_encoded_all_actions(self, domain):
         # type: (Domain) -> np.ndarray
         """Create matrix with all actions from domain
@@ -192,16 +280,30 @@ class ProbabilisticSingleStateFeaturizer(BinarySingleStateFeaturizer):
         else:
 
             used_features = np.zeros(self.num_features, dtype=np.float)
-            for state, value in states.items():
-                if state in self.input_state_map:
-                    idx = self.input_state_map[state]
-                    used_features[idx] = value
-                else:
-                    logger.debug(
-                            "Found feature not in feature map. "
-                            "Name: {} Value: {}".format(state, value))
+            for idx, value in self._active_features(states).items():
+                used_features[idx] = value
             return used_features
 
+    def _active_features(self, states):
+        # type: (Dict[Text, float]) -> Dict[int, float]
+        """Returns the values of the active features by their index."""
+
+        active_features = {}
+        for state, value in states.items():
+            if state in self.input_state_map:
+                if value != 0.0:
+                    active_features[self.input_state_map[state]] = value
+            else:
+                logger.debug(
+                        "Found feature not in feature map. "
+                        "Name: {} Value: {}".format(state, value))
+        return active_features
+
+    @staticmethod
+    def _batch_dtype(values):
+        # type: (List[float]) -> type
+        return float
+
 
 class LabelTokenizerSingleStateFeaturizer(SingleStateFeaturizer):
     """SingleStateFeaturizer that splits user intents and
@@ -231,6 +333,10 @@ class LabelTokenizerSingleStateFeaturizer(SingleStateFeaturizer):
         self.bot_vocab = None
         self.user_vocab = None
 
+        # feature indices of the tokens of every state
+        self.user_label_tokens = None
+        self.state_tokens = None
+
     @staticmethod
     def _create_label_token_dict(labels, split_symbol='_'):
         """Splits labels into tokens by using provided symbol.
@@ -269,6 +375,32 @@ class LabelTokenizerSingleStateFeaturizer(SingleStateFeaturizer):
         self.user_feature_len = len(self.user_vocab)
         self.slot_feature_len = len(self.slot_labels)
 
+        self._create_token_tables()
+
+    def _create_token_tables(self):
+        # type: () -> None
+        """Looks up the feature indices of the tokens of every state.
+
+        User labels are kept apart, as they are only used
+        if the previous action was to listen."""
+
+        self.user_label_tokens = {
+            label: [self.user_vocab[t]
+                    for t in label.split(self.split_symbol)]
+            for label in self.user_labels}
+
+        self.state_tokens = {}
+        bot_offset = len(self.user_vocab) + len(self.slot_labels)
+        for action_name in self.bot_labels:
+            self.state_tokens[PREV_PREFIX + action_name] = [
+                bot_offset + self.bot_vocab[t]
+                for t in action_name.split(self.split_symbol)]
+
+        # slots take precedence over actions with the same state name
+        slot_offset = len(self.user_vocab)
+        for idx, slot_label in enumerate(self.slot_labels):
+            self.state_tokens[slot_label] = [slot_offset + idx]
+
     def encode(self, states):
         # type: (Optional[Text, float]) -> np.ndarray
         if not self.num_features:
@@ -279,32 +411,66 @@ class LabelTokenizerSingleStateFeaturizer(SingleStateFeaturizer):
             return np.ones(self.num_features, dtype=int) * -1
 
         used_features = np.zeros(self.num_features, dtype=int)
-        for state_name, prob in states.items():
+        np.add.at(used_features, self._active_tokens(states), 1)
+        return used_features
+
+    def encode_batch(self, states_batch):
+        # type: (List[Optional[Dict[Text, float]]]) -> np.ndarray
+        """Encodes several states at once, one state per row.
+
+        Collects the token indices of all states first and counts them
+        in the resulting matrix in one go."""
+
+        if not self.num_features:
+            raise Exception("LabelTokenizerSingleStateFeaturizer "
+                            "was not prepared before encoding.")
+
+        rows = []
+        columns = []
+        padding_rows = []
+
+        for i, states in enumerate(states_batch):
+            if states is None or None in states:
+                padding_rows.append(i)
+            else:
+                tokens = self._active_tokens(states)
+                rows.extend([i] * len(tokens))
+                columns.extend(tokens)
+
+        X = np.zeros((len(states_batch), self.num_features), dtype=int)
+        np.add.at(X, (rows, columns), 1)
+        X[padding_rows] = -1
+        return X
+
+    def _active_tokens(self, states):
+        # type: (Dict[Text, float]) -> List[int]
+        """Returns the feature index of every token in the states.
+
+        Tokens occurring several times are contained several times."""
 
-            if state_name in self.user_labels:
-                if PREV_PREFIX + ACTION_LISTEN_NAME in states:
-                    # else we predict next action from bot action and memory
-                    for t in state_name.split(self.split_symbol):
-                        used_features[self.user_vocab[t]] += 1
+        if getattr(self, "state_tokens", None) is None:
+            # featurizers persisted before the tables existed
+            self._create_token_tables()
 
-            elif state_name in self.slot_labels:
-                offset = len(self.user_vocab)
-                idx = self.slot_labels.index(state_name)
-                used_features[offset + idx] += 1
+        # else we predict next action from bot action and memory
+        use_user_labels = PREV_PREFIX + ACTION_LISTEN_NAME in states
 
-            elif state_name[len(PREV_PREFIX):] in self.bot_labels:
-                action_name = state_name[len(PREV_PREFIX):]
-                for t in action_name.split(self.split_symbol):
-                    offset = len(self.user_vocab) + len(self.slot_labels)
-                    idx = self.bot_vocab[t]
-                    used_features[offset + idx] += 1
+        tokens = []
+        for state_name in states:
+
+            if state_name in self.user_label_tokens:
+                if use_user_labels:
+                    tokens.extend(self.user_label_tokens[state_name])
+
+            elif state_name in self.state_tokens:
+                tokens.extend(self.state_tokens[state_name])
 
             else:
                 logger.warning(
                     "Feature '{}' could not be found in "
                     "feature map.".format(state_name))
 
-        return used_features
+        return tokens
 
     def create_encoded_all_actions(self, domain):
         # type: (Domain) -> np.ndarray
@@ -331,7 +497,7 @@ class TrackerFeaturizer(object):
 
     def _featurize_states(self, trackers_as_states):
         """Create X"""
-        features = []
+        padded_states = []
         true_lengths = []
 
         for tracker_states in trackers_as_states:
@@ -344,13 +510,67 @@ class TrackerFeaturizer(object):
             if len(trackers_as_states) > 1:
                 tracker_states = self._pad_states(tracker_states)
 
-            story_features = [self.state_featurizer.encode(state)
+            padded_states.append(tracker_states)
+            true_lengths.append(dialogue_len)
+
+        X = self._encode_dialogues(padded_states)
+
+        return X, true_lengths
+
+    def _encode_dialogues(self, trackers_as_states):
+        # type: (List[List[Optional[Dict[Text, float]]]]) -> np.ndarray
+        """Encodes the states of all dialogues with a single batch."""
+
+        lengths = {len(states) for states in trackers_as_states}
+        if len(lengths) != 1 or 0 in lengths:
+            # nothing to encode or dialogues which can't be stacked
+            return np.array([[self.state_featurizer.encode(state)
                               for state in tracker_states]
+                             for tracker_states in trackers_as_states])
+
+        encoded = self.state_featurizer.encode_batch(
+                [state
+                 for tracker_states in trackers_as_states
+                 for state in tracker_states])
+        return encoded.reshape((len(trackers_as_states), lengths.pop(), -1))
+
+    def _featurize_states_sparse(self, trackers_as_states):
+        """Create X as a sparse matrix.
+
+        Every row holds the concatenated features of the states of one
+        dialogue, like a flattened X created by `_featurize_states`."""
+        from scipy import sparse
 
-            features.append(story_features)
+        num_features = self.state_featurizer.num_features
+        indptr = [0]
+        indices = []
+        values = []
+        true_lengths = []
+        max_len = 0
+
+        for tracker_states in trackers_as_states:
+            dialogue_len = len(tracker_states)
+
+            if len(trackers_as_states) > 1:
+                tracker_states = self._pad_states(tracker_states)
+
+            num_active = 0
+            for i, state in enumerate(tracker_states):
+                state_indices, state_values = \
+                    self.state_featurizer.encode_sparse(state)
+                indices.append(state_indices + i * num_features)
+                values.append(state_values)
+                num_active += len(state_indices)
+
+            indptr.append(indptr[-1] + num_active)
             true_lengths.append(dialogue_len)
+            max_len = max(max_len, len(tracker_states))
 
-        X = np.array(features)
+        X = sparse.csr_matrix(
+                (np.concatenate(values) if values else [],
+                 np.concatenate(indices) if indices else [],
+                 indptr),
+                shape=(len(trackers_as_states), max_len * num_features))
 
         return X, true_lengths
 
@@ -386,21 +606,70 @@ class TrackerFeaturizer(object):
 
     def featurize_trackers(self,
                            trackers,  # type: List[DialogueStateTracker]
-                           domain  # type: Domain
+                           domain,  # type: Domain
+                           sparse=False  # type: bool
                            ):
         # type: (...) -> DialogueTrainingData
-        """Create training data"""
+        """Create training data
+
+        If `sparse` is set, X is a sparse matrix with the flattened
+        features of each training example."""
         self.state_featurizer.prepare_from_domain(domain)
 
         (trackers_as_states,
          trackers_as_actions) = self.training_states_and_actions(trackers,
                                                                  domain)
 
-        X, true_lengths = self._featurize_states(trackers_as_states)
+        if sparse:
+            X, true_lengths = self._featurize_states_sparse(trackers_as_states)
+        else:
+            X, true_lengths = self._featurize_states(trackers_as_states)
         y = self._featurize_labels(trackers_as_actions, domain)
 
         return DialogueTrainingData(X, y, true_lengths)
 
+    def featurize_trackers_in_batches(
+            self,
+            trackers,  # type: List[DialogueStateTracker]
+            domain,  # type: Domain
+            batch_size  # type: int
+    ):
+        # type: (...) -> DialogueTrainingDataBatches
+        """Create training data which is featurized batch by batch"""
+        self.state_featurizer.prepare_from_domain(domain)
+
+        (trackers_as_states,
+         trackers_as_actions) = self.training_states_and_actions(trackers,
+                                                                 domain)
+
+        return DialogueTrainingDataBatches(self, trackers_as_states,
+                                           trackers_as_actions, domain,
+                                           batch_size)
+
+    def featurize_batch(self,
+                        trackers_as_states,  # type: List[List[Dict]]
+                        trackers_as_actions,  # type: List[List[Text]]
+                        domain  # type: Domain
+                        ):
+        # type: (...) -> Tuple[np.ndarray, np.ndarray]
+        """Create X and y for a batch of training examples.
+
+        Unlike `featurize_trackers`, even a single example is padded,
+        so all batches of the training data have the same shape."""
+
+        X = self._encode_dialogues([self._pad_states(list(states))
+                                    for states in trackers_as_states])
+
+        y = np.array([[self.state_featurizer.action_as_one_hot(action,
+                                                               domain)
+                       for action in self._pad_states(list(actions))]
+                      for actions in trackers_as_actions])
+        if y.shape[1] == 1:
+            # if it is MaxHistoryFeaturizer, squeeze out time axis
+            y = y[:, 0]
+
+        return X, y
+
     def prediction_states(self,
                           trackers,  # type: List[DialogueStateTracker]
                           domain  # type: Domain
@@ -412,15 +681,33 @@ class TrackerFeaturizer(object):
 
     def create_X(self,
                  trackers,  # type: List[DialogueStateTracker]
-                 domain  # type: Domain
+                 domain,  # type: Domain
+                 sparse=False  # type: bool
                  ):
         # type: (...) -> Tuple[np.ndarray, List[int]]
         """Create X for prediction"""
 
         trackers_as_states = self.prediction_states(trackers, domain)
-        X, _ = self._featurize_states(trackers_as_states)
+        if sparse:
+            X, _ = self._featurize_states_sparse(trackers_as_states)
+        else:
+            X, _ = self._featurize_states(trackers_as_states)
         return X
 
+    def create_batch_X(self,
+                       trackers,  # type: List[DialogueStateTracker]
+                       domain  # type: Domain
+                       ):
+        # type: (...) -> Tuple[np.ndarray, List[int]]
+        """Create X for the prediction of several trackers at once.
+
+        Returns the features together with the true length of every
+        dialogue, the prediction for a tracker is the one of its
+        last true turn."""
+
+        trackers_as_states = self.prediction_states(trackers, domain)
+        return self._featurize_states(trackers_as_states)
+
     def persist(self, path):
         featurizer_file = os.path.join(path, "featurizer.json")
         utils.create_dir_for_file(featurizer_file)
@@ -467,6 +754,101 @@ class FullDialogueTrackerFeaturizer(TrackerFeaturizer):
 
         return states
 
+    def _padded_len(self, dialogue_lengths):
+        # type: (List[int]) -> int
+        """Length the dialogues are padded to, see `_pad_states`."""
+
+        if len(dialogue_lengths) > 1:
+            # dialogues can get longer than the longest training dialogue,
+            # so they are padded up to the longest one given as well
+            return max(max(dialogue_lengths), self.max_len or 0)
+        else:
+            # a single dialogue is not padded
+            return dialogue_lengths[0]
+
+    @staticmethod
+    def _padded_positions(dialogue_lengths):
+        # type: (List[int]) -> Tuple[np.ndarray, np.ndarray]
+        """Dialogue and time step of every entry of the dialogues."""
+
+        dialogue_ids = np.repeat(np.arange(len(dialogue_lengths)),
+                                 dialogue_lengths)
+        time_steps = np.concatenate([np.arange(length)
+                                     for length in dialogue_lengths])
+        return dialogue_ids, time_steps
+
+    def _encode_padded(self, trackers_as_states, max_len):
+        # type: (List[List[Dict[Text, float]]], int) -> np.ndarray
+        """Encodes the dialogues into an array padded with -1.
+
+        Only the real states are encoded, the padding is the
+        initial value of the array."""
+
+        dialogue_lengths = [len(states) for states in trackers_as_states]
+        encoded = self.state_featurizer.encode_batch(
+                [state
+                 for tracker_states in trackers_as_states
+                 for state in tracker_states])
+
+        X = np.full((len(trackers_as_states), max_len,
+                     self.state_featurizer.num_features),
+                    -1, dtype=encoded.dtype)
+        if len(encoded):
+            X[self._padded_positions(dialogue_lengths)] = encoded
+        return X
+
+    def _one_hot_padded(self, trackers_as_actions, domain, max_len):
+        # type: (List[List[Text]], Domain, int) -> np.ndarray
+        """Encodes the actions as one hot vectors padded with -1."""
+
+        dialogue_lengths = [len(actions) for actions in trackers_as_actions]
+
+        y = np.full((len(trackers_as_actions), max_len, domain.num_actions),
+                    -1, dtype=int)
+        if sum(dialogue_lengths):
+            dialogue_ids, time_steps = self._padded_positions(
+                    dialogue_lengths)
+            action_ids = [domain.index_for_action(action)
+                          for tracker_actions in trackers_as_actions
+                          for action in tracker_actions]
+            y[dialogue_ids, time_steps] = 0
+            y[dialogue_ids, time_steps, action_ids] = 1
+        return y
+
+    def _featurize_states(self, trackers_as_states):
+        """Create X"""
+
+        true_lengths = [len(states) for states in trackers_as_states]
+        if not true_lengths:
+            return np.array([]), true_lengths
+
+        X = self._encode_padded(trackers_as_states,
+                                self._padded_len(true_lengths))
+        return X, true_lengths
+
+    def _featurize_labels(self, trackers_as_actions, domain):
+        """Create y"""
+
+        dialogue_lengths = [len(actions) for actions in trackers_as_actions]
+        if not dialogue_lengths:
+            return np.array([])
+
+        y = self._one_hot_padded(trackers_as_actions, domain,
+                                 self._padded_len(dialogue_lengths))
+        # squeezed like the labels of the other tracker featurizers
+        return y.squeeze()
+
+    def featurize_batch(self,
+                        trackers_as_states,  # type: List[List[Dict]]
+                        trackers_as_actions,  # type: List[List[Text]]
+                        domain  # type: Domain
+                        ):
+        # type: (...) -> Tuple[np.ndarray, np.ndarray]
+
+        X = self._encode_padded(trackers_as_states, self.max_len)
+        y = self._one_hot_padded(trackers_as_actions, domain, self.max_len)
+        return X, y
+
     def training_states_and_actions(
             self,
             trackers,  # type: List[DialogueStateTracker]
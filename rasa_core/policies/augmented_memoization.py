@@ -3,10 +3,11 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import base64
 import logging
 import typing
 
-from typing import Dict, List, Text, Optional
+from typing import Any, Dict, List, Text, Optional, Iterator
 
 from rasa_core.policies.memoization import MemoizationPolicy
 from rasa_core.events import ActionExecuted
@@ -16,6 +17,7 @@ logger = logging.getLogger(__name__)
 if typing.TYPE_CHECKING:
     from rasa_core.trackers import DialogueStateTracker
     from rasa_core.domain import Domain
+    from rasa_core.featurizers import TrackerFeaturizer
 
 
 class AugmentedMemoizationPolicy(MemoizationPolicy):
@@ -33,33 +35,177 @@ class AugmentedMemoizationPolicy(MemoizationPolicy):
         up to `max_history` from training stories during prediction
         even if additional slots were filled in the past
         for current dialogue.
+
+        The memorized turns are stored in a trie going back in time:
+        the children of the root are the most recent states, their
+        children the states one turn before and so on. Every node
+        holds the action memorized for the history leading to it, so
+        a single walk along the current states recalls the action of
+        the longest memorized history.
     """
 
-    def _preprocess_states(self, states):
-        # type: (List[Dict[Text, float]]) -> List[List[Dict[Text, float]]]
-        """Overrides the helper method to preprocess tracker's states.
+    def __init__(self,
+                 featurizer=None,  # type: Optional[TrackerFeaturizer]
+                 max_history=None,  # type: Optional[int]
+                 lookup=None,  # type: Optional[Dict]
+                 state_ids=None  # type: Optional[Dict[Text, int]]
+                 ):
+        # type: (...) -> None
+
+        super(AugmentedMemoizationPolicy, self).__init__(
+                featurizer, max_history, lookup, state_ids)
+        self.num_memorized = self._count_memorized(self.lookup)
+
+    def train(self,
+              training_trackers,  # type: List[DialogueStateTracker]
+              domain,  # type: Domain
+              **kwargs  # type: **Any
+              ):
+        # type: (...) -> None
+
+        self.num_memorized = 0
+        super(AugmentedMemoizationPolicy, self).train(
+                training_trackers, domain, **kwargs)
+
+    @staticmethod
+    def _count_memorized(node):
+        # type: (Dict[Text, Any]) -> int
+        """Counts the nodes of the trie with a memorized action."""
+
+        count = 0
+        nodes = [node]
+        while nodes:
+            node = nodes.pop()
+            if "action" in node:
+                count += 1
+            nodes.extend(node.get("children", {}).values())
+        return count
+
+    def _num_memorized(self):
+        # type: () -> int
+
+        return self.num_memorized
+
+    def _walk(self, states, add_unknown=False):
+        # type: (List[Dict[Text, float]], bool) -> Iterator[Dict[Text, Any]]
+        """Follows the states from the most recent one back in time.
+
+        Yields the node of every turn of the history. The walk stops at
+        the first padding state or at a history that isn't part of the
+        trie, unless `add_unknown` is set, which creates missing nodes."""
+
+        node = self.lookup
+        for state in reversed(states):
+            if state is None:
+                return
+            state_key = self._create_feature_key([state], add_unknown)
+            if state_key is None:
+                return
+            if add_unknown:
+                children = node.setdefault("children", {})
+                node = children.setdefault(state_key, {})
+            else:
+                node = node.get("children", {}).get(state_key)
+                if node is None:
+                    return
+            yield node
+
+    def _memorise(self,
+                  states,  # type: List[Dict[Text, float]]
+                  action,  # type: Text
+                  feature_item,  # type: int
+                  ambiguous_feature_keys,  # type: set
+                  online  # type: bool
+                  ):
+        # type: (...) -> None
+        """Memorizes the action for every partial history of the states.
+
+        Partial histories that lead to different actions are ambiguous
+        and get deleted from memory."""
+
+        nodes = list(self._walk(states, add_unknown=True))
+        for i, node in enumerate(reversed(nodes)):
+            # nodes stay in the trie during training, so their
+            # identity marks the ambiguous histories
+            if id(node) in ambiguous_feature_keys:
+                continue
 
-            Creates a list of states with deleted history
-            to add the ability of augmented memoization
-            to recall partial history"""
+            memorised = node.get("action")
+            if memorised is None:
+                node["action"] = feature_item
+                self.num_memorized += 1
+            elif memorised != feature_item:
+                if online and i == 0:
+                    self._log_contradiction(states, action)
+                    node["action"] = feature_item
+                else:
+                    # delete contradicting example created by
+                    # partial history augmentation from memory
+                    ambiguous_feature_keys.add(id(node))
+                    del node["action"]
+                    self.num_memorized -= 1
 
-        augmented = [list(states)]
-        augmented_states = list(states)
-        for i in range(self.max_history - 1):
-            augmented_states[i] = None
-            augmented.append(list(augmented_states))
-        return augmented
+    def _recall_states(self, states):
+        # type: (List[Dict[Text, float]]) -> Optional[int]
+
+        recalled = None
+        for node in self._walk(states):
+            recalled = node.get("action", recalled)
+        return recalled
+
+    def _lookup_to_json(self, node=None):
+        # type: (Optional[Dict[Text, Any]]) -> Dict[Text, Any]
+
+        if node is None:
+            node = self.lookup
+
+        data = {}
+        if "action" in node:
+            data["action"] = node["action"]
+        if node.get("children"):
+            data["children"] = {
+                base64.b64encode(k).decode("utf-8"): self._lookup_to_json(c)
+                for k, c in node["children"].items()}
+        return data
+
+    @classmethod
+    def _lookup_from_json(cls, data):
+        # type: (Dict[Text, Any]) -> Dict[Text, Any]
+
+        node = {}
+        if "action" in data:
+            node["action"] = data["action"]
+        if data.get("children"):
+            node["children"] = {
+                base64.b64decode(k): cls._lookup_from_json(c)
+                for k, c in data["children"].items()}
+        return node
+
+    def _restore_memorised(self, states, feature_item):
+        # type: (List[Optional[Dict[Text, float]]], int) -> None
+
+        nodes = list(self._walk(states, add_unknown=True))
+        if nodes:
+            nodes[-1]["action"] = feature_item
 
     def _back_to_the_future(self, tracker):
+        # type: (DialogueStateTracker) -> Iterator[DialogueStateTracker]
+        """Creates trackers with the recent turns of the tracker.
+
+        These trackers have forgotten about the slots that were set
+        before their first turn. They are created one by one starting
+        with the longest history."""
+
         if self.max_history <= 1:
-            return []
+            return
 
         historic_events = []
         collected_events = []
 
-        idx_of_last_evt = len(tracker.applied_events()) - 1
+        applied_events = tracker.applied_events()
+        idx_of_last_evt = len(applied_events) - 1
 
-        for e_i, event in enumerate(reversed(tracker.applied_events())):
+        for e_i, event in enumerate(reversed(applied_events)):
             collected_events.append(event)
 
             if isinstance(event, ActionExecuted):
@@ -77,27 +223,21 @@ class AugmentedMemoizationPolicy(MemoizationPolicy):
                     # to not recall again with the same features
                     break
 
-        mcfly_trackers = []
         for events in reversed(historic_events):
             mcfly_tracker = tracker.init_copy()
             for e in reversed(events):
                 mcfly_tracker.update(e)
-            mcfly_trackers.append(mcfly_tracker)
-
-        return mcfly_trackers
+            yield mcfly_tracker
 
     def _recall_using_delorean(self, tracker, domain):
         # correctly forgetting slots
 
         logger.debug("Launch DeLorean...")
-        mcfly_trackers = self._back_to_the_future(tracker)
-
-        tracker_as_states = self.featurizer.prediction_states(
-                mcfly_trackers, domain)
-
-        for states in tracker_as_states:
+        for mcfly_tracker in self._back_to_the_future(tracker):
+            states = self.featurizer.prediction_states(
+                    [mcfly_tracker], domain)[0]
             logger.debug("Current tracker state {}".format(states))
-            memorised = self._recall(states)
+            memorised = self._recall_states(states)
             if memorised is not None:
                 return memorised
 
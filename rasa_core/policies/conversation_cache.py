@@ -0,0 +1,69 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import threading
+import time
+from collections import OrderedDict
+
+from typing import Any, Optional, Text
+
+
+class ConversationCache(object):
+    """Keeps the inference state of recently active conversations.
+
+    Policies use it to continue from the state they reached at the
+    previous prediction of a conversation. At most `max_size`
+    conversations are cached, the least recently used ones are evicted
+    first. Entries which weren't used for `ttl` seconds are dropped."""
+
+    def __init__(self, max_size=1000, ttl=None):
+        # type: (int, Optional[float]) -> None
+
+        self.max_size = max_size
+        self.ttl = ttl
+
+        # sender id -> (value, last use)
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, sender_id):
+        # type: (Text) -> Optional[Any]
+
+        with self._lock:
+            entry = self._cache.pop(sender_id, None)
+            if entry is None:
+                return None
+
+            value, last_used = entry
+            now = time.time()
+            if self.ttl is not None and now - last_used > self.ttl:
+                return None
+
+            self._cache[sender_id] = (value, now)
+            return value
+
+    def set(self, sender_id, value):
+        # type: (Text, Any) -> None
+
+        with self._lock:
+            self._cache.pop(sender_id, None)
+            self._cache[sender_id] = (value, time.time())
+            while len(self._cache) > self.max_size:
+                self._cache.popitem(last=False)
+
+    def remove(self, sender_id):
+        # type: (Text) -> None
+
+        with self._lock:
+            self._cache.pop(sender_id, None)
+
+    def clear(self):
+        # type: () -> None
+
+        with self._lock:
+            self._cache.clear()
+
+    def __len__(self):
+        return len(self._cache)
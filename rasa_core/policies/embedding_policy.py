@@ -4,6 +4,7 @@ from __future__ import print_function
 from __future__ import unicode_literals
 
 import io
+import json
 import os
 import logging
 import warnings
@@ -11,11 +12,12 @@ import typing
 from tqdm import tqdm
 
 from typing import \
-    Any, List, Optional, Text
+    Any, List, Optional, Text, Dict, Tuple
 
 import numpy as np
 import copy
 from rasa_core.policies import Policy
+from rasa_core.policies.conversation_cache import ConversationCache
 from rasa_core.featurizers import \
     TrackerFeaturizer, FullDialogueTrackerFeaturizer, \
     LabelTokenizerSingleStateFeaturizer
@@ -40,9 +42,13 @@ logger = logging.getLogger(__name__)
 
 class EmbeddingPolicy(Policy):
     SUPPORTS_ONLINE_TRAINING = True
+    LOAD_IN_BACKGROUND = True
 
     NUM_ATTENTION_TYPES = 1
 
+    # number of conversations the rnn state is kept for
+    MAX_CACHED_CONVERSATIONS = 1000
+
     @classmethod
     def _standard_featurizer(cls):
         return FullDialogueTrackerFeaturizer(
@@ -57,6 +63,9 @@ class EmbeddingPolicy(Policy):
         "rnn_size": 32,
         "batch_size": 16,
         "epochs": 1,
+        # put dialogues of similar length into the same batch
+        # and only pad them up to the longest one in the batch
+        "bucket_by_length": False,
 
         # embedding parameters
         "embed_dim": 20,
@@ -149,6 +158,7 @@ class EmbeddingPolicy(Policy):
 
         self.batch_size = config['batch_size']
         self.epochs = config['epochs']
+        self.bucket_by_length = config['bucket_by_length']
 
     def _load_embedding_params(self, config):
         self.embed_dim = config['embed_dim']
@@ -214,6 +224,9 @@ class EmbeddingPolicy(Policy):
             prev_act_placeholder=None,  # type: Optional[tf.Tensor]
             similarity_op=None,  # type: Optional[tf.Tensor]
             alignment_history=None,  # type: Optional[List[[tf.Tensor]]
+            action_embedding_op=None,  # type: Optional[tf.Tensor]
+            rnn_state_in=None,  # type: Optional[Dict[Text, tf.Tensor]]
+            rnn_state_out=None,  # type: Optional[Dict[Text, tf.Tensor]]
     ):
         # type: (...) -> None
         self._check_tensorflow()
@@ -251,6 +264,19 @@ class EmbeddingPolicy(Policy):
         # a list of tensors for each attention type
         # of length cls.NUM_ATTENTION_TYPES
         self.alignment_history = alignment_history
+        # embedding of the actions, all actions are embedded only
+        # once and fed into this tensor during prediction
+        self.emb_act_op = action_embedding_op
+        self._all_actions_feed_dict = None
+
+        # rnn state that can be fed into the graph and the state
+        # reached after the last time step
+        self.rnn_state_in = rnn_state_in
+        self.rnn_state_out = rnn_state_out
+        # rnn state and similarities of the last prediction
+        # by sender id, to only feed new time steps
+        self._conversations = ConversationCache(
+                self.MAX_CACHED_CONVERSATIONS)
 
         # for continue training
         self.train_op = None
@@ -369,9 +395,20 @@ class EmbeddingPolicy(Policy):
 
         emb_mem = tf.concat([emb_utter, emb_prev_act], -1)
         num_mem_units = int(emb_mem.shape[-1])
+
+        # memory of the time steps fed at previous predictions
+        memory_prefix = tf.placeholder_with_default(
+                tf.zeros([tf.shape(emb_mem)[0], 0, num_mem_units]),
+                shape=(None, None, num_mem_units),
+                name='rnn_memory_prefix')
+        emb_mem = tf.concat([memory_prefix, emb_mem], 1)
+        self.rnn_state_in['memory'] = memory_prefix
+        self.rnn_state_out['memory'] = emb_mem
+
         attn_mech = tf.contrib.seq2seq.BahdanauAttention(
                 num_units=num_mem_units, memory=emb_mem,
-                memory_sequence_length=real_length,
+                memory_sequence_length=(real_length +
+                                        tf.shape(memory_prefix)[1]),
                 normalize=True,
                 probability_fn=tf.identity,
                 # we only attend to memory up to a current time
@@ -397,24 +434,74 @@ class EmbeddingPolicy(Policy):
         )
         return attn_cell
 
+    def _create_initial_state(self, cell, cell_input):
+        """Create zero state of the rnn, which can be replaced
+        by the state reached at the previous prediction"""
+
+        zero_state = cell.zero_state(tf.shape(cell_input)[0], tf.float32)
+        zero_lstm_state = (zero_state.cell_state if self.use_attention
+                           else zero_state)
+
+        c = tf.placeholder_with_default(zero_lstm_state.c,
+                                        shape=(None, self.rnn_size),
+                                        name='rnn_state_c')
+        h = tf.placeholder_with_default(zero_lstm_state.h,
+                                        shape=(None, self.rnn_size),
+                                        name='rnn_state_h')
+        self.rnn_state_in['c'] = c
+        self.rnn_state_in['h'] = h
+        lstm_state = tf.contrib.rnn.LSTMStateTuple(c, h)
+
+        if not self.use_attention:
+            return lstm_state
+
+        time = tf.placeholder_with_default(zero_state.time,
+                                           shape=(),
+                                           name='rnn_state_time')
+        attention_state = tf.placeholder_with_default(
+                zero_state.attention_state,
+                shape=(None, None),
+                name='rnn_state_attention')
+        self.rnn_state_in['time'] = time
+        self.rnn_state_in['attention_state'] = attention_state
+
+        return zero_state.clone(cell_state=lstm_state,
+                                time=time,
+                                attention_state=attention_state)
+
     def _create_rnn(self, emb_utter, emb_slots, emb_prev_act, real_length):
         """Create rnn"""
 
         cell_input = tf.concat([emb_utter, emb_slots], -1)
 
+        self.rnn_state_in = {}
+        self.rnn_state_out = {}
+
         cell = self._create_rnn_cell()
 
         if self.use_attention:
             cell = self._create_attn_cell(cell, emb_utter, emb_prev_act,
                                           real_length)
 
+        initial_state = self._create_initial_state(cell, cell_input)
+
         cell_output, final_state = tf.nn.dynamic_rnn(
                 cell, cell_input,
+                initial_state=initial_state,
                 dtype=tf.float32,
                 sequence_length=real_length,
                 scope='rnn_decoder_{}'.format(0)
         )
 
+        lstm_state = (final_state.cell_state if self.use_attention
+                      else final_state)
+        self.rnn_state_out['c'] = lstm_state.c
+        self.rnn_state_out['h'] = lstm_state.h
+        if self.use_attention:
+            self.rnn_state_out['time'] = final_state.time
+            self.rnn_state_out['attention_state'] = \
+                final_state.attention_state
+
         # extract alignments history
         self.alignment_history = []
         if self.use_attention:
@@ -545,7 +632,7 @@ class EmbeddingPolicy(Policy):
         sim, sim_act = self._tf_sim(emb_dial, emb_act, mask)
         loss = self._tf_loss(sim, sim_act, mask)
 
-        return sim, loss, mask
+        return sim, emb_act, loss, mask
 
     def _create_batch_b(self, batch_pos_b, intent_ids):
         """Create batch of actions, where the first is correct action
@@ -573,8 +660,29 @@ class EmbeddingPolicy(Policy):
 
         return np.concatenate([batch_pos_b, batch_neg_b], -2)
 
+    def _create_batch_ids(self, true_length):
+        # type: (np.ndarray) -> List[np.ndarray]
+        """Split shuffled training examples into batches.
+
+        If `bucket_by_length` is set, the examples are sorted by
+        the length of their dialogue before splitting them,
+        and the batches are shuffled instead"""
+
+        ids = np.random.permutation(len(true_length))
+        if self.bucket_by_length:
+            # stable sort keeps examples of equal length shuffled
+            ids = ids[np.argsort(true_length[ids], kind='mergesort')]
+
+        batch_ids = [ids[i:i + self.batch_size]
+                     for i in range(0, len(ids), self.batch_size)]
+
+        if self.bucket_by_length:
+            batch_ids = [batch_ids[i]
+                         for i in np.random.permutation(len(batch_ids))]
+        return batch_ids
+
     def _train_tf(self, X, Y, slots, prev_act, actions_for_X, all_Y_d,
-                  loss, mask):
+                  loss, mask, true_length):
         """Train tf graph"""
         self.session.run(tf.global_variables_initializer())
 
@@ -588,22 +696,23 @@ class EmbeddingPolicy(Policy):
         train_acc = 0
         last_loss = 0
         for ep in pbar:
-            ids = np.random.permutation(X.shape[0])
-
             ep_loss = 0
-            for i in range(batches_per_epoch):
-                start_idx = i * self.batch_size
-                end_idx = (i + 1) * self.batch_size
+            for batch_ids in self._create_batch_ids(true_length):
+                if self.bucket_by_length:
+                    # cut off the padding no dialogue of the batch needs
+                    batch_len = max(1, np.max(true_length[batch_ids]))
+                else:
+                    batch_len = X.shape[1]
 
-                batch_a = X[ids[start_idx:end_idx]]
+                batch_a = X[batch_ids, :batch_len]
 
-                batch_pos_b = Y[ids[start_idx:end_idx]]
-                actions_for_b = actions_for_X[ids[start_idx:end_idx]]
+                batch_pos_b = Y[batch_ids, :batch_len]
+                actions_for_b = actions_for_X[batch_ids, :batch_len]
                 # add negatives
                 batch_b = self._create_batch_b(batch_pos_b, actions_for_b)
 
-                batch_c = slots[ids[start_idx:end_idx]]
-                batch_b_prev = prev_act[ids[start_idx:end_idx]]
+                batch_c = slots[batch_ids, :batch_len]
+                batch_b_prev = prev_act[batch_ids, :batch_len]
 
                 sess_out = self.session.run(
                         {'loss': loss, 'train_op': self.train_op},
@@ -736,10 +845,11 @@ class EmbeddingPolicy(Policy):
 
             self.is_training = tf.placeholder_with_default(False, shape=())
 
-            self.sim_op, loss, mask = self._create_tf_graph(self.a_in,
-                                                            self.b_in,
-                                                            self.c_in,
-                                                            self.b_prev_in)
+            (self.sim_op, self.emb_act_op,
+             loss, mask) = self._create_tf_graph(self.a_in,
+                                                 self.b_in,
+                                                 self.c_in,
+                                                 self.b_prev_in)
 
             self.train_op = tf.train.AdamOptimizer(
                     learning_rate=0.001, epsilon=1e-16
@@ -748,7 +858,11 @@ class EmbeddingPolicy(Policy):
             self.session = tf.Session()
 
             self._train_tf(X, Y, slots, prev_act, actions_for_X, all_Y_d,
-                           loss, mask)
+                           loss, mask, np.array(training_data.true_length))
+
+        # the weights of the action embedding and the rnn changed
+        self._all_actions_feed_dict = None
+        self._conversations.clear()
 
     def continue_training(self, training_trackers, domain, **kwargs):
         # type: (List[DialogueStateTracker], Domain, **Any) -> None
@@ -783,61 +897,170 @@ class EmbeddingPolicy(Policy):
                                         self.b_prev_in: batch_b_prev,
                                         self.is_training: True})
 
+        # the weights of the action embedding and the rnn changed
+        self._all_actions_feed_dict = None
+        self._conversations.clear()
+
+    def _embed_all_actions(self):
+        # type: () -> Dict[tf.Tensor, np.ndarray]
+        """Feed dict with the candidate actions for prediction.
+
+        The actions are the same for every dialogue and time step,
+        so they are embedded once and broadcast in the graph."""
+
+        if self._all_actions_feed_dict is None:
+            all_actions = self.encoded_all_actions[np.newaxis, np.newaxis]
+            if self.emb_act_op is None:
+                # models persisted before the embedding was stored
+                self._all_actions_feed_dict = {self.b_in: all_actions}
+            else:
+                emb_act = self.session.run(
+                        self.emb_act_op,
+                        feed_dict={self.b_in: all_actions})
+                self._all_actions_feed_dict = {self.emb_act_op: emb_act}
+
+        return self._all_actions_feed_dict
+
+    def _predict_similarities(self, X, slots, prev_act,
+                              rnn_state=None, fetch_rnn_state=False):
+        # type: (...) -> Any
+        """Runs only the part of the graph needed for the similarities.
+
+        The rnn continues from `rnn_state` if it is given. If
+        `fetch_rnn_state` is set, the rnn state after the last time step
+        is returned together with the similarities."""
+
+        feed_dict = {self.a_in: X,
+                     self.c_in: slots,
+                     self.b_prev_in: prev_act}
+        feed_dict.update(self._embed_all_actions())
+        if rnn_state is not None:
+            feed_dict.update({self.rnn_state_in[key]: value
+                              for key, value in rnn_state.items()})
+
+        if fetch_rnn_state:
+            return self.session.run([self.sim_op, self.rnn_state_out],
+                                    feed_dict=feed_dict)
+        else:
+            return self.session.run(self.sim_op, feed_dict=feed_dict)
+
+    @staticmethod
+    def _continued_rnn_state(rnn_state, num_new_steps):
+        # type: (Dict[Text, np.ndarray], int) -> Dict[Text, np.ndarray]
+        """Prepares the rnn state reached before to feed new time steps.
+
+        The attention state needs an entry for every time step
+        in memory, including the new ones."""
+
+        rnn_state = dict(rnn_state)
+        if 'attention_state' in rnn_state:
+            rnn_state['attention_state'] = np.pad(
+                    rnn_state['attention_state'],
+                    [(0, 0), (0, num_new_steps)], 'constant')
+        return rnn_state
+
+    def _predict_incrementally(self, tracker, domain):
+        # type: (DialogueStateTracker, Domain) -> List[float]
+        """Predicts the next action feeding only new time steps to the rnn.
+
+        The rnn state reached at the previous prediction for the
+        conversation is reused, if the dialogue still starts with the
+        states fed back then (e.g. it wasn't restarted or reverted)."""
+
+        states = self.featurizer.prediction_states([tracker], domain)[0]
+
+        cached = self._conversations.get(tracker.sender_id)
+        if (cached is not None and
+                states[:len(cached['states'])] == cached['states']):
+            num_known_steps = len(cached['states'])
+        else:
+            cached = None
+            num_known_steps = 0
+
+        new_states = states[num_known_steps:]
+        if not new_states:
+            sim = cached['similarities']
+        else:
+            data_X = self.featurizer.state_featurizer.encode_batch(
+                    new_states)[np.newaxis]
+            X, slots, prev_act = self._create_X_slots(data_X)
+
+            if cached is not None:
+                rnn_state = self._continued_rnn_state(cached['rnn_state'],
+                                                      len(new_states))
+            else:
+                rnn_state = None
+
+            _sim, rnn_state = self._predict_similarities(
+                    X, slots, prev_act, rnn_state, fetch_rnn_state=True)
+            sim = _sim[0, -1, :]
+
+            self._conversations.set(tracker.sender_id,
+                                    {'states': states,
+                                     'rnn_state': rnn_state,
+                                     'similarities': sim})
+
+        return self._probabilities_from_similarity(sim.copy())
+
+    def _warm_up_session(self):
+        # type: () -> None
+        """Runs a prediction for an empty dialogue.
+
+        The first run of a session is considerably slower than
+        the following ones, it shouldn't delay the first answer."""
+
+        def empty_input(placeholder):
+            return np.zeros((1, 1, placeholder.get_shape().as_list()[-1]))
+
+        self._predict_similarities(empty_input(self.a_in),
+                                   empty_input(self.c_in),
+                                   empty_input(self.b_prev_in))
+
     def predict_action_probabilities(self, tracker, domain):
         # type: (DialogueStateTracker, Domain) -> List[float]
         """Predicts the next action the bot should take
         after seeing the tracker.
 
         Returns the list of probabilities for the next actions"""
+
+        if self.session is not None and self.rnn_state_in:
+            return self._predict_incrementally(tracker, domain)
+
+        return self.predict_batch_action_probabilities([tracker], domain)[0]
+
+    def predict_batch_action_probabilities(self, trackers, domain):
+        # type: (List[DialogueStateTracker], Domain) -> List[List[float]]
+        """Predicts the next actions for several trackers at once.
+
+        The dialogues are padded up to the longest one and fed to the
+        graph in a single run."""
+
         if self.session is None:
             logger.error("There is no trained tf.session: "
                          "component is either not trained or "
                          "didn't receive enough training data")
-            return [0.0] * domain.num_actions
+            return [[0.0] * domain.num_actions for _ in trackers]
+
+        if not trackers:
+            return []
 
-        data_X = self.featurizer.create_X([tracker], domain)
+        data_X, true_lengths = self.featurizer.create_batch_X(trackers,
+                                                              domain)
 
         X, slots, prev_act = self._create_X_slots(data_X)
-        all_Y_d = self._create_all_Y_d(X.shape[1])
-        all_Y_d_x = np.stack([all_Y_d for _ in range(X.shape[0])])
 
-        _sim, _ps = self.session.run(
-                [self.sim_op, self.alignment_history],
-                feed_dict={self.a_in: X,
-                           self.b_in: all_Y_d_x,
-                           self.c_in: slots,
-                           self.b_prev_in: prev_act}
-        )
+        # the attention probability distributions in
+        # `self.alignment_history` are not fetched, they
+        # are only of interest to inspect the attention
+        _sim = self._predict_similarities(X, slots, prev_act)
 
-        # _ps is attention probability distribution stored as
-        # a list of tensors for each attention type
-        # of length cls.NUM_ATTENTION_TYPES
-        # _ps[0] - alignments over user input = intents+entities
-        # _ps[1] - alignments over prev action
+        return [self._probabilities_from_similarity(_sim[i, length - 1, :])
+                for i, length in enumerate(true_lengths)]
+
+    def _probabilities_from_similarity(self, result):
+        # type: (np.ndarray) -> List[float]
+        """Transforms the similarities of the actions to probabilities."""
 
-        # code to output attention for the current last action:
-        # if len(_ps) > 0:
-        #     for i in range(_sim.shape[1]):
-        #         if i > 0:
-        #             idx_prev = np.argmax(_sim[0, i - 1, :])
-        #         else:
-        #             idx_prev = 0
-        #         idx = np.argmax(_sim[0, i, :])
-        #         print("{:.3f} ||  -- {} ----> {} -- {:.3f}"
-        #               "".format(_ps[0][0, -1, i],# _ps[1][0, -1, i],
-        #                         domain.actions[idx_prev].name(),
-        #                         domain.actions[idx].name(),
-        #                         np.max(_sim[0, i, :])
-        #                         ))
-        #
-        #     print("{:.3f} || "#-- {} ----> {}"
-        #           "".format(np.sum(_ps[0][0, -1]),
-        #                     # np.sum(_ps[1][0, -1])
-        #                     # domain.actions[np.argmax(_sim[0, -2, :])].name(),
-        #                     # domain.actions[np.argmax(_sim[0, -1, :])].name()
-        #                     ))
-
-        result = _sim[0, -1, :]
         if self.similarity_type == 'cosine':
             # clip negative values to zero
             result[result < 0] = 0
@@ -880,6 +1103,10 @@ class EmbeddingPolicy(Policy):
             self.graph.clear_collection('similarity_op')
             self.graph.add_to_collection('similarity_op',
                                          self.sim_op)
+            self.graph.clear_collection('action_embedding_op')
+            if self.emb_act_op is not None:
+                self.graph.add_to_collection('action_embedding_op',
+                                             self.emb_act_op)
 
             for i, alignments in enumerate(self.alignment_history):
                 self.graph.clear_collection('alignment_history_{}'
@@ -888,14 +1115,87 @@ class EmbeddingPolicy(Policy):
                                              ''.format(i),
                                              alignments)
 
-            saver = tf.train.Saver()
-            saver.save(self.session, checkpoint)
+            # policies loaded from a frozen
+            # graph don't have any variables left
+            if tf.global_variables():
+                saver = tf.train.Saver()
+                saver.save(self.session, checkpoint)
+
+            if self.emb_act_op is not None:
+                self._persist_prediction_graph(path)
 
         with io.open(os.path.join(
                 path,
                 file_name + ".encoded_all_actions.pkl"), 'wb') as f:
             pickle.dump(self.encoded_all_actions, f)
 
+    def _persist_prediction_graph(self, path):
+        # type: (Text) -> None
+        """Persists a frozen graph which only contains what is
+        needed for prediction.
+
+        The variables are turned into constants and the training ops
+        and attention alignments are pruned from the graph."""
+
+        tensors = {
+            'intent_placeholder': self.a_in,
+            'action_placeholder': self.b_in,
+            'slots_placeholder': self.c_in,
+            'prev_act_placeholder': self.b_prev_in,
+            'similarity_op': self.sim_op,
+            'action_embedding_op': self.emb_act_op
+        }
+        output_ops = [self.sim_op.op.name, self.emb_act_op.op.name]
+
+        tensor_names = {key: tensor.name for key, tensor in tensors.items()}
+        if self.rnn_state_in:
+            tensor_names['rnn_state_in'] = {
+                key: tensor.name for key, tensor in self.rnn_state_in.items()}
+            tensor_names['rnn_state_out'] = {
+                key: tensor.name for key, tensor in self.rnn_state_out.items()}
+            output_ops.extend(tensor.op.name
+                              for tensor in self.rnn_state_out.values())
+
+        frozen_graph_def = tf.graph_util.convert_variables_to_constants(
+                self.session,
+                self.graph.as_graph_def(),
+                output_ops)
+        tf.train.write_graph(frozen_graph_def, path,
+                             'tensorflow_embedding_frozen.pb',
+                             as_text=False)
+
+        utils.dump_obj_as_json_to_file(
+                os.path.join(path, 'tensorflow_embedding_frozen.json'),
+                tensor_names)
+
+    @staticmethod
+    def _load_prediction_graph(path):
+        # type: (Text) -> Optional[Tuple[tf.Graph, Dict[Text, tf.Tensor]]]
+        """Loads the frozen graph for prediction if it was persisted."""
+
+        graph_file = os.path.join(path, 'tensorflow_embedding_frozen.pb')
+        names_file = os.path.join(path, 'tensorflow_embedding_frozen.json')
+        if not (os.path.exists(graph_file) and os.path.exists(names_file)):
+            return None
+
+        graph_def = tf.GraphDef()
+        with io.open(graph_file, 'rb') as f:
+            graph_def.ParseFromString(f.read())
+        with io.open(names_file) as f:
+            tensor_names = json.loads(f.read())
+
+        graph = tf.Graph()
+        with graph.as_default():
+            tf.import_graph_def(graph_def, name='')
+
+        def get_tensors(names):
+            if isinstance(names, dict):
+                return {key: get_tensors(name) for key, name in names.items()}
+            else:
+                return graph.get_tensor_by_name(names)
+
+        return graph, get_tensors(tensor_names)
+
     @classmethod
     def load(cls, path):
         # type: (Text) -> EmbeddingPolicy
@@ -909,7 +1209,36 @@ class EmbeddingPolicy(Policy):
             file_name = 'tensorflow_embedding.ckpt'
             checkpoint = os.path.join(path, file_name)
 
-            if os.path.exists(checkpoint + '.meta'):
+            prediction_graph = cls._load_prediction_graph(path)
+
+            if prediction_graph is not None:
+                graph, tensors = prediction_graph
+                with graph.as_default():
+                    sess = tf.Session()
+
+                with io.open(os.path.join(
+                        path,
+                        file_name + ".encoded_all_actions.pkl"), 'rb') as f:
+                    encoded_all_actions = pickle.load(f)
+
+                policy = cls(
+                        featurizer,
+                        encoded_all_actions=encoded_all_actions,
+                        session=sess,
+                        graph=graph,
+                        intent_placeholder=tensors['intent_placeholder'],
+                        action_placeholder=tensors['action_placeholder'],
+                        slots_placeholder=tensors['slots_placeholder'],
+                        prev_act_placeholder=tensors['prev_act_placeholder'],
+                        similarity_op=tensors['similarity_op'],
+                        alignment_history=[],
+                        action_embedding_op=tensors['action_embedding_op'],
+                        rnn_state_in=tensors.get('rnn_state_in'),
+                        rnn_state_out=tensors.get('rnn_state_out'))
+                policy._warm_up_session()
+                return policy
+
+            elif os.path.exists(checkpoint + '.meta'):
                 graph = tf.Graph()
                 with graph.as_default():
                     sess = tf.Session()
@@ -923,6 +1252,9 @@ class EmbeddingPolicy(Policy):
                     b_prev_in = tf.get_collection('prev_act_placeholder')[0]
 
                     sim_op = tf.get_collection('similarity_op')[0]
+                    # missing in models persisted before it was stored
+                    emb_act_op = (tf.get_collection('action_embedding_op') or
+                                  [None])[0]
 
                     # attention probability distribution is
                     # a list of tensors for each attention type
@@ -938,16 +1270,19 @@ class EmbeddingPolicy(Policy):
                         file_name + ".encoded_all_actions.pkl"), 'rb') as f:
                     encoded_all_actions = pickle.load(f)
 
-                return cls(featurizer,
-                           encoded_all_actions=encoded_all_actions,
-                           session=sess,
-                           graph=graph,
-                           intent_placeholder=a_in,
-                           action_placeholder=b_in,
-                           slots_placeholder=c_in,
-                           prev_act_placeholder=b_prev_in,
-                           similarity_op=sim_op,
-                           alignment_history=alignment_history)
+                policy = cls(featurizer,
+                             encoded_all_actions=encoded_all_actions,
+                             session=sess,
+                             graph=graph,
+                             intent_placeholder=a_in,
+                             action_placeholder=b_in,
+                             slots_placeholder=c_in,
+                             prev_act_placeholder=b_prev_in,
+                             similarity_op=sim_op,
+                             alignment_history=alignment_history,
+                             action_embedding_op=emb_act_op)
+                policy._warm_up_session()
+                return policy
             else:
                 return cls(featurizer=featurizer)
 
@@ -7,11 +7,12 @@ import io
 import json
 import logging
 import os
+import threading
 from collections import defaultdict
 
 import numpy as np
 import typing
-from typing import Text, Optional, Any, List, Dict
+from typing import Text, Optional, Any, List, Dict, Tuple
 
 import rasa_core
 from rasa_core import utils, training
@@ -45,12 +46,75 @@ class PolicyEnsemble(object):
         # type: (List[Policy], Optional[Dict]) -> None
         self.policies = policies
         self.training_trackers = None
+        # number of policy predictions that reused the featurized history
+        # of the tracker instead of replaying it again
+        self.num_shared_featurizations = 0
 
         if action_fingerprints:
             self.action_fingerprints = action_fingerprints
         else:
             self.action_fingerprints = {}
 
+        # set once all policies are loaded, see `load(..., lazy=True)`
+        self._loaded = threading.Event()
+        self._loaded.set()
+        self.load_error = None
+
+    @property
+    def is_ready(self):
+        # type: () -> bool
+        """Whether all policies of the ensemble are loaded."""
+
+        return self._loaded.is_set() and self.load_error is None
+
+    def wait_until_ready(self, timeout=None):
+        # type: (Optional[float]) -> bool
+        """Blocks until all policies are loaded, returns `False` if
+        they weren't loaded within `timeout` seconds or failed to load."""
+
+        return self._loaded.wait(timeout) and self.load_error is None
+
+    def _ensure_loaded(self):
+        # type: () -> None
+
+        if not self.wait_until_ready():
+            raise Exception("Can't use the ensemble, its policies failed "
+                            "to load: {}".format(self.load_error))
+
+    @property
+    def can_predict(self):
+        # type: () -> bool
+        """Whether the ensemble has policies to predict with, which is
+        not the case while a lazy load is still loading all of them."""
+
+        return bool(self.policies) or self.is_ready
+
+    def _wait_for_policies(self):
+        # type: () -> None
+        """Blocks until the policies are loaded if none of them could be
+        loaded right away."""
+
+        if not self.policies:
+            if not self._loaded.is_set():
+                logger.debug("Waiting for the policies to be loaded.")
+            self._ensure_loaded()
+
+    def loading_status(self):
+        # type: () -> Dict[Text, Any]
+
+        if self.load_error is not None:
+            status = "failed"
+        elif self._loaded.is_set():
+            status = "ready"
+        else:
+            status = "loading"
+
+        return {
+            "status": status,
+            "loaded_policies": [type(p).__name__ for p in self.policies],
+            "error": self.load_error
+        }
+
     @staticmethod
     def _training_events_from_trackers(training_trackers):
         events_metadata = defaultdict(set)
@@ -67,6 +131,7 @@ class PolicyEnsemble(object):
 
     def train(self, training_trackers, domain, **kwargs):
         # type: (List[DialogueStateTracker], Domain, **Any) -> None
+        self._ensure_loaded()
         if training_trackers:
             for policy in self.policies:
                 policy.train(training_trackers, domain, **kwargs)
@@ -79,6 +144,16 @@ class PolicyEnsemble(object):
         # type: (DialogueStateTracker, Domain) -> List[float]
         raise NotImplementedError
 
+    def batch_probabilities_using_best_policy(self, trackers, domain):
+        # type: (List[DialogueStateTracker], Domain) -> List[List[float]]
+        """Predicts the probabilities of the next actions of each tracker.
+
+        Ensembles that can predict several trackers at once should
+        overwrite this."""
+
+        return [self.probabilities_using_best_policy(tracker, domain)
+                for tracker in trackers]
+
     def predict_next_action(self, tracker, domain):
         # type: (DialogueStateTracker, Domain) -> int
         """Predicts the next action the bot should take after seeing x.
@@ -86,12 +161,50 @@ class PolicyEnsemble(object):
         This should be overwritten by more advanced policies to use ML to
         predict the action. Returns the index of the next action"""
         probabilities = self.probabilities_using_best_policy(tracker, domain)
+        return self._best_action(probabilities, domain)
+
+    def predict_next_actions(self, trackers, domain):
+        # type: (List[DialogueStateTracker], Domain) -> List[int]
+        """Predicts the next action for several trackers at once.
+
+        Returns the index of the next action of each tracker."""
+
+        batch_probabilities = self.batch_probabilities_using_best_policy(
+                trackers, domain)
+        return [self._best_action(probabilities, domain)
+                for probabilities in batch_probabilities]
+
+    @staticmethod
+    def _best_action(probabilities, domain):
+        # type: (List[float], Domain) -> int
+
         max_index = int(np.argmax(probabilities))
         logger.debug("Predicted next action '{}' with prob {:.2f}.".format(
                 domain.action_for_index(max_index).name(),
                 probabilities[max_index]))
         return max_index
 
+    @staticmethod
+    def _featurize_history(tracker, domain):
+        # type: (DialogueStateTracker, Domain) -> int
+        """Featurizes the trackers history once for all policies.
+
+        The states are kept on the tracker until its next update, the
+        featurizers of the policies reuse them instead of replaying the
+        tracker again. Returns the tracker's reuse count before the
+        policies are asked for their predictions."""
+
+        domain.states_for_tracker_history(tracker)
+        return tracker.num_reused_states
+
+    def _count_shared_featurizations(self, tracker, num_reused_states):
+        # type: (DialogueStateTracker, int) -> None
+
+        shared = tracker.num_reused_states - num_reused_states
+        self.num_shared_featurizations += shared
+        logger.debug("Policies reused the featurized tracker history {} "
+                     "times.".format(shared))
+
     def _max_histories(self):
         # type: () -> List[Optional[int]]
         """Return max history."""
@@ -151,6 +264,7 @@ class PolicyEnsemble(object):
         # type: (Text) -> None
         """Persists the policy to storage."""
 
+        self._ensure_loaded()
         self._persist_metadata(path)
 
         for i, policy in enumerate(self.policies):
@@ -180,36 +294,100 @@ class PolicyEnsemble(object):
                 "".format(model_version, rasa_core.__version__))
 
     @classmethod
-    def load(cls, path):
-        # type: (Text) -> PolicyEnsemble
-        """Loads policy and domain specification from storage"""
+    def load(cls, path, lazy=False):
+        # type: (Text, bool) -> PolicyEnsemble
+        """Loads policy and domain specification from storage
+
+        If `lazy` is set, policies with slow to load models (e.g. neural
+        networks) are loaded in a background thread. Until they are
+        loaded, the ensemble predicts with the remaining policies and
+        `is_ready` is `False`."""
 
         metadata = cls.load_metadata(path)
         cls.ensure_model_compatibility(metadata)
-        policies = []
+        # (policy class, path) of each policy, in the persisted order
+        policy_specs = []
         for i, policy_name in enumerate(metadata["policy_names"]):
             policy_cls = utils.class_from_module_path(policy_name)
             dir_name = 'policy_{}_{}'.format(i, policy_cls.__name__)
-            policy_path = os.path.join(path, dir_name)
-            policy = policy_cls.load(policy_path)
-            policies.append(policy)
+            policy_specs.append((policy_cls, os.path.join(path, dir_name)))
+
+        loaded = [None] * len(policy_specs)  # type: List[Optional[Policy]]
+        for i, (policy_cls, policy_path) in enumerate(policy_specs):
+            if not (lazy and policy_cls.LOAD_IN_BACKGROUND):
+                loaded[i] = policy_cls.load(policy_path)
+
         ensemble_cls = utils.class_from_module_path(
                                 metadata["ensemble_name"])
         fingerprints = metadata.get("action_fingerprints", {})
-        ensemble = ensemble_cls(policies, fingerprints)
+        ensemble = ensemble_cls([p for p in loaded if p is not None],
+                                fingerprints)
+
+        if None in loaded:
+            ensemble._load_in_background(policy_specs, loaded)
         return ensemble
 
+    def _load_in_background(self, policy_specs, loaded):
+        # type: (List[Tuple[type, Text]], List[Optional[Policy]]) -> None
+        """Loads the missing policies in a daemon thread.
+
+        The policies of the ensemble are replaced at once when all of
+        them are loaded, so they keep their persisted order."""
+
+        def load_policies():
+            try:
+                for i, (policy_cls, policy_path) in enumerate(policy_specs):
+                    if loaded[i] is None:
+                        loaded[i] = policy_cls.load(policy_path)
+                        logger.debug("Loaded {} in the background."
+                                     "".format(policy_cls.__name__))
+                self.policies = list(loaded)
+            except Exception as e:
+                logger.exception("Failed to load the policies in the "
+                                 "background.")
+                self.load_error = "{}".format(e)
+            finally:
+                self._loaded.set()
+
+        self._loaded.clear()
+        thread = threading.Thread(target=load_policies,
+                                  name="PolicyLoader")
+        thread.daemon = True
+        thread.start()
+
 
 class SimplePolicyEnsemble(PolicyEnsemble):
 
     def probabilities_using_best_policy(self, tracker, domain):
         # type: (DialogueStateTracker, Domain) -> List[float]
+        self._wait_for_policies()
         result = None
         max_confidence = -1
+        num_reused_states = self._featurize_history(tracker, domain)
         for p in self.policies:
             probabilities = p.predict_action_probabilities(tracker, domain)
             confidence = np.max(probabilities)
             if confidence > max_confidence:
                 max_confidence = confidence
                 result = probabilities
+        self._count_shared_featurizations(tracker, num_reused_states)
         return result
+
+    def batch_probabilities_using_best_policy(self, trackers, domain):
+        # type: (List[DialogueStateTracker], Domain) -> List[List[float]]
+        self._wait_for_policies()
+        results = [None] * len(trackers)
+        max_confidences = [-1] * len(trackers)
+        reused_states = [self._featurize_history(tracker, domain)
+                         for tracker in trackers]
+        for p in self.policies:
+            batch_probabilities = p.predict_batch_action_probabilities(
+                    trackers, domain)
+            for i, probabilities in enumerate(batch_probabilities):
+                confidence = np.max(probabilities)
+                if confidence > max_confidences[i]:
+                    max_confidences[i] = confidence
+                    results[i] = probabilities
+        for tracker, num_reused_states in zip(trackers, reused_states):
+            self._count_shared_featurizations(tracker, num_reused_states)
+        return results
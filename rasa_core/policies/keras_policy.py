@@ -3,10 +3,12 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import copy
 import io
 import json
 import logging
 import os
+import threading
 import warnings
 import typing
 
@@ -14,7 +16,9 @@ from typing import Any, List, Dict, Text, Optional, Tuple
 
 from rasa_core import utils
 from rasa_core.policies import Policy
-from rasa_core.featurizers import TrackerFeaturizer
+from rasa_core.policies.conversation_cache import ConversationCache
+from rasa_core.featurizers import (
+    TrackerFeaturizer, FullDialogueTrackerFeaturizer)
 
 logger = logging.getLogger(__name__)
 
@@ -25,7 +29,22 @@ if typing.TYPE_CHECKING:
 
 
 class KerasPolicy(Policy):
+    """Predicts the next action with a recurrent neural network.
+
+    If `stateful_prediction` is set, the state of the rnn is kept for every
+    conversation after a prediction, so the next prediction only needs to
+    feed the states of the new turns. This needs a model which runs over
+    the full dialogue (`FullDialogueTrackerFeaturizer`). A model which sees
+    only the last `max_history` states has to run over the whole
+    window again for every prediction."""
+
     SUPPORTS_ONLINE_TRAINING = True
+    LOAD_IN_BACKGROUND = True
+
+    # number of conversations the rnn state is kept for
+    # and seconds after which an unused rnn state is dropped
+    MAX_CACHED_CONVERSATIONS = 1000
+    CONVERSATION_TTL = 60 * 60
 
     defaults = {
         # Neural Net and training params
@@ -36,12 +55,21 @@ class KerasPolicy(Policy):
                  featurizer=None,  # type: Optional[TrackerFeaturizer]
                  model=None,  # type: Optional[keras.models.Sequential]
                  graph=None,  # type: Optional[keras.backend.tf.Graph]
-                 current_epoch=0  # type: int
+                 current_epoch=0,  # type: int
+                 stateful_prediction=False  # type: bool
                  ):
         # type: (...) -> None
 
         super(KerasPolicy, self).__init__(featurizer)
 
+        if stateful_prediction and not isinstance(
+                self.featurizer, FullDialogueTrackerFeaturizer):
+            logger.warning("Stateful prediction needs a "
+                           "FullDialogueTrackerFeaturizer, the rnn of "
+                           "the policy is run over the whole history.")
+            stateful_prediction = False
+        self.stateful_prediction = stateful_prediction
+
         self.rnn_size = self.defaults['rnn_size']
 
         if KerasPolicy.is_using_tensorflow() and not graph:
@@ -52,6 +80,14 @@ class KerasPolicy(Policy):
         self.model = model
         self.current_epoch = current_epoch
 
+        # copy of the model with stateful rnn layers, it is shared
+        # by all conversations, so it is locked while it is used
+        self._stateful_model = None
+        self._stateful_model_lock = threading.Lock()
+        # rnn states and probabilities of the last prediction by sender id
+        self._conversations = ConversationCache(
+                self.MAX_CACHED_CONVERSATIONS, self.CONVERSATION_TTL)
+
     @property
     def max_len(self):
         if self.model:
@@ -135,6 +171,10 @@ class KerasPolicy(Policy):
                          "".format(kwargs.get('rnn_size')))
             self.rnn_size = kwargs.get('rnn_size')
 
+        if kwargs.get('stream_training_data'):
+            self._train_in_batches(training_trackers, domain, **kwargs)
+            return
+
         training_data = self.featurize_for_training(training_trackers,
                                                     domain,
                                                     **kwargs)
@@ -155,8 +195,66 @@ class KerasPolicy(Policy):
         self.model.fit(shuffled_X, shuffled_y, **params)
         # the default parameter for epochs in keras fit is 1
         self.current_epoch = kwargs.get("epochs", 1)
+        self._reset_stateful_model()
         logger.info("Done fitting keras policy model")
 
+    def _train_in_batches(
+            self,
+            training_trackers,  # type: List[DialogueStateTracker]
+            domain,  # type: Domain
+            **kwargs  # type: **Any
+    ):
+        # type: (...) -> None
+        """Fits the model on batches which are featurized during fitting.
+
+        Used if `stream_training_data` is set. Only one batch of the
+        training data is featurized at a time, so the training data
+        doesn't need to fit into memory."""
+
+        batch_size = kwargs.get("batch_size", 32)
+        training_data = self.featurize_for_training_in_batches(
+                training_trackers, domain, batch_size, **kwargs)
+        training_data.shuffle()
+
+        validation_split = kwargs.get("validation_split", 0.0)
+        training_data, validation_data = training_data.split(validation_split)
+
+        if self.model is None:
+            X, y = training_data[0]
+            self.model = self.model_architecture(X.shape[1:], y.shape[1:])
+
+        logger.info("Fitting model with {} total samples in batches of {} "
+                    "and a validation split of {}"
+                    "".format(training_data.num_examples(), batch_size,
+                              validation_split))
+        # filter out kwargs that cannot be passed to fit_generator
+        params = self._get_valid_params(self.model.fit_generator, **kwargs)
+        for key in ["generator", "steps_per_epoch",
+                    "validation_data", "validation_steps"]:
+            params.pop(key, None)
+        if validation_data is not None:
+            params["validation_data"] = self._repeat_batches(validation_data,
+                                                             shuffle=False)
+            params["validation_steps"] = len(validation_data)
+
+        self.model.fit_generator(self._repeat_batches(training_data),
+                                 steps_per_epoch=len(training_data),
+                                 **params)
+        # the default parameter for epochs in keras fit is 1
+        self.current_epoch = kwargs.get("epochs", 1)
+        self._reset_stateful_model()
+        logger.info("Done fitting keras policy model")
+
+    @staticmethod
+    def _repeat_batches(batches, shuffle=True):
+        """Endlessly yields the batches, as expected by keras generators."""
+
+        while True:
+            if shuffle:
+                batches.shuffle()
+            for batch_idx in range(len(batches)):
+                yield batches[batch_idx]
+
     def continue_training(self, training_trackers, domain, **kwargs):
         # type: (List[DialogueStateTracker], Domain, **Any) -> None
         import numpy as np
@@ -189,27 +287,136 @@ class KerasPolicy(Policy):
                            initial_epoch=self.current_epoch)
             self.current_epoch += 1
 
+        self._reset_stateful_model()
+
+    def _reset_stateful_model(self):
+        # type: () -> None
+        """Drops the stateful model and the rnn states,
+        they don't match the weights of the model anymore."""
+
+        with self._stateful_model_lock:
+            self._stateful_model = None
+        self._conversations.clear()
+
+    def _create_stateful_model(self):
+        # type: () -> Optional[keras.models.Sequential]
+        """Creates a copy of the model with stateful rnn layers, which
+        predicts one dialogue at a time."""
+
+        from keras.models import Sequential
+
+        if not isinstance(self.model, Sequential):
+            logger.warning("Stateful prediction is only supported "
+                           "for sequential keras models.")
+            return None
+
+        config = copy.deepcopy(self.model.get_config())
+        layer_configs = config['layers'] if isinstance(config, dict) \
+            else config
+
+        input_config = layer_configs[0]['config']
+        input_config['batch_input_shape'] = \
+            [1] + list(input_config['batch_input_shape'][1:])
+        for layer_config in layer_configs:
+            if 'stateful' in layer_config['config']:
+                layer_config['config']['stateful'] = True
+
+        model = Sequential.from_config(config)
+        model.set_weights(self.model.get_weights())
+        return model
+
+    def _predict_statefully(self, tracker, domain):
+        # type: (DialogueStateTracker, Domain) -> Optional[np.ndarray]
+        """Predicts with the stateful model, continuing from the rnn
+        states reached at the last prediction for the conversation.
+
+        The rnn states are only reused if the dialogue still starts with
+        the states fed back then, so they are dropped e.g. if the
+        conversation was restarted or reverted."""
+        from keras import backend as K
+
+        states = self.featurizer.prediction_states([tracker], domain)[0]
+
+        cached = self._conversations.get(tracker.sender_id)
+        if (cached is not None and
+                states[:len(cached['states'])] == cached['states']):
+            new_states = states[len(cached['states']):]
+            rnn_states = cached['rnn_states']
+        else:
+            new_states = states
+            rnn_states = None
+
+        if not new_states:
+            return cached['probabilities']
+
+        X = self.featurizer.state_featurizer.encode_batch(new_states)
+
+        with self._stateful_model_lock:
+            if self._stateful_model is None:
+                self._stateful_model = self._create_stateful_model()
+            if self._stateful_model is None:
+                self.stateful_prediction = False
+                return None
+
+            recurrent_layers = [layer
+                                for layer in self._stateful_model.layers
+                                if getattr(layer, 'stateful', False)]
+            for i, layer in enumerate(recurrent_layers):
+                layer.reset_states(rnn_states[i] if rnn_states else None)
+
+            y_pred = self._stateful_model.predict(X[None, :, :],
+                                                  batch_size=1)
+            rnn_states = [K.batch_get_value(layer.states)
+                          for layer in recurrent_layers]
+
+        probabilities = y_pred[0, -1]
+        self._conversations.set(tracker.sender_id,
+                                {'states': states,
+                                 'rnn_states': rnn_states,
+                                 'probabilities': probabilities})
+        return probabilities
+
     def predict_action_probabilities(self, tracker, domain):
         # type: (DialogueStateTracker, Domain) -> List[float]
 
-        X = self.featurizer.create_X([tracker], domain)
+        if self.stateful_prediction and self.model is not None:
+            if KerasPolicy.is_using_tensorflow() and self.graph is not None:
+                with self.graph.as_default():
+                    probabilities = self._predict_statefully(tracker, domain)
+            else:
+                probabilities = self._predict_statefully(tracker, domain)
+
+            if probabilities is not None:
+                return probabilities.tolist()
+
+        return self.predict_batch_action_probabilities([tracker], domain)[0]
+
+    def predict_batch_action_probabilities(self, trackers, domain):
+        # type: (List[DialogueStateTracker], Domain) -> List[List[float]]
+
+        if not trackers:
+            return []
+
+        X, true_lengths = self.featurizer.create_batch_X(trackers, domain)
 
         if KerasPolicy.is_using_tensorflow() and self.graph is not None:
             with self.graph.as_default():
-                y_pred = self.model.predict(X, batch_size=1)
+                y_pred = self.model.predict(X, batch_size=len(trackers))
         else:
-            y_pred = self.model.predict(X, batch_size=1)
+            y_pred = self.model.predict(X, batch_size=len(trackers))
 
         if len(y_pred.shape) == 2:
-            return y_pred[-1].tolist()
+            return y_pred.tolist()
         elif len(y_pred.shape) == 3:
-            return y_pred[0, -1].tolist()
+            return [y_pred[i, length - 1].tolist()
+                    for i, length in enumerate(true_lengths)]
 
     def _persist_configuration(self, config_file):
         model_config = {
             "arch": "keras_arch.json",
             "weights": "keras_weights.h5",
-            "epochs": self.current_epoch}
+            "epochs": self.current_epoch,
+            "stateful_prediction": self.stateful_prediction}
 
         utils.dump_obj_as_json_to_file(config_file, model_config)
 
@@ -267,7 +474,9 @@ class KerasPolicy(Policy):
                         model=cls._load_weights_for_model(path,
                                                           model_arch,
                                                           meta),
-                        current_epoch=meta["epochs"])
+                        current_epoch=meta["epochs"],
+                        stateful_prediction=meta.get("stateful_prediction",
+                                                     False))
             else:
                 return cls(featurizer=featurizer)
         else:
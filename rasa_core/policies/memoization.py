@@ -8,12 +8,13 @@ import io
 import json
 import logging
 import os
+import re
+import struct
 import zlib
 import typing
 from tqdm import tqdm
 
-from builtins import bytes
-from typing import Optional, Any, Dict, List, Text
+from typing import Optional, Any, Dict, List, Text, Tuple
 
 from rasa_core.policies.policy import Policy
 from rasa_core import utils
@@ -40,10 +41,16 @@ class MemoizationPolicy(Policy):
         If it is needed to recall turns from training dialogues where
         some slots might not be set during prediction time, and there are
         training stories for this, use AugmentedMemoizationPolicy.
+
+        The memorized state windows are stored as compact binary keys.
+        State names are replaced by integer ids and every active state
+        is packed as a fixed width (id, value) record.
     """
-    ENABLE_FEATURE_STRING_COMPRESSION = True
     SUPPORTS_ONLINE_TRAINING = True
 
+    # version of the format of the persisted `memorized_turns.json`
+    LOOKUP_FORMAT_VERSION = 2
+
     @classmethod
     def _standard_featurizer(cls, max_history=None):
         max_history = max_history or cls.MAX_HISTORY_DEFAULT
@@ -54,7 +61,8 @@ class MemoizationPolicy(Policy):
     def __init__(self,
                  featurizer=None,  # type: Optional[TrackerFeaturizer]
                  max_history=None,  # type: Optional[int]
-                 lookup=None  # type: Optional[Dict]
+                 lookup=None,  # type: Optional[Dict]
+                 state_ids=None  # type: Optional[Dict[Text, int]]
                  ):
         # type: (...) -> None
 
@@ -65,19 +73,14 @@ class MemoizationPolicy(Policy):
 
         self.max_history = self.featurizer.max_history
         self.lookup = lookup if lookup is not None else {}
+        # maps state names to the ids used in the lookup keys
+        self.state_ids = state_ids if state_ids is not None else {}
         self.is_enabled = True
 
     def toggle(self, activate):
         # type: (bool) -> None
         self.is_enabled = activate
 
-    def _preprocess_states(self, states):
-        # type: (List[Dict[Text, float]]) -> List[List[Dict[Text, float]]]
-        """Helper method to preprocess tracker's states.
-            E.g., to a create list of states with deleted history
-            for augmented Memoization"""
-        return [states]
-
     def _add(self, trackers_as_states, trackers_as_actions,
              domain, online=False):
 
@@ -92,45 +95,103 @@ class MemoizationPolicy(Policy):
             ("The second dimension of trackers_as_action should be 1, "
              "instead of {}".format(len(trackers_as_actions[0])))
 
+        if not self.state_ids:
+            self.state_ids = dict(domain.input_state_map)
+
         ambiguous_feature_keys = set()
 
         pbar = tqdm(zip(trackers_as_states, trackers_as_actions),
                     desc="Processed actions", disable=online)
         for states, actions in pbar:
             action = actions[0]
-            for i, states_aug in enumerate(self._preprocess_states(states)):
-                feature_key = self._create_feature_key(states_aug)
-                feature_item = domain.index_for_action(action)
-
-                if feature_key not in ambiguous_feature_keys:
-                    if feature_key in self.lookup.keys():
-                        if self.lookup[feature_key] != feature_item:
-                            if online and i == 0:
-                                logger.info("Original stories are "
-                                            "different for {} -- {}\n"
-                                            "Memorized the new ones for "
-                                            "now. Delete contradicting "
-                                            "examples after exporting "
-                                            "the new stories."
-                                            "".format(states_aug, action))
-                                self.lookup[feature_key] = feature_item
-                            else:
-                                # delete contradicting example created by
-                                # partial history augmentation from memory
-                                ambiguous_feature_keys.add(feature_key)
-                                del self.lookup[feature_key]
-                    else:
-                        self.lookup[feature_key] = feature_item
-                pbar.set_postfix({"# examples": "{:d}".format(
-                                                    len(self.lookup))})
-
-    def _create_feature_key(self, states):
-        feature_str = json.dumps(states, sort_keys=True).replace("\"", "")
-        if self.ENABLE_FEATURE_STRING_COMPRESSION:
-            compressed = zlib.compress(bytes(feature_str, "utf-8"))
-            return base64.b64encode(compressed).decode("utf-8")
-        else:
-            return feature_str
+            feature_item = domain.index_for_action(action)
+            self._memorise(states, action, feature_item,
+                           ambiguous_feature_keys, online)
+            pbar.set_postfix({"# examples": "{:d}".format(
+                                                self._num_memorized())})
+
+    def _memorise(self,
+                  states,  # type: List[Dict[Text, float]]
+                  action,  # type: Text
+                  feature_item,  # type: int
+                  ambiguous_feature_keys,  # type: set
+                  online  # type: bool
+                  ):
+        # type: (...) -> None
+        """Adds a single training example to the lookup."""
+
+        feature_key = self._create_feature_key(states, add_unknown=True)
+
+        if feature_key in ambiguous_feature_keys:
+            return
+
+        memorised = self.lookup.get(feature_key)
+        if memorised is None:
+            self.lookup[feature_key] = feature_item
+        elif memorised != feature_item:
+            if online:
+                self._log_contradiction(states, action)
+                self.lookup[feature_key] = feature_item
+            else:
+                # delete contradicting example from memory
+                ambiguous_feature_keys.add(feature_key)
+                del self.lookup[feature_key]
+
+    @staticmethod
+    def _log_contradiction(states, action):
+        # type: (List[Dict[Text, float]], Text) -> None
+        logger.info("Original stories are different for {} -- {}\n"
+                    "Memorized the new ones for now. Delete contradicting "
+                    "examples after exporting the new stories."
+                    "".format(states, action))
+
+    def _num_memorized(self):
+        # type: () -> int
+        """Number of examples in the lookup."""
+
+        return len(self.lookup)
+
+    def _state_id(self, state_name, add_unknown=False):
+        # type: (Text, bool) -> Optional[int]
+        """Returns the id of a state name used in the lookup keys."""
+
+        state_id = self.state_ids.get(state_name)
+        if state_id is None and add_unknown:
+            state_id = len(self.state_ids)
+            self.state_ids[state_name] = state_id
+        return state_id
+
+    def _create_feature_key(self, states, add_unknown=False):
+        # type: (List[Dict[Text, float]], bool) -> Optional[bytes]
+        """Packs a window of states into a binary lookup key.
+
+        Every state is stored as the number of its active features
+        followed by an (id, value) record for each feature, padding
+        states are stored as `-1`. If a state isn't known to the policy,
+        `None` is returned - the window can't be memorized then - unless
+        `add_unknown` is set, which assigns a new id to the state."""
+
+        fmt = ["<"]
+        values = []
+        for state in states:
+            if state is None:
+                fmt.append("i")
+                values.append(-1)
+                continue
+
+            features = []
+            for state_name, value in state.items():
+                state_id = self._state_id(state_name, add_unknown)
+                if state_id is None:
+                    return None
+                features.append((state_id, value))
+
+            fmt.append("i" + "id" * len(features))
+            values.append(len(features))
+            for state_id, value in sorted(features):
+                values.extend((state_id, value))
+
+        return struct.pack("".join(fmt), *values)
 
     def train(self,
               training_trackers,  # type: List[DialogueStateTracker]
@@ -146,7 +207,7 @@ class MemoizationPolicy(Policy):
                                     training_trackers, domain)
         self._add(trackers_as_states, trackers_as_actions, domain)
         logger.info("Memorized {} unique augmented examples."
-                    "".format(len(self.lookup)))
+                    "".format(self._num_memorized()))
 
     def continue_training(self, training_trackers, domain, **kwargs):
         # type: (List[DialogueStateTracker], Domain, **Any) -> None
@@ -161,12 +222,10 @@ class MemoizationPolicy(Policy):
     def _recall_states(self, states):
         # type: (List[Dict[Text, float]]) -> Optional[int]
 
-        for states_aug in self._preprocess_states(states):
-            memorised = self.lookup.get(
-                self._create_feature_key(states_aug))
-            if memorised is not None:
-                return memorised
-        return None
+        feature_key = self._create_feature_key(states)
+        if feature_key is None:
+            return None
+        return self.lookup.get(feature_key)
 
     def recall(self,
                states,  # type: List[Dict[Text, float]]
@@ -209,12 +268,69 @@ class MemoizationPolicy(Policy):
 
         memorized_file = os.path.join(path, 'memorized_turns.json')
         data = {
+            "version": self.LOOKUP_FORMAT_VERSION,
             "max_history": self.max_history,
-            "lookup": self.lookup
+            "states": sorted(self.state_ids, key=self.state_ids.get),
+            "lookup": self._lookup_to_json()
         }
         utils.create_dir_for_file(memorized_file)
         utils.dump_obj_as_json_to_file(memorized_file, data)
 
+    def _lookup_to_json(self):
+        # type: () -> Dict[Text, Any]
+        """Encodes the binary keys of the lookup to store it as json."""
+
+        return {base64.b64encode(k).decode("utf-8"): v
+                for k, v in self.lookup.items()}
+
+    @classmethod
+    def _lookup_from_json(cls, data):
+        # type: (Dict[Text, Any]) -> Dict[bytes, Any]
+        """Restores a lookup stored by `_lookup_to_json`."""
+
+        return {base64.b64decode(k): v for k, v in data.items()}
+
+    def _restore_memorised(self, states, feature_item):
+        # type: (List[Optional[Dict[Text, float]]], int) -> None
+        """Adds an already memorized window of states to the lookup."""
+
+        feature_key = self._create_feature_key(states, add_unknown=True)
+        self.lookup[feature_key] = feature_item
+
+    @staticmethod
+    def _parse_legacy_feature_key(feature_key):
+        # type: (Text) -> List[Optional[Dict[Text, float]]]
+        """Restores the states of a key of the json based lookup format.
+
+        These keys are (optionally zlib compressed and base64 encoded)
+        json dumps of the states with all quotes removed."""
+
+        try:
+            compressed = base64.b64decode(feature_key)
+            feature_str = zlib.decompress(compressed).decode("utf-8")
+        except (ValueError, TypeError, zlib.error):
+            feature_str = feature_key
+
+        # put the quotes around the state names back in
+        quoted = re.sub(r'([{,]\s*)([^{},:]+?):\s', r'\1"\2": ', feature_str)
+        return json.loads(quoted)
+
+    @classmethod
+    def _convert_legacy_lookup(cls, legacy_lookup):
+        # type: (Dict[Text, int]) -> Tuple[Dict[bytes, Any], Dict[Text, int]]
+        """Converts a lookup of the json based key format to binary keys."""
+
+        policy = cls()
+        for feature_key, feature_item in legacy_lookup.items():
+            try:
+                states = cls._parse_legacy_feature_key(feature_key)
+            except ValueError:
+                logger.warning("Failed to convert memorized turn '{}'. "
+                               "It will be ignored.".format(feature_key))
+                continue
+            policy._restore_memorised(states, feature_item)
+        return policy.lookup, policy.state_ids
+
     @classmethod
     def load(cls, path):
         # type: (Text) -> MemoizationPolicy
@@ -224,7 +340,18 @@ class MemoizationPolicy(Policy):
         if os.path.isfile(memorized_file):
             with io.open(memorized_file) as f:
                 data = json.loads(f.read())
-            return cls(featurizer=featurizer, lookup=data["lookup"])
+
+            if data.get("version") is None:
+                logger.info("Converting memorized turns of an old model "
+                            "to the current lookup format.")
+                lookup, state_ids = cls._convert_legacy_lookup(
+                                                    data["lookup"])
+            else:
+                lookup = cls._lookup_from_json(data["lookup"])
+                state_ids = {state_name: i
+                             for i, state_name in enumerate(data["states"])}
+            return cls(featurizer=featurizer, lookup=lookup,
+                       state_ids=state_ids)
         else:
             logger.info("Couldn't load memoization for policy. "
                         "File '{}' doesn't exist. Falling back to empty "
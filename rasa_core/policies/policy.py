@@ -19,13 +19,16 @@ if typing.TYPE_CHECKING:
     from rasa_core.domain import Domain
     from rasa_core.featurizers import TrackerFeaturizer
     from rasa_core.trackers import DialogueStateTracker
-    from rasa_core.training.data import DialogueTrainingData
+    from rasa_core.training.data import (
+        DialogueTrainingData, DialogueTrainingDataBatches)
 
 logger = logging.getLogger(__name__)
 
 
 class Policy(object):
     SUPPORTS_ONLINE_TRAINING = False
+    # whether a lazily loaded ensemble loads the policy in the background
+    LOAD_IN_BACKGROUND = False
     MAX_HISTORY_DEFAULT = 5
 
     @classmethod
@@ -70,15 +73,51 @@ class Policy(object):
             self,
             trackers,  # type: List[DialogueStateTracker]
             domain,  # type: Domain
+            sparse=False,  # type: bool
             **kwargs  # type: **Any
     ):
         # type: (...) -> DialogueTrainingData
         """Transform training trackers into a vector representation.
         The trackers, consisting of multiple turns, will be transformed
-        into a float vector which can be used by a ML model."""
+        into a float vector which can be used by a ML model.
+
+        If `sparse` is set, X is a sparse matrix of flattened features.
+        If a `cache_dir` is passed, training data that was featurized
+        before is loaded from the cache."""
+        from rasa_core.training.cache import TrainingDataCache
+
+        cache_dir = kwargs.get('cache_dir')
+        if cache_dir:
+            cache = TrainingDataCache(cache_dir)
+            training_data = cache.featurize_trackers(self.featurizer,
+                                                     trackers, domain,
+                                                     sparse=sparse)
+        else:
+            training_data = self.featurizer.featurize_trackers(trackers,
+                                                               domain,
+                                                               sparse=sparse)
 
-        training_data = self.featurizer.featurize_trackers(trackers,
-                                                           domain)
+        max_training_samples = kwargs.get('max_training_samples')
+        if max_training_samples is not None:
+            logger.debug("Limit training data to {} training samples."
+                         "".format(max_training_samples))
+            training_data.limit_training_data_to(max_training_samples)
+
+        return training_data
+
+    def featurize_for_training_in_batches(
+            self,
+            trackers,  # type: List[DialogueStateTracker]
+            domain,  # type: Domain
+            batch_size,  # type: int
+            **kwargs  # type: **Any
+    ):
+        # type: (...) -> DialogueTrainingDataBatches
+        """Transform training trackers into batches of vectors which
+        are only created when a batch gets used."""
+
+        training_data = self.featurizer.featurize_trackers_in_batches(
+                trackers, domain, batch_size)
 
         max_training_samples = kwargs.get('max_training_samples')
         if max_training_samples is not None:
@@ -119,6 +158,17 @@ class Policy(object):
         raise NotImplementedError("Policy must have the capacity "
                                   "to predict.")
 
+    def predict_batch_action_probabilities(self, trackers, domain):
+        # type: (List[DialogueStateTracker], Domain) -> List[List[float]]
+        """Predicts the next actions for several trackers at once.
+
+        Returns the list of probabilities for the next actions of each
+        tracker. Policies using a model should overwrite this to predict
+        all trackers with a single call of the model."""
+
+        return [self.predict_action_probabilities(tracker, domain)
+                for tracker in trackers]
+
     def persist(self, path):
         # type: (Text) -> None
         """Persists the policy to a storage."""
@@ -6,18 +6,23 @@ from __future__ import unicode_literals
 import logging
 import os
 import pickle
+import re
+import time
 import warnings
 import typing
 
 from typing import Optional, Any, List, Text, Dict, Callable
 
 import numpy as np
+import scipy.sparse
+import six
 from sklearn.base import clone
 from sklearn.linear_model import LogisticRegression
-from sklearn.model_selection import GridSearchCV
+from sklearn.model_selection import GridSearchCV, RandomizedSearchCV
 from sklearn.preprocessing import LabelEncoder
 from sklearn.utils import shuffle as sklearn_shuffle
 
+from rasa_core import utils
 from rasa_core.policies import Policy
 from rasa_core.featurizers import \
     TrackerFeaturizer, MaxHistoryTrackerFeaturizer
@@ -48,6 +53,20 @@ class SklearnPolicy(Policy):
           the given *param_grid* is performed
           (e.g. *param_grid={'n_estimators': [50, 100]}*).
 
+        :param str search_strategy:
+          How the hyperparameters are searched if *cv* is given: *'grid'*
+          tries every combination in *param_grid*, *'random'* samples
+          *n_iter* of them (*param_grid* may then contain distributions)
+          and *'halving'* uses successive halving, which needs
+          scikit-learn>=0.24.
+
+        :param int n_iter:
+          Number of parameter settings sampled by the *'random'* search.
+
+        :param int n_jobs:
+          Number of jobs fitting the cross validation folds in parallel,
+          *-1* uses all processors. Defaults to a single job.
+
         :param scoring:
           Scoring strategy, using the sklearn standard.
 
@@ -57,8 +76,17 @@ class SklearnPolicy(Policy):
 
         :param bool shuffle:
           Whether to shuffle training data.
+
+        :param bool sparse:
+          Whether to featurize the trackers into a sparse matrix, which
+          the model needs to support. Memory and featurization time then
+          scale with the number of active features instead of the number
+          of features of the domain.
     """
 
+    LOAD_IN_BACKGROUND = True
+    SEARCH_STRATEGIES = ['grid', 'random', 'halving']
+
     def __init__(
         self,
         featurizer=None,  # type: Optional[MaxHistoryTrackerFeaturizer]
@@ -68,12 +96,20 @@ class SklearnPolicy(Policy):
         scoring='accuracy',  # type: Optional[Text or List or Dict or Callable]
         label_encoder=LabelEncoder(),  # type: sklearn.base.TransformerMixin
         shuffle=True,  # type: bool
+        sparse=False,  # type: bool
+        search_strategy='grid',  # type: Text
+        n_iter=10,  # type: int
+        n_jobs=1  # type: int
     ):
         if featurizer:
             if not isinstance(featurizer, MaxHistoryTrackerFeaturizer):
                 raise TypeError("Passed featurizer of type {}, should be "
                                 "MaxHistoryTrackerFeaturizer."
                                 "".format(type(featurizer).__name__))
+        if search_strategy not in self.SEARCH_STRATEGIES:
+            raise ValueError("Unknown search strategy '{}', should be one "
+                             "of {}.".format(search_strategy,
+                                             self.SEARCH_STRATEGIES))
         super(SklearnPolicy, self).__init__(featurizer)
 
         self.model = model
@@ -82,10 +118,18 @@ class SklearnPolicy(Policy):
         self.scoring = scoring
         self.label_encoder = label_encoder
         self.shuffle = shuffle
+        self.sparse = sparse
+        self.search_strategy = search_strategy
+        self.n_iter = n_iter
+        self.n_jobs = n_jobs
+        # results of the last hyperparameter search
+        self.search_report = None
 
         # attributes that need to be restored after loading
         self._pickle_params = [
-            'model', 'cv', 'param_grid', 'scoring', 'label_encoder']
+            'model', 'cv', 'param_grid', 'scoring', 'label_encoder',
+            'sparse', 'search_strategy', 'n_iter', 'n_jobs',
+            'search_report']
 
     @property
     def _state(self):
@@ -104,25 +148,97 @@ class SklearnPolicy(Policy):
         return X, y
 
     def _preprocess_data(self, X, y=None):
-        Xt = X.reshape(X.shape[0], -1)
+        if scipy.sparse.issparse(X):
+            # sparse features are already flattened
+            Xt = X
+        else:
+            Xt = X.reshape(X.shape[0], -1)
         if y is None:
             return Xt
         else:
             yt = self.label_encoder.transform(y)
             return Xt, yt
 
+    def _create_search(self, model, param_grid):
+        if self.search_strategy == 'random':
+            return RandomizedSearchCV(
+                model,
+                param_distributions=param_grid,
+                n_iter=self.n_iter,
+                cv=self.cv,
+                scoring=self.scoring,
+                n_jobs=self.n_jobs,
+                verbose=1,
+            )
+        elif self.search_strategy == 'halving':
+            try:
+                # noinspection PyUnresolvedReferences
+                from sklearn.experimental import enable_halving_search_cv
+                from sklearn.model_selection import HalvingGridSearchCV
+            except ImportError:
+                raise ImportError("The 'halving' search strategy needs "
+                                  "scikit-learn>=0.24.")
+            return HalvingGridSearchCV(
+                model,
+                param_grid=param_grid,
+                cv=self.cv,
+                scoring=self.scoring,
+                n_jobs=self.n_jobs,
+                verbose=1,
+            )
+        else:
+            return GridSearchCV(
+                model,
+                param_grid=param_grid,
+                cv=self.cv,
+                scoring=self.scoring,
+                n_jobs=self.n_jobs,
+                verbose=1,
+            )
+
     def _search_and_score(self, model, X, y, param_grid):
-        search = GridSearchCV(
-            model,
-            param_grid=param_grid,
-            cv=self.cv,
-            scoring='accuracy',
-            verbose=1,
-        )
+        search = self._create_search(model, param_grid)
+
+        start = time.time()
         search.fit(X, y)
-        print("Best params:", search.best_params_)
+        self.search_report = self._create_search_report(
+                search, time.time() - start)
+
+        logger.info("Best params: {}"
+                    "".format(self.search_report['best_params']))
         return search.best_estimator_, search.best_score_
 
+    def _create_search_report(self, search, duration):
+        # type: (Any, float) -> Dict[Text, Any]
+        """Summarises the cross validation results of every candidate,
+        the report can be dumped as json."""
+
+        results = search.cv_results_
+        split_keys = sorted((k for k in results
+                             if re.match(r'split\d+_test_score$', k)),
+                            key=lambda k: int(re.findall(r'\d+', k)[0]))
+
+        candidates = []
+        for i, params in enumerate(results['params']):
+            candidates.append({
+                'params': _json_params(params),
+                'mean_fit_time': float(results['mean_fit_time'][i]),
+                'std_fit_time': float(results['std_fit_time'][i]),
+                'mean_score_time': float(results['mean_score_time'][i]),
+                'mean_test_score': float(results['mean_test_score'][i]),
+                'split_test_scores': [float(results[k][i])
+                                      for k in split_keys]
+            })
+
+        return {
+            'search_strategy': self.search_strategy,
+            'n_jobs': self.n_jobs,
+            'duration': duration,
+            'best_params': _json_params(search.best_params_),
+            'best_score': float(search.best_score_),
+            'candidates': candidates
+        }
+
     def train(self,
               training_trackers,  # type: List[DialogueStateTracker]
               domain,  # type: Domain
@@ -132,6 +248,7 @@ class SklearnPolicy(Policy):
 
         training_data = self.featurize_for_training(training_trackers,
                                                     domain,
+                                                    sparse=self.sparse,
                                                     **kwargs)
 
         X, y = self._extract_training_data(training_data)
@@ -169,10 +286,18 @@ class SklearnPolicy(Policy):
 
     def predict_action_probabilities(self, tracker, domain):
         # type: (DialogueStateTracker, Domain) -> List[float]
-        X = self.featurizer.create_X([tracker], domain)
+        return self.predict_batch_action_probabilities([tracker], domain)[0]
+
+    def predict_batch_action_probabilities(self, trackers, domain):
+        # type: (List[DialogueStateTracker], Domain) -> List[List[float]]
+        if not trackers:
+            return []
+
+        X = self.featurizer.create_X(trackers, domain, sparse=self.sparse)
         Xt = self._preprocess_data(X)
         y_proba = self.model.predict_proba(Xt)
-        return self._postprocess_prediction(y_proba, domain)
+        return [self._postprocess_prediction(y_proba[i:i + 1], domain)
+                for i in range(len(trackers))]
 
     def persist(self, path):
         # type: (Text) -> None
@@ -183,6 +308,11 @@ class SklearnPolicy(Policy):
             filename = os.path.join(path, 'sklearn_model.pkl')
             with open(filename, 'wb') as f:
                 pickle.dump(self._state, f)
+
+            if self.search_report is not None:
+                utils.dump_obj_as_json_to_file(
+                        os.path.join(path, 'sklearn_search_report.json'),
+                        self.search_report)
         else:
             warnings.warn("Persist called without a trained model present. "
                           "Nothing to persist then!")
@@ -208,3 +338,18 @@ class SklearnPolicy(Policy):
 
         logger.info("Loaded sklearn model")
         return policy
+
+
+def _json_params(params):
+    # type: (Dict[Text, Any]) -> Dict[Text, Any]
+    """Converts parameter values which json can't dump to strings."""
+
+    json_params = {}
+    for name, value in params.items():
+        if isinstance(value, np.generic):
+            value = value.item()
+        if not isinstance(value, (int, float, bool, type(None)) +
+                          six.string_types):
+            value = str(value)
+        json_params[name] = value
+    return json_params
@@ -8,11 +8,12 @@ import warnings
 from types import LambdaType
 
 from apscheduler.schedulers.background import BackgroundScheduler
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple
 from typing import Text
 
 from rasa_core.actions import Action
 from rasa_core.actions.action import ActionRestart, ACTION_LISTEN_NAME
+from rasa_core.batching import MicroBatchScheduler
 from rasa_core.channels import UserMessage, InputChannel
 from rasa_core.channels.direct import CollectingOutputChannel
 from rasa_core.dispatcher import Dispatcher
@@ -34,6 +35,26 @@ scheduler.start()
 logger = logging.getLogger(__name__)
 
 
+class PredictionRequest(object):
+    """Request for the next action of a conversation.
+
+    Either starts the handling of the user message `text` or continues
+    the conversation after the caller executed `executed_action`, which
+    created `events`."""
+
+    def __init__(self,
+                 sender_id,  # type: Text
+                 text=None,  # type: Optional[Text]
+                 executed_action=None,  # type: Optional[Text]
+                 events=None  # type: Optional[List[Event]]
+                 ):
+        # type: (...) -> None
+        self.sender_id = sender_id
+        self.text = text
+        self.executed_action = executed_action
+        self.events = events or []
+
+
 class MessageProcessor(object):
     def __init__(self,
                  interpreter,  # type: NaturalLanguageInterpreter
@@ -59,15 +80,51 @@ class MessageProcessor(object):
         Each message gets processed directly after it got received."""
         input_channel.start_sync_listening(self.handle_message)
 
-    def handle_channel_asynchronous(self, message_queue):
+    def handle_channel_asynchronous(self, message_queue, num_workers=1):
+        # type: (Any, int) -> None
         """Handles incoming messages from the message queue.
 
-        An input channel should add messages to the queue asynchronously."""
-        while True:
-            message = message_queue.dequeue()
-            if message is None:
-                continue
-            self.handle_message(message)
+        An input channel should add messages to the queue asynchronously.
+
+        With more than one worker, the messages are handled by a pool of
+        `num_workers` threads. The conversations of different senders are
+        handled in parallel, while the messages of a sender are handled
+        one after another in the order they got dequeued."""
+
+        if num_workers > 1:
+            workers = MicroBatchScheduler(self._handle_messages,
+                                          max_batch_size=1,
+                                          max_latency=0,
+                                          num_workers=num_workers)
+        else:
+            workers = None
+
+        try:
+            while True:
+                message = message_queue.dequeue()
+                if message is None:
+                    continue
+                if workers is not None:
+                    workers.submit(message.sender_id, message)
+                else:
+                    self.handle_message(message)
+        finally:
+            if workers is not None:
+                # handles the messages that are still queued
+                workers.stop()
+
+    def _handle_messages(self, messages):
+        # type: (List[UserMessage]) -> List[Any]
+
+        results = []
+        for message in messages:
+            try:
+                results.append(self.handle_message(message))
+            except Exception as e:
+                logger.exception("Failed to handle message of sender "
+                                 "'{}': {}".format(message.sender_id, e))
+                results.append(e)
+        return results
 
     def handle_message(self, message):
         # type: (UserMessage) -> Optional[List[Text]]
@@ -76,13 +133,15 @@ class MessageProcessor(object):
         # preprocess message if necessary
         if self.message_preprocessor is not None:
             message.text = self.message_preprocessor(message.text)
-        # we have a Tracker instance for each user
-        # which maintains conversation state
-        tracker = self._get_tracker(message.sender_id)
-        self._handle_message_with_tracker(message, tracker)
-        self._predict_and_execute_next_action(message, tracker)
-        # save tracker state to continue conversation from this state
-        self._save_tracker(tracker)
+
+        with self._lock(message.sender_id):
+            # we have a Tracker instance for each user
+            # which maintains conversation state
+            tracker = self._get_tracker(message.sender_id)
+            self._handle_message_with_tracker(message, tracker)
+            self._predict_and_execute_next_action(message, tracker)
+            # save tracker state to continue conversation from this state
+            self._save_tracker(tracker)
 
         if isinstance(message.output_channel, CollectingOutputChannel):
             return message.output_channel.messages
@@ -92,6 +151,75 @@ class MessageProcessor(object):
     def start_message_handling(self, message):
         # type: (UserMessage) -> Dict[Text, Any]
 
+        with self._lock(message.sender_id):
+            tracker, response = self._start_message_handling(message)
+            if response is not None:
+                return response
+            return self._predict_next_and_return_state(tracker)
+
+    def continue_message_handling(self, sender_id, executed_action, events):
+        # type: (Text, Text, List[Event]) -> Dict[Text, Any]
+
+        with self._lock(sender_id):
+            tracker, response = self._continue_message_handling(
+                    sender_id, executed_action, events)
+            if response is not None:
+                return response
+            return self._predict_next_and_return_state(tracker)
+
+    def handle_prediction_requests(self, requests):
+        # type: (List[PredictionRequest]) -> List[Any]
+        """Handles the prediction requests of several conversations.
+
+        Every request either starts handling a user message, like
+        `start_message_handling`, or continues after an executed action,
+        like `continue_message_handling`. The next actions of all
+        conversations are predicted together. The requests need to
+        belong to different senders.
+
+        Returns the response of every request, a request that failed
+        gets the raised exception instead."""
+
+        with self._lock(*[r.sender_id for r in requests]):
+            return self._handle_prediction_requests(requests)
+
+    def _handle_prediction_requests(self, requests):
+        # type: (List[PredictionRequest]) -> List[Any]
+
+        results = [None] * len(requests)
+        to_predict = []
+        for i, request in enumerate(requests):
+            try:
+                if request.text is not None:
+                    tracker, results[i] = self._start_message_handling(
+                            UserMessage(request.text, None, request.sender_id))
+                else:
+                    tracker, results[i] = self._continue_message_handling(
+                            request.sender_id, request.executed_action,
+                            request.events)
+            except Exception as e:
+                results[i] = e
+                continue
+            if results[i] is None:
+                to_predict.append((i, tracker))
+
+        if to_predict:
+            trackers = [tracker for _, tracker in to_predict]
+            try:
+                states = self._predict_next_and_return_states(trackers)
+            except Exception as e:
+                states = [e] * len(to_predict)
+            for (i, _), state in zip(to_predict, states):
+                results[i] = state
+        return results
+
+    def _start_message_handling(self, message):
+        # type: (UserMessage) -> Tuple[DialogueStateTracker, Optional[Dict]]
+        """Logs the message on the tracker of its sender.
+
+        Returns the tracker together with the response, if the
+        conversation doesn't need a prediction of the next action."""
+
         # pre-process message if necessary
         if self.message_preprocessor is not None:
             message.text = self.message_preprocessor(message.text)
@@ -106,15 +234,23 @@ class MessageProcessor(object):
 
         # action loop. predicts actions until we hit action listen
         if self._should_handle_message(tracker):
-            return self._predict_next_and_return_state(tracker)
+            return tracker, None
         else:
-            return {"next_action": None,
-                    "info": "Bot is currently paused and no restart was "
-                            "received yet.",
-                    "tracker": tracker.current_state()}
-
-    def continue_message_handling(self, sender_id, executed_action, events):
-        # type: (Text, Text, List[Event]) -> Dict[Text, Any]
+            return tracker, {"next_action": None,
+                             "info": "Bot is currently paused and no "
+                                     "restart was received yet.",
+                             "tracker": tracker.current_state()}
+
+    def _continue_message_handling(self,
+                                   sender_id,  # type: Text
+                                   executed_action,  # type: Text
+                                   events  # type: List[Event]
+                                   ):
+        # type: (...) -> Tuple[DialogueStateTracker, Optional[Dict]]
+        """Logs the executed action on the tracker of the sender.
+
+        Returns the tracker together with the response, if the
+        conversation doesn't need a prediction of the next action."""
 
         tracker = self._get_tracker(sender_id)
         if executed_action != ACTION_LISTEN_NAME:
@@ -129,18 +265,29 @@ class MessageProcessor(object):
                                  "".format(executed_action))
 
         if self.should_predict_another_action(executed_action, events):
-            return self._predict_next_and_return_state(tracker)
+            return tracker, None
         else:
             self._save_tracker(tracker)
-            return {"next_action": None,
-                    "info": "You do not need to call continue after action "
-                            "listen got returned for the previous continue "
-                            "call. You are expected to call 'parse' with the "
-                            "next user message.",
-                    "tracker": tracker.current_state()}
+            return tracker, {
+                "next_action": None,
+                "info": "You do not need to call continue after action "
+                        "listen got returned for the previous continue "
+                        "call. You are expected to call 'parse' with the "
+                        "next user message.",
+                "tracker": tracker.current_state()}
 
     def _predict_next_and_return_state(self, tracker):
         action = self._get_next_action(tracker)
+        return self._return_state(tracker, action)
+
+    def _predict_next_and_return_states(self, trackers):
+        # type: (List[DialogueStateTracker]) -> List[Dict[Text, Any]]
+        actions = self.predict_next_actions(trackers)
+        return [self._return_state(tracker, action)
+                for tracker, action in zip(trackers, actions)]
+
+    def _return_state(self, tracker, action):
+        # type: (DialogueStateTracker, Action) -> Dict[Text, Any]
         # save tracker state to continue conversation from this state
         if action.name() == ACTION_LISTEN_NAME:
             # action listen always get logged automatically - no need to
@@ -173,26 +320,30 @@ class MessageProcessor(object):
                     return True
             return True  # tracker has probably been restarted
 
-        tracker = self._get_tracker(dispatcher.sender_id)
+        with self._lock(dispatcher.sender_id):
+            tracker = self._get_tracker(dispatcher.sender_id)
 
-        if (reminder_event.kill_on_user_message and
-                has_message_after_reminder(tracker)):
-            logger.debug("Canceled reminder because it is outdated. "
-                         "(event: {} id: {})".format(reminder_event.action_name,
-                                                     reminder_event.name))
-        else:
-            # necessary for proper featurization, otherwise the previous
-            # unrelated message would influence featurization
-            tracker.update(UserUttered.empty())
-            action = self.domain.action_for_name(reminder_event.action_name)
-            should_continue = self._run_action(action, tracker, dispatcher)
-            if should_continue:
-                user_msg = UserMessage(None,
-                                       dispatcher.output_channel,
-                                       dispatcher.sender_id)
-                self._predict_and_execute_next_action(user_msg, tracker)
-            # save tracker state to continue conversation from this state
-            self._save_tracker(tracker)
+            if (reminder_event.kill_on_user_message and
+                    has_message_after_reminder(tracker)):
+                logger.debug("Canceled reminder because it is outdated. "
+                             "(event: {} id: {})".format(
+                                    reminder_event.action_name,
+                                    reminder_event.name))
+            else:
+                # necessary for proper featurization, otherwise the previous
+                # unrelated message would influence featurization
+                tracker.update(UserUttered.empty())
+                action = self.domain.action_for_name(
+                        reminder_event.action_name)
+                should_continue = self._run_action(action, tracker,
+                                                   dispatcher)
+                if should_continue:
+                    user_msg = UserMessage(None,
+                                           dispatcher.output_channel,
+                                           dispatcher.sender_id)
+                    self._predict_and_execute_next_action(user_msg, tracker)
+                # save tracker state to continue conversation from this state
+                self._save_tracker(tracker)
 
     def _parse_message(self, message):
         # for testing - you can short-cut the NLU part with a message
@@ -366,6 +517,13 @@ class MessageProcessor(object):
         for e in events:
             tracker.update(e)
 
+    def _lock(self, *sender_ids):
+        # type: (*Text) -> Any
+        """Holds the tracker store locks of the senders."""
+
+        return self.tracker_store.lock(
+                *[s or UserMessage.DEFAULT_SENDER_ID for s in sender_ids])
+
     def _get_tracker(self, sender_id):
         # type: (Text) -> DialogueStateTracker
 
@@ -376,9 +534,40 @@ class MessageProcessor(object):
     def _save_tracker(self, tracker):
         self.tracker_store.save(tracker)
 
+    def predict_next_actions(self, trackers):
+        # type: (List[DialogueStateTracker]) -> List[Action]
+        """Predicts the next action of several trackers at once.
+
+        The trackers that need a prediction of the policies are passed
+        to the policy ensemble together, so every policy gets called
+        once for all of them."""
+
+        actions = [self._get_forced_action(tracker) for tracker in trackers]
+        to_predict = [i for i, action in enumerate(actions) if action is None]
+        if to_predict:
+            indices = self.policy_ensemble.predict_next_actions(
+                    [trackers[i] for i in to_predict], self.domain)
+            for i, idx in zip(to_predict, indices):
+                actions[i] = self.domain.action_for_index(idx)
+        return actions
+
     def _get_next_action(self, tracker):
         # type: (DialogueStateTracker) -> Action
 
+        action = self._get_forced_action(tracker)
+        if action is not None:
+            return action
+
+        idx = self.policy_ensemble.predict_next_action(tracker, self.domain)
+        return self.domain.action_for_index(idx)
+
+    def _get_forced_action(self, tracker):
+        # type: (DialogueStateTracker) -> Optional[Action]
+        """Returns the action that has to run next regardless of policies.
+
+        This is either a follow up action set by a previous action or
+        a restart requested by the user."""
+
         follow_up_action = tracker.follow_up_action
         if follow_up_action:
             tracker.clear_follow_up_action()
@@ -395,5 +584,4 @@ class MessageProcessor(object):
                 self.domain.restart_intent):
             return ActionRestart()
 
-        idx = self.policy_ensemble.predict_next_action(tracker, self.domain)
-        return self.domain.action_for_index(idx)
+        return None
@@ -13,20 +13,28 @@ import zipfile
 from functools import wraps
 
 import six
+import typing
 from builtins import str
 from klein import Klein
-from typing import Union, Text, Optional, Any
+from twisted.internet import defer, reactor
+from typing import Union, Text, Optional, Any, List, Tuple
 
 from rasa_core import utils, events
 from rasa_core.agent import Agent
+from rasa_core.batching import MicroBatchScheduler
+from rasa_core.channels import UserMessage
 from rasa_core.channels.direct import CollectingOutputChannel
 from rasa_core.interpreter import NaturalLanguageInterpreter
-from rasa_core.tracker_store import TrackerStore
+from rasa_core.processor import PredictionRequest
+from rasa_core.tracker_store import TrackerStore, CachedTrackerStore
 from rasa_core.trackers import DialogueStateTracker
 from rasa_core.version import __version__
 
 logger = logging.getLogger(__name__)
 
+if typing.TYPE_CHECKING:
+    from rasa_core.batching import ScheduledRequest
+
 
 def create_argument_parser():
     """Parse all the command line arguments for the server script."""
@@ -63,6 +71,30 @@ def create_argument_parser():
             type=str,
             default="rasa_core.log",
             help="store log file in specified file")
+    parser.add_argument(
+            '--max_batch_size',
+            type=int,
+            help="enable micro batching of the prediction requests. "
+                 "Requests are queued and processed in batches of up to "
+                 "this size on a pool of worker threads")
+    parser.add_argument(
+            '--max_batch_latency',
+            type=float,
+            default=0.01,
+            help="seconds a queued request waits at most for its batch "
+                 "to be filled before the batch gets processed")
+    parser.add_argument(
+            '--num_workers',
+            type=int,
+            default=4,
+            help="number of threads processing batches")
+    parser.add_argument(
+            '--lazy_loading',
+            action='store_true',
+            help="load slow to load policies (e.g. neural networks) in the "
+                 "background. Until they are loaded, the server answers "
+                 "using the remaining policies and `/status` reports that "
+                 "it is not ready yet")
 
     utils.add_logging_option_arguments(parser)
     return parser
@@ -86,6 +118,25 @@ def ensure_loaded_agent(f):
     return decorated
 
 
+def ensure_loaded_policies(f):
+    """Wraps a request handler predicting actions, ensuring the agent has
+    policies to predict with (a lazily loaded agent might not yet)."""
+
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        self = args[0]
+        request = args[1]
+
+        if not self.agent.policy_ensemble.can_predict:
+            request.setResponseCode(503)
+            request.setHeader('Content-Type', 'application/json')
+            return json.dumps(self.agent.policy_ensemble.loading_status())
+
+        return f(*args, **kwargs)
+
+    return decorated
+
+
 def bool_arg(request, name, default=True):
     # type: (Request, Text, bool) -> bool
     """Return a passed boolean argument of the request or a default.
@@ -189,7 +240,11 @@ class RasaCoreServer(object):
                  cors_origins=None,
                  action_factory=None,
                  auth_token=None,
-                 tracker_store=None):
+                 tracker_store=None,
+                 max_batch_size=None,
+                 max_batch_latency=0.01,
+                 num_workers=4,
+                 lazy_loading=False):
 
         utils.configure_file_logging(loglevel, logfile)
 
@@ -199,22 +254,100 @@ class RasaCoreServer(object):
         self.interpreter = interpreter
         self.tracker_store = tracker_store
         self.action_factory = action_factory
+        self.lazy_loading = lazy_loading
         self.agent = self._create_agent(model_directory, interpreter,
-                                        action_factory, tracker_store)
+                                        action_factory, tracker_store,
+                                        lazy_loading)
+
+        if max_batch_size:
+            self.scheduler = MicroBatchScheduler(self._handle_batch,
+                                                 max_batch_size,
+                                                 max_batch_latency,
+                                                 num_workers)
+        else:
+            self.scheduler = None
+
+    def _handle_batch(self, requests):
+        # type: (List[Union[PredictionRequest, UserMessage]]) -> List[Any]
+        """Handles a batch of requests collected by the scheduler.
+
+        The next actions of the prediction requests are predicted
+        together, messages to respond to are handled one by one."""
+
+        results = [None] * len(requests)
+        predictions = [(i, r) for i, r in enumerate(requests)
+                       if isinstance(r, PredictionRequest)]
+        if predictions:
+            responses = self.agent.handle_prediction_requests(
+                    [r for _, r in predictions])
+            for (i, _), response in zip(predictions, responses):
+                results[i] = response
+
+        for i, r in enumerate(requests):
+            if isinstance(r, UserMessage):
+                try:
+                    results[i] = self.agent.handle_message(
+                            r.text, output_channel=r.output_channel,
+                            sender_id=r.sender_id)
+                except Exception as e:
+                    results[i] = e
+        return results
+
+    def _schedule(self,
+                  request,  # type: Request
+                  sender_id,  # type: Text
+                  item,  # type: Union[PredictionRequest, UserMessage]
+                  endpoint,  # type: Text
+                  client_errors=()  # type: Tuple[type, ...]
+                  ):
+        # type: (...) -> defer.Deferred
+        """Queues a request in the scheduler.
+
+        The response is written once the batch of the request got
+        processed, exceptions of type `client_errors` are answered
+        with status 400."""
+
+        deferred = defer.Deferred()
+
+        def on_processed(scheduled):
+            reactor.callFromThread(deferred.callback, scheduled)
+
+        self.scheduler.submit(sender_id, item, on_processed)
+        deferred.addCallback(self._scheduled_response,
+                             request, endpoint, client_errors)
+        return deferred
+
+    @staticmethod
+    def _scheduled_response(scheduled, request, endpoint, client_errors):
+        # type: (ScheduledRequest, Request, Text, Tuple[type, ...]) -> Text
+
+        e = scheduled.exception
+        if e is None:
+            request.setResponseCode(200)
+            return json.dumps(scheduled.result)
+        elif isinstance(e, client_errors):
+            request.setResponseCode(400)
+        else:
+            request.setResponseCode(500)
+            logger.error("Caught an exception during "
+                         "{}: {}".format(endpoint, e))
+        return json.dumps({"error": "{}".format(e)})
 
     @staticmethod
     def _create_agent(
             model_directory,  # type: Text
             interpreter,  # type: Union[Text, NaturalLanguageInterpreter]
             action_factory=None,  # type: Optional[Text]
-            tracker_store=None  # type: Optional[TrackerStore]
+            tracker_store=None,  # type: Optional[TrackerStore]
+            lazy_loading=False  # type: bool
     ):
         # type: (...) -> Optional[Agent]
         try:
 
             return Agent.load(model_directory, interpreter,
                               tracker_store=tracker_store,
-                              action_factory=action_factory)
+                              action_factory=action_factory,
+                              lazy_policy_loading=lazy_loading)
         except Exception as e:
             logger.warn("Failed to load any agent model. Running "
                         "Rasa Core server with out loaded model now. {}"
@@ -233,6 +366,7 @@ class RasaCoreServer(object):
     @check_cors
     @requires_auth
     @ensure_loaded_agent
+    @ensure_loaded_policies
     def continue_predicting(self, request, sender_id):
         """Continue a prediction started with parse.
 
@@ -249,6 +383,15 @@ class RasaCoreServer(object):
         encoded_events = request_params.get("events", [])
         executed_action = request_params.get("executed_action", None)
         evts = events.deserialise_events(encoded_events)
+
+        if self.scheduler is not None:
+            return self._schedule(
+                    request, sender_id,
+                    PredictionRequest(sender_id,
+                                      executed_action=executed_action,
+                                      events=evts),
+                    "continue", client_errors=(ValueError,))
+
         try:
             response = self.agent.continue_message_handling(sender_id,
                                                             executed_action,
@@ -273,10 +416,12 @@ class RasaCoreServer(object):
         request_params = json.loads(
                 request.content.read().decode('utf-8', 'strict'))
         evts = events.deserialise_events(request_params)
-        tracker = self.agent.tracker_store.get_or_create_tracker(sender_id)
-        for e in evts:
-            tracker.update(e)
-        self.agent.tracker_store.save(tracker)
+        tracker_store = self.agent.tracker_store
+        with tracker_store.lock(sender_id):
+            tracker = tracker_store.get_or_create_tracker(sender_id)
+            for e in evts:
+                tracker.update(e)
+            tracker_store.save(tracker)
         return json.dumps(tracker.current_state())
 
     @app.route("/conversations",
@@ -322,10 +467,10 @@ class RasaCoreServer(object):
         tracker = DialogueStateTracker.from_dict(sender_id,
                                                  request_params,
                                                  self.agent.domain)
-        self.agent.tracker_store.save(tracker)
 
         # will override an existing tracker with the same id!
-        self.agent.tracker_store.save(tracker)
+        with self.agent.tracker_store.lock(sender_id):
+            self.agent.tracker_store.save(tracker)
         return json.dumps(tracker.current_state(should_include_events=True))
 
     @app.route("/conversations/<sender_id>/parse",
@@ -333,6 +478,7 @@ class RasaCoreServer(object):
     @check_cors
     @requires_auth
     @ensure_loaded_agent
+    @ensure_loaded_policies
     def parse(self, request, sender_id):
         request.setHeader('Content-Type', 'application/json')
         request_params = request_parameters(request)
@@ -345,6 +491,11 @@ class RasaCoreServer(object):
             request.setResponseCode(400)
             return json.dumps({"error": "Invalid parse parameter specified"})
 
+        if self.scheduler is not None:
+            return self._schedule(request, sender_id,
+                                  PredictionRequest(sender_id, text=message),
+                                  "parse")
+
         try:
             response = self.agent.start_message_handling(message, sender_id)
             request.setResponseCode(200)
@@ -360,6 +511,7 @@ class RasaCoreServer(object):
     @check_cors
     @requires_auth
     @ensure_loaded_agent
+    @ensure_loaded_policies
     def respond(self, request, sender_id):
         request.setHeader('Content-Type', 'application/json')
         request_params = request_parameters(request)
@@ -372,6 +524,12 @@ class RasaCoreServer(object):
             request.setResponseCode(400)
             return json.dumps({"error": "Invalid respond parameter specified"})
 
+        if self.scheduler is not None:
+            out = CollectingOutputChannel()
+            return self._schedule(request, sender_id,
+                                  UserMessage(message, out, sender_id),
+                                  "respond")
+
         try:
             out = CollectingOutputChannel()
             responses = self.agent.handle_message(message,
@@ -405,11 +563,49 @@ class RasaCoreServer(object):
         logger.debug("Unzipped model to {}".format(
                 os.path.abspath(self.model_directory)))
 
-        self.agent = self._create_agent(self.model_directory, self.interpreter,
-                                        self.action_factory, self.tracker_store)
+        self.agent = self._create_agent(self.model_directory,
+                                        self.interpreter,
+                                        self.action_factory,
+                                        self.tracker_store,
+                                        self.lazy_loading)
         logger.debug("Finished loading new agent.")
         return json.dumps({'success': 1})
 
+    @app.route("/metrics",
+               methods=['GET', 'OPTIONS'])
+    @check_cors
+    def metrics(self, request):
+        """Queue depth and batch sizes of the request scheduler and the
+        statistics of the tracker cache."""
+
+        request.setHeader('Content-Type', 'application/json')
+        metrics = {"scheduler": None, "tracker_cache": None}
+        if self.scheduler is not None:
+            metrics["scheduler"] = self.scheduler.metrics()
+        if (self.agent is not None and
+                isinstance(self.agent.tracker_store, CachedTrackerStore)):
+            metrics["tracker_cache"] = self.agent.tracker_store.stats()
+        return json.dumps(metrics)
+
+    @app.route("/status",
+               methods=['GET', 'OPTIONS'])
+    @check_cors
+    def status(self, request):
+        """Whether the policies of the model are loaded, responds with
+        status 503 until the server is ready to use all of them."""
+
+        request.setHeader('Content-Type', 'application/json')
+        if self.agent is None:
+            request.setResponseCode(503)
+            return json.dumps({"status": "no_model",
+                               "loaded_policies": [],
+                               "error": None})
+
+        status = self.agent.policy_ensemble.loading_status()
+        if status["status"] != "ready":
+            request.setResponseCode(503)
+        return json.dumps(status)
+
     @app.route("/version",
                methods=['GET', 'OPTIONS'])
     @check_cors
@@ -432,7 +628,11 @@ if __name__ == '__main__':
                           cmdline_args.loglevel,
                           cmdline_args.log_file,
                           cmdline_args.cors,
-                          auth_token=cmdline_args.auth_token)
+                          auth_token=cmdline_args.auth_token,
+                          max_batch_size=cmdline_args.max_batch_size,
+                          max_batch_latency=cmdline_args.max_batch_latency,
+                          num_workers=cmdline_args.num_workers,
+                          lazy_loading=cmdline_args.lazy_loading)
 
     logger.info("Started http server on port %s" % cmdline_args.port)
     rasa.app.run("0.0.0.0", cmdline_args.port)
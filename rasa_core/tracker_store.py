@@ -5,19 +5,88 @@ from __future__ import unicode_literals
 
 
 import logging
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
 
 import six.moves.cPickle as pickler
-from typing import Text, Optional
+from typing import Text, Optional, Iterator, List, Dict, Any
 
 from rasa_core.actions.action import ACTION_LISTEN_NAME
+from rasa_core.conversation import Dialogue
+from rasa_core.events import Event
 from rasa_core.trackers import DialogueStateTracker, ActionExecuted
 
 logger = logging.getLogger(__name__)
 
 
+class SenderLocks(object):
+    """Hands out a lock for every sender id.
+
+    Holding the lock of a sender while its tracker gets retrieved,
+    updated and saved makes sure that concurrent requests of the same
+    sender can't overwrite each others updates. Locks of senders that
+    are not used by any thread are dropped."""
+
+    def __init__(self):
+        # sender id -> [lock, number of threads holding or waiting for it]
+        self._locks = {}
+        self._guard = threading.Lock()
+
+    @contextmanager
+    def lock(self, *sender_ids):
+        # type: (*Text) -> Iterator[None]
+        """Holds the locks of all passed senders.
+
+        The locks are always acquired in the same order, so threads
+        locking overlapping sets of senders can't deadlock."""
+
+        sender_ids = sorted(set(sender_ids))
+        with self._guard:
+            locks = []
+            for sender_id in sender_ids:
+                entry = self._locks.setdefault(sender_id,
+                                               [threading.RLock(), 0])
+                entry[1] += 1
+                locks.append(entry[0])
+
+        acquired = []
+        try:
+            for lock in locks:
+                lock.acquire()
+                acquired.append(lock)
+            yield
+        finally:
+            for lock in reversed(acquired):
+                lock.release()
+            with self._guard:
+                for sender_id in sender_ids:
+                    entry = self._locks[sender_id]
+                    entry[1] -= 1
+                    if entry[1] == 0:
+                        del self._locks[sender_id]
+
+    def __len__(self):
+        # type: () -> int
+        with self._guard:
+            return len(self._locks)
+
+
 class TrackerStore(object):
     def __init__(self, domain):
         self.domain = domain
+        self.sender_locks = SenderLocks()
+
+    def lock(self, *sender_ids):
+        # type: (*Text) -> Iterator[None]
+        """Context manager that serializes the updates of conversations.
+
+        Trackers should be retrieved, updated and saved while holding the
+        lock of their sender, otherwise concurrent updates of the same
+        conversation get lost."""
+
+        return self.sender_locks.lock(*sender_ids)
 
     def get_or_create_tracker(self, sender_id):
         tracker = self.retrieve(sender_id)
@@ -55,13 +124,23 @@ class TrackerStore(object):
 
     @staticmethod
     def serialise_tracker(tracker):
-        dialogue = tracker.as_dialogue()
-        return pickler.dumps(dialogue)
+        """Serialises the dialogue of the tracker together with a snapshot
+        of its state, which avoids replaying the events on retrieval."""
+
+        serialised = {"dialogue": tracker.as_dialogue(),
+                      "snapshot": tracker.as_snapshot()}
+        return pickler.dumps(serialised)
 
     def deserialise_tracker(self, sender_id, _json):
-        dialogue = pickler.loads(_json)
+        stored = pickler.loads(_json)
         tracker = self.init_tracker(sender_id)
-        tracker.recreate_from_dialogue(dialogue)
+        if isinstance(stored, Dialogue):
+            # trackers stored without a snapshot
+            tracker.recreate_from_dialogue(stored)
+        else:
+            tracker.recreate_from_snapshot(stored["dialogue"].events,
+                                           stored["snapshot"],
+                                           self.domain)
         return tracker
 
 
@@ -88,6 +167,126 @@ class InMemoryTrackerStore(TrackerStore):
     def keys(self):
         return self.store.keys()
 
+
+class CachedTrackerStore(TrackerStore):
+    """Keeps recently used trackers of another tracker store in memory.
+
+    Saved trackers are written through to the wrapped store and a copy of
+    them is kept in memory, so retrieving the tracker of an active
+    conversation neither deserialises the tracker nor replays its events.
+    Every caller gets its own copy of the cached tracker (copies share
+    their events, see `DialogueStateTracker.copy`), so changes that
+    weren't saved are never visible to other callers. At most `max_size`
+    trackers are cached, the least recently used ones are evicted first.
+    Trackers that weren't used for `ttl` seconds are retrieved from the
+    wrapped store again.
+
+    The cache only knows about the trackers saved through it. If several
+    processes share the wrapped store (e.g. a `RedisTrackerStore`), a
+    process keeps returning its cached tracker even after another process
+    saved a newer version of it. Either route all messages of a sender to
+    the same process or set a `ttl` that bounds how stale a tracker may
+    get."""
+
+    def __init__(self, tracker_store, max_size=1000, ttl=None):
+        # type: (TrackerStore, int, Optional[float]) -> None
+
+        self.tracker_store = tracker_store
+        self.max_size = max_size
+        self.ttl = ttl
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        # sender id -> (tracker, last use)
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        super(CachedTrackerStore, self).__init__(tracker_store.domain)
+
+    @property
+    def domain(self):
+        return self.tracker_store.domain
+
+    @domain.setter
+    def domain(self, domain):
+        self.tracker_store.domain = domain
+
+    def save(self, tracker):
+        self.tracker_store.save(tracker)
+        self._cache_tracker(tracker)
+
+    def retrieve(self, sender_id):
+        tracker = self._cached_tracker(sender_id)
+        if tracker is not None:
+            return tracker
+
+        tracker = self.tracker_store.retrieve(sender_id)
+        if tracker is not None:
+            self._cache_tracker(tracker)
+        return tracker
+
+    @staticmethod
+    def _isolated_copy(tracker):
+        # type: (DialogueStateTracker) -> DialogueStateTracker
+        """Copies the tracker, keeping its sender and event limit."""
+
+        copied = tracker.copy()
+        copied.sender_id = tracker.sender_id
+        copied._max_event_history = tracker._max_event_history
+        copied.events = tracker.events.copy()
+        return copied
+
+    def keys(self):
+        return self.tracker_store.keys()
+
+    def stats(self):
+        # type: () -> Dict[Text, Any]
+        """Returns the number of cached trackers, cache hits and misses."""
+
+        with self._cache_lock:
+            return {
+                "size": len(self._cache),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions
+            }
+
+    def _cache_tracker(self, tracker):
+        # type: (DialogueStateTracker) -> None
+
+        cached = self._isolated_copy(tracker)
+        with self._cache_lock:
+            self._cache.pop(tracker.sender_id, None)
+            self._cache[tracker.sender_id] = (cached, time.time())
+            while len(self._cache) > self.max_size:
+                self._cache.popitem(last=False)
+                self.evictions += 1
+
+    def _cached_tracker(self, sender_id):
+        # type: (Text) -> Optional[DialogueStateTracker]
+        """Returns a copy of the cached tracker of the sender."""
+
+        with self._cache_lock:
+            entry = self._cache.pop(sender_id, None)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            tracker, last_used = entry
+            now = time.time()
+            if self.ttl is not None and now - last_used > self.ttl:
+                logger.debug("Cached tracker for id '{}' expired."
+                             "".format(sender_id))
+                self.evictions += 1
+                self.misses += 1
+                return None
+
+            self._cache[sender_id] = (tracker, now)
+            self.hits += 1
+            return self._isolated_copy(tracker)
+
+
 class RedisTrackerStore(TrackerStore):
 
     def __init__(self, domain, mock=False, host='localhost',
@@ -112,3 +311,101 @@ class RedisTrackerStore(TrackerStore):
             return self.deserialise_tracker(sender_id, stored)
         else:
             return None
+
+
+class RedisEventLogTrackerStore(TrackerStore):
+    """Stores the events of every conversation in a redis list.
+
+    Instead of serialising the whole dialogue on every save, only the
+    events that got logged since the last save are appended to the list.
+    Every `snapshot_interval` events a snapshot of the trackers state is
+    stored, so that retrieving a tracker only replays the events that
+    happened after the latest snapshot."""
+
+    EVENTS_PREFIX = "events:"
+
+    SNAPSHOT_PREFIX = "snapshot:"
+
+    def __init__(self, domain, mock=False, host='localhost',
+                 port=6379, db=0, password=None, snapshot_interval=50):
+
+        if mock:
+            import fakeredis
+            self.red = fakeredis.FakeStrictRedis()
+        else:  # pragma: no cover
+            import redis
+            self.red = redis.StrictRedis(host=host, port=port, db=db,
+                                         password=password)
+        self.snapshot_interval = snapshot_interval
+        super(RedisEventLogTrackerStore, self).__init__(domain)
+
+    def save(self, tracker):
+        events_key = self.EVENTS_PREFIX + tracker.sender_id
+        snapshot_key = self.SNAPSHOT_PREFIX + tracker.sender_id
+        events = list(tracker.events)
+
+        num_stored = self.red.llen(events_key)
+        if self._is_stored_prefix(events_key, num_stored, events):
+            new_events = events[num_stored:]
+        else:
+            # the events of the tracker have been replaced (e.g. by
+            # setting the tracker via the server), so the list is rewritten
+            logger.debug("Rewriting the events of tracker for "
+                         "id '{}'.".format(tracker.sender_id))
+            num_stored = 0
+            new_events = events
+
+        pipe = self.red.pipeline()
+        if num_stored == 0:
+            pipe.delete(events_key, snapshot_key)
+        if new_events:
+            pipe.rpush(events_key, *[pickler.dumps(e) for e in new_events])
+        if self._needs_snapshot(num_stored, len(events)):
+            pipe.set(snapshot_key, pickler.dumps(tracker.as_snapshot()))
+        pipe.execute()
+
+    def _is_stored_prefix(self, events_key, num_stored, events):
+        # type: (Text, int, List[Event]) -> bool
+        """Checks that the stored events are the oldest events of the tracker.
+
+        Comparing the latest stored event is sufficient, as events are only
+        ever appended to a tracker."""
+
+        if num_stored == 0 or num_stored > len(events):
+            return False
+        latest_stored = self.red.lindex(events_key, num_stored - 1)
+        return latest_stored == pickler.dumps(events[num_stored - 1])
+
+    def _needs_snapshot(self, num_stored, num_events):
+        # type: (int, int) -> bool
+        """A snapshot is taken whenever the number of events passes a
+        multiple of the snapshot interval."""
+
+        if self.snapshot_interval <= 0:
+            return False
+        return (num_events // self.snapshot_interval >
+                num_stored // self.snapshot_interval)
+
+    def retrieve(self, sender_id):
+        pipe = self.red.pipeline()
+        pipe.lrange(self.EVENTS_PREFIX + sender_id, 0, -1)
+        pipe.get(self.SNAPSHOT_PREFIX + sender_id)
+        stored_events, stored_snapshot = pipe.execute()
+
+        if not stored_events:
+            return None
+
+        events = [pickler.loads(e) for e in stored_events]
+        if stored_snapshot is not None:
+            snapshot = pickler.loads(stored_snapshot)
+        else:
+            snapshot = None
+
+        tracker = self.init_tracker(sender_id)
+        tracker.recreate_from_snapshot(events, snapshot, self.domain)
+        return tracker
+
+    def keys(self):
+        prefix_length = len(self.EVENTS_PREFIX)
+        return [key.decode('utf-8')[prefix_length:]
+                for key in self.red.keys(self.EVENTS_PREFIX + "*")]
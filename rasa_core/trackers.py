@@ -5,8 +5,9 @@ from __future__ import unicode_literals
 
 import copy
 import io
+import itertools
 import logging
-from collections import deque
+from hashlib import sha1
 
 import jsonpickle
 import typing
@@ -23,6 +24,7 @@ logger = logging.getLogger(__name__)
 
 if typing.TYPE_CHECKING:
     from rasa_core.actions import Action
+    from rasa_core.domain import Domain
 
 
 class DialogueStateTracker(object):
@@ -80,6 +82,20 @@ class DialogueStateTracker(object):
         self.latest_action_name = None
         self.latest_message = None
         self.latest_bot_utterance = None
+        # cached states of the finished turns, see `past_states`
+        self._past_states = None
+        self._past_states_domain = None
+        # hash of the cached states, see `past_states_hash`
+        self._past_states_hash = None
+        # state of the current turn, valid until the next event
+        self._latest_state = None
+        # number of `past_states` calls served without featurizing again
+        self.num_reused_states = 0
+        # applied events and index after the latest restart of the first
+        # `_num_indexed_events` events, see `applied_events`
+        self._applied_events = None
+        self._idx_after_latest_restart = 0
+        self._num_indexed_events = 0
         self._reset()
 
     ###
@@ -151,23 +167,31 @@ class DialogueStateTracker(object):
 
         If the conversation has not been restarted, ``0`` is returned."""
 
-        idx = 0
-        for i, event in enumerate(self.events):
-            if isinstance(event, Restarted):
-                idx = i + 1
-        return idx
+        self._ensure_events_are_indexed()
+        return self._idx_after_latest_restart
 
     def events_after_latest_restart(self):
         # type: () -> List[Event]
         """Return a list of events after the most recent restart."""
-        return list(self.events)[self.idx_after_latest_restart():]
+
+        events = list(self._reversed_events_after_latest_restart())
+        events.reverse()
+        return events
+
+    def _reversed_events_after_latest_restart(self):
+        # type: () -> Iterator[Event]
+        """Iterates over the events after the most recent restart, starting
+        with the latest event, without going through the older events."""
+
+        num_events = len(self.events) - self.idx_after_latest_restart()
+        return itertools.islice(reversed(self.events), num_events)
 
     @property
     def previous_topic(self):
         # type: () -> Optional[Text]
         """Retrieves the topic that was set before the current one."""
 
-        for event in reversed(self.events_after_latest_restart()):
+        for event in self._reversed_events_after_latest_restart():
             if isinstance(event, TopicSet):
                 return event.topic
         return None
@@ -205,33 +229,55 @@ class DialogueStateTracker(object):
 
         yield tracker  # yields the final state
 
+    def past_states(self, domain):
+        # type: (Domain) -> List[Dict[Text, float]]
+        """Returns the active states for each state of the trackers history.
+
+        The states of all finished turns are cached on the tracker and
+        extended whenever an action gets logged. Hence, only the current
+        state needs to be computed. The cache is rebuilt from the events
+        after a reset of the tracker (restarts and reverts) or if a
+        different domain is used.
+
+        The current state is kept until the next event gets logged, so
+        all policies predicting on the same tracker share the states."""
+
+        self._ensure_past_states(domain)
+
+        if self._latest_state is None:
+            self._latest_state = domain.get_active_states(self)
+        else:
+            self.num_reused_states += 1
+
+        # callers are allowed to modify the returned list (e.g. padding)
+        return list(self._past_states) + [self._latest_state]
+
+    def past_states_hash(self, domain):
+        # type: (Domain) -> Text
+        """Returns a hash of the active states of the trackers history.
+
+        Trackers with equal active states (ignoring the values of the
+        features) have equal hashes. The hash of the finished turns is
+        extended together with the cached states, so only the current
+        state needs to be hashed."""
+
+        self._ensure_past_states(domain)
+
+        if self._latest_state is None:
+            self._latest_state = domain.get_active_states(self)
+
+        return self._extend_states_hash(self._past_states_hash,
+                                        self._latest_state)
+
     def applied_events(self):
         # type: () -> List[Event]
-        """Returns all actions that should be applied - w/o reverted events."""
-        def undo_till_previous(event_type, done_events):
-            """Removes events from `done_events` until `event_type` is found."""
-            # list gets modified - hence we need to copy events!
-            for e in reversed(done_events[:]):
-                del done_events[-1]
-                if isinstance(e, event_type):
-                    break
-
-        applied_events = []
-        for event in self.events:
-            if isinstance(event, Restarted):
-                applied_events = []
-            elif isinstance(event, ActionReverted):
-                undo_till_previous(ActionExecuted, applied_events)
-            elif isinstance(event, UserUtteranceReverted):
-                # Seeing a user uttered event automatically implies there was
-                # a listen event right before it, so we'll first rewind the
-                # user utterance, then get the action right before it (the
-                # listen action).
-                undo_till_previous(UserUttered, applied_events)
-                undo_till_previous(ActionExecuted, applied_events)
-            else:
-                applied_events.append(event)
-        return applied_events
+        """Returns all actions that should be applied - w/o reverted events.
+
+        The applied events are kept up to date while the tracker gets
+        updated, callers are allowed to modify the returned list."""
+
+        self._ensure_events_are_indexed()
+        return list(self._applied_events)
 
     def replay_events(self):
         # type: () -> None
@@ -257,9 +303,96 @@ class DialogueStateTracker(object):
         self.events.extend(dialogue.events)
         self.replay_events()
 
+    def as_snapshot(self):
+        # type: () -> Dict[Text, Any]
+        """Return the current state of the tracker without its events.
+
+        Together with the events of the tracker, the snapshot recreates
+        the tracker without replaying the events that happened before
+        the snapshot got taken (see ``recreate_from_snapshot``)."""
+
+        if self.follow_up_action is not None:
+            follow_up_action = self.follow_up_action.name()
+        else:
+            follow_up_action = None
+
+        return {
+            "num_events": len(self.events),
+            "slots": self.current_slot_values(),
+            "paused": self._paused,
+            "latest_action_name": self.latest_action_name,
+            "latest_message": self.latest_message,
+            "latest_bot_utterance": self.latest_bot_utterance,
+            "follow_up_action": follow_up_action,
+            "topics": [t.name for t in self._topic_stack]
+        }
+
+    def recreate_from_snapshot(self, events, snapshot, domain):
+        # type: (List[Event], Optional[Dict[Text, Any]], Domain) -> None
+        """Use a snapshot and the events of the conversation to update the
+        trackers state.
+
+        Only the events that were logged after the snapshot got taken are
+        replayed. Without a snapshot, or if the snapshot doesn't fit the
+        events, all events are replayed like in ``recreate_from_dialogue``.
+        """
+
+        if snapshot is None or snapshot["num_events"] > len(events):
+            self.recreate_from_dialogue(Dialogue(self.sender_id, events))
+            return
+
+        self._reset()
+        num_events = snapshot["num_events"]
+        self.events.extend(events[:num_events])
+
+        for name, value in snapshot["slots"].items():
+            if name in self.slots:
+                self.slots[name].value = value
+        self._paused = snapshot["paused"]
+        self.latest_action_name = snapshot["latest_action_name"]
+        self.latest_message = snapshot["latest_message"]
+        self.latest_bot_utterance = snapshot["latest_bot_utterance"]
+        if snapshot["follow_up_action"] is not None:
+            self.follow_up_action = domain.action_for_name(
+                    snapshot["follow_up_action"])
+        for topic in snapshot["topics"]:
+            self._topic_stack.push(topic)
+
+        for event in events[num_events:]:
+            self.update(event)
+
     def copy(self):
-        """Creates a duplicate of this tracker"""
-        return self.travel_back_in_time(float("inf"))
+        # type: () -> DialogueStateTracker
+        """Creates a duplicate of this tracker.
+
+        Instead of replaying the events, the duplicate takes over the state
+        of this tracker. The events, the cached states and the applied
+        events are shared lists, so the two trackers keep sharing the items
+        they have in common, even after they got updated."""
+        from rasa_core.channels import UserMessage
+
+        if (self.events.maxlen is not None and
+                len(self.events) >= self.events.maxlen):
+            # events might have been dropped, so the duplicate (which has
+            # no limit) needs to replay the remaining ones
+            return self.travel_back_in_time(float("inf"))
+
+        tracker = copy.copy(self)
+        tracker._past_states_domain = self._past_states_domain
+        tracker.sender_id = UserMessage.DEFAULT_SENDER_ID
+        tracker._max_event_history = None
+        tracker.events = self.events.copy(unlimited=True)
+        tracker.slots = {name: copy.copy(slot)
+                         for name, slot in self.slots.items()}
+        tracker._topic_stack = utils.TopicStack(self.topics,
+                                                list(self._topic_stack),
+                                                self.default_topic)
+        if self._past_states is not None:
+            tracker._past_states = self._past_states.copy()
+        if self._applied_events is not None:
+            tracker._applied_events = self._applied_events.copy()
+        tracker.num_reused_states = 0
+        return tracker
 
     def travel_back_in_time(self, target_time):
         # type: (float) -> DialogueStateTracker
@@ -296,6 +429,12 @@ class DialogueStateTracker(object):
             raise ValueError("event to log must be an instance "
                              "of a subclass of Event.")
 
+        if self._past_states is not None:
+            self._update_past_states(event)
+        self._latest_state = None
+        if self._applied_events is not None:
+            self._update_event_index(event)
+
         self.events.append(event)
         event.apply_to(self)
 
@@ -326,6 +465,8 @@ class DialogueStateTracker(object):
         """Reset tracker to initial state - doesn't delete events though!."""
 
         self._reset_slots()
+        self._past_states = None
+        self._latest_state = None
         self._paused = False
         self.latest_action_name = None
         self.latest_message = UserUttered.empty()
@@ -334,6 +475,110 @@ class DialogueStateTracker(object):
         self._topic_stack = utils.TopicStack(self.topics, [],
                                              self.default_topic)
 
+    def _update_past_states(self, event):
+        # type: (Event) -> None
+        """Extends the cached history states before the event is applied."""
+
+        if (self.events.maxlen is not None and
+                len(self.events) >= self.events.maxlen):
+            # the oldest event is about to be dropped, so the cached
+            # history doesn't match the stored events anymore
+            self._past_states = None
+        elif self._past_states_domain is None:
+            # unpickled tracker, see `restore_past_states_domain`
+            self._past_states = None
+        elif isinstance(event, ActionExecuted):
+            if self._latest_state is None:
+                self._latest_state = (
+                    self._past_states_domain.get_active_states(self))
+            self._past_states.append(self._latest_state)
+            self._past_states_hash = self._extend_states_hash(
+                    self._past_states_hash, self._latest_state)
+
+    def _ensure_past_states(self, domain):
+        # type: (Domain) -> None
+        """Rebuilds the cached states, if they are missing or were created
+        with a different domain."""
+
+        if (self._past_states is None or
+                self._past_states_domain is not domain):
+            prior_states = [domain.get_active_states(tr)
+                            for tr in self.generate_all_prior_trackers()]
+            # the last prior tracker is the current state, which
+            # will change with the next event
+            self._past_states = utils.SharedList(prior_states[:-1])
+            self._past_states_domain = domain
+            self._past_states_hash = None
+            for state in self._past_states:
+                self._past_states_hash = self._extend_states_hash(
+                        self._past_states_hash, state)
+            self._latest_state = None
+
+    @staticmethod
+    def _extend_states_hash(states_hash, state):
+        # type: (Optional[Text], Dict[Text, float]) -> Text
+        """Extends the hash of a sequence of states with the next state.
+
+        Unlike ``hash``, the digest doesn't change between processes."""
+
+        features = "\n".join(sorted(state))
+        if states_hash is not None:
+            features = states_hash + "\n\n" + features
+        return sha1(features.encode("utf-8")).hexdigest()
+
+    def _update_event_index(self, event):
+        # type: (Event) -> None
+        """Extends the applied events before the event is appended."""
+
+        if ((self.events.maxlen is not None and
+                len(self.events) >= self.events.maxlen) or
+                self._num_indexed_events != len(self.events)):
+            # the oldest event is about to be dropped or the events were
+            # modified directly, so the index needs to be rebuilt
+            self._applied_events = None
+        else:
+            self._index_event(event)
+
+    def _ensure_events_are_indexed(self):
+        # type: () -> None
+        """Rebuilds the applied events, if they don't match the events."""
+
+        if (self._applied_events is None or
+                self._num_indexed_events != len(self.events)):
+            self._applied_events = utils.SharedList()
+            self._idx_after_latest_restart = 0
+            self._num_indexed_events = 0
+            for event in self.events:
+                self._index_event(event)
+
+    def _index_event(self, event):
+        # type: (Event) -> None
+        """Updates the applied events with the next event of the tracker."""
+
+        self._num_indexed_events += 1
+        if isinstance(event, Restarted):
+            self._applied_events = utils.SharedList()
+            self._idx_after_latest_restart = self._num_indexed_events
+        elif isinstance(event, ActionReverted):
+            self._undo_till_previous(ActionExecuted)
+        elif isinstance(event, UserUtteranceReverted):
+            # Seeing a user uttered event automatically implies there was
+            # a listen event right before it, so we'll first rewind the
+            # user utterance, then get the action right before it (the
+            # listen action).
+            self._undo_till_previous(UserUttered)
+            self._undo_till_previous(ActionExecuted)
+        else:
+            self._applied_events.append(event)
+
+    def _undo_till_previous(self, event_type):
+        # type: (type) -> None
+        """Removes applied events until `event_type` is found."""
+
+        while self._applied_events:
+            if isinstance(self._applied_events.pop(), event_type):
+                break
+
     def _reset_slots(self):
         # type: () -> None
         """Set all the slots to their initial value."""
@@ -353,11 +598,27 @@ class DialogueStateTracker(object):
                          "".format(key))
 
     def _create_events(self, evts):
-        # type: (List[Event]) -> deque
+        # type: (List[Event]) -> utils.SharedList
 
         if evts and not isinstance(evts[0], Event):  # pragma: no cover
             raise ValueError("events, if given, must be a list of events")
-        return deque(evts, self._max_event_history)
+        return utils.SharedList(evts, self._max_event_history)
+
+    def restore_past_states_domain(self, domain):
+        # type: (Domain) -> None
+        """Re-attaches the domain of the cached states after unpickling.
+
+        The domain isn't pickled along with the tracker, so the caller
+        needs to pass the domain the cached states were created with."""
+
+        if self._past_states is not None and self._past_states_domain is None:
+            self._past_states_domain = domain
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        # don't pickle the domain of the cached states with every tracker
+        state["_past_states_domain"] = None
+        return state
 
     def __eq__(self, other):
         if isinstance(other, type(self)):
@@ -72,6 +72,12 @@ def create_argument_parser():
             type=int,
             default=50,
             help="how much data augmentation to use during training")
+    parser.add_argument(
+            '--cache_dir',
+            type=str,
+            default=None,
+            help="directory to cache the generated and featurized training "
+                 "data in, repeated runs on the same stories reuse it")
 
     utils.add_logging_option_arguments(parser)
     return parser
@@ -84,7 +90,8 @@ def train_dialogue_model(domain_file, stories_file, output_path,
         kwargs = {}
 
     agent = Agent(domain_file, policies=[MemoizationPolicy(), KerasPolicy()])
-    training_data = agent.load_data(stories_file)
+    training_data = agent.load_data(stories_file,
+                                    cache_dir=kwargs.get("cache_dir"))
 
     if use_online_learning:
         if nlu_model_path:
@@ -115,7 +122,8 @@ if __name__ == '__main__':
         "epochs": cmdline_args.epochs,
         "batch_size": cmdline_args.batch_size,
         "validation_split": cmdline_args.validation_split,
-        "augmentation_factor": cmdline_args.augmentation
+        "augmentation_factor": cmdline_args.augmentation,
+        "cache_dir": cmdline_args.cache_dir
     }
 
     train_dialogue_model(cmdline_args.domain,
@@ -37,14 +37,33 @@ def load_data(
         augmentation_factor=20,  # type: int
         max_number_of_trackers=2000,  # type: int
         tracker_limit=None,  # type: Optional[int]
-        use_story_concatenation=True  # type: bool
-
+        use_story_concatenation=True,  # type: bool
+        num_workers=1,  # type: int
+        cache_dir=None  # type: Optional[Text]
 ):
     # type: (...) -> List[DialogueStateTracker]
+    """Generates the training trackers from the stories in `resource_name`.
+
+    If a `cache_dir` is passed, trackers which were generated from the same
+    stories, domain and configuration before are loaded from the cache."""
     from rasa_core.training import extract_story_graph
+    from rasa_core.training.cache import TrainingDataCache
     from rasa_core.training.generator import TrainingDataGenerator
 
     if resource_name:
+        if cache_dir:
+            cache = TrainingDataCache(cache_dir)
+            key = cache.trackers_key(resource_name, domain, {
+                "remove_duplicates": remove_duplicates,
+                "augmentation_factor": augmentation_factor,
+                "max_number_of_trackers": max_number_of_trackers,
+                "tracker_limit": tracker_limit,
+                "use_story_concatenation": use_story_concatenation
+            })
+            trackers = cache.load_trackers(key, domain)
+            if trackers is not None:
+                return trackers
+
         graph = extract_story_graph(resource_name, domain)
 
         g = TrainingDataGenerator(graph, domain,
@@ -52,8 +71,13 @@ def load_data(
                                   augmentation_factor,
                                   max_number_of_trackers,
                                   tracker_limit,
-                                  use_story_concatenation)
-        return g.generate()
+                                  use_story_concatenation,
+                                  num_workers)
+        trackers = g.generate()
+
+        if cache_dir:
+            cache.save_trackers(key, trackers)
+        return trackers
     else:
         return []
 
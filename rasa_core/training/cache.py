@@ -0,0 +1,234 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import io
+import json
+import logging
+import os
+from hashlib import sha1
+
+import jsonpickle
+import numpy as np
+import scipy.sparse
+import six.moves.cPickle as pickler
+import typing
+from typing import Text, List, Optional, Dict, Any
+
+from rasa_core import utils
+from rasa_core.channels import UserMessage
+from rasa_core.trackers import DialogueStateTracker
+from rasa_core.training.data import DialogueTrainingData
+
+logger = logging.getLogger(__name__)
+
+if typing.TYPE_CHECKING:
+    from rasa_core.domain import Domain
+    from rasa_core.events import Event
+    from rasa_core.featurizers import TrackerFeaturizer
+
+
+def _hash_text(text):
+    # type: (Text) -> Text
+    return sha1(text.encode("utf-8")).hexdigest()
+
+
+def _domain_fingerprint(domain):
+    # type: (Domain) -> Dict[Text, Any]
+    """Parts of the domain the generated and featurized trackers depend on."""
+
+    return {
+        "states": domain.input_states,
+        "actions": domain.action_names,
+        "slots": [[slot.name, slot.persistence_info()]
+                  for slot in domain.slots],
+        "topics": [topic.name for topic in domain.topics],
+        "store_entities_as_slots": domain.store_entities_as_slots
+    }
+
+
+def _event_fingerprint(event):
+    # type: (Event) -> Dict[Text, Any]
+    """Content of an event, without the time at which it was created."""
+
+    fingerprint = event.as_dict()
+    fingerprint.pop("timestamp", None)
+    fingerprint["unpredictable"] = getattr(event, "unpredictable", None)
+    return fingerprint
+
+
+def _json_default(value):
+    # type: (Any) -> Any
+    """Serialises values json doesn't support, e.g. sets, numpy values or
+    custom objects stored in slots, in a deterministic way."""
+
+    if isinstance(value, (set, frozenset)):
+        return sorted(json.dumps(v, sort_keys=True, default=_json_default)
+                      for v in value)
+    elif isinstance(value, (np.generic, np.ndarray)):
+        return value.tolist()
+    else:
+        return jsonpickle.encode(value)
+
+
+class TrainingDataCache(object):
+    """Caches generated training trackers and featurized training data.
+
+    The entries are stored in sub directories of `cache_dir`, named after a
+    hash of everything they were created from. Changing the stories, the
+    domain or the generator or featurizer configuration leads to a new
+    entry instead of overwriting the old one. Hence, repeated runs (e.g.
+    with different policy hyperparameters) skip straight to model fitting.
+
+    The featurized training data is stored as numpy files which are
+    memory-mapped when they are loaded again."""
+
+    def __init__(self, cache_dir):
+        # type: (Text) -> None
+
+        self.cache_dir = cache_dir
+
+    def trackers_key(self, resource_name, domain, config):
+        # type: (Text, Domain, Dict[Text, Any]) -> Text
+        """Key of the trackers generated from the stories in
+        `resource_name` using the generator configuration `config`."""
+        from rasa_nlu import utils as nlu_utils
+
+        story_hashes = []
+        for f in sorted(nlu_utils.list_files(resource_name)):
+            with io.open(f, "rb") as story_file:
+                story_hashes.append(sha1(story_file.read()).hexdigest())
+
+        return _hash_text(json.dumps({
+            "stories": story_hashes,
+            "domain": _domain_fingerprint(domain),
+            "config": config
+        }, sort_keys=True))
+
+    def load_trackers(self, key, domain):
+        # type: (Text, Domain) -> Optional[List]
+        """Loads the cached trackers, returns `None` if there are none.
+
+        Like the trackers returned by the generator, they have no limit
+        on their event history, the events got truncated when they were
+        generated."""
+
+        path = os.path.join(self.cache_dir, key, "trackers.pkl")
+        if not os.path.isfile(path):
+            return None
+
+        with io.open(path, "rb") as f:
+            stored = pickler.load(f)
+
+        trackers = []
+        for serialised in stored:
+            tracker = DialogueStateTracker(UserMessage.DEFAULT_SENDER_ID,
+                                           domain.slots,
+                                           domain.topics,
+                                           domain.default_topic)
+            tracker.recreate_from_snapshot(serialised["events"],
+                                           serialised["snapshot"],
+                                           domain)
+            trackers.append(tracker)
+
+        logger.debug("Loaded {} cached training trackers from '{}'."
+                     "".format(len(trackers), path))
+        return trackers
+
+    def save_trackers(self, key, trackers):
+        # type: (Text, List[DialogueStateTracker]) -> None
+
+        path = os.path.join(self.cache_dir, key, "trackers.pkl")
+        utils.create_dir_for_file(path)
+
+        serialised = [{"events": list(tracker.events),
+                       "snapshot": tracker.as_snapshot()}
+                      for tracker in trackers]
+        with io.open(path, "wb") as f:
+            pickler.dump(serialised, f, protocol=pickler.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def training_data_key(trackers, domain, featurizer, sparse=False):
+        # type: (List[DialogueStateTracker], Domain, Any, bool) -> Text
+        """Key of the training data `featurizer` creates from the trackers.
+
+        Needs to be computed before the featurizer is used, as the
+        featurizer changes while it featurizes the trackers."""
+
+        tracker_hash = sha1()
+        for tracker in trackers:
+            events = [_event_fingerprint(e) for e in tracker.events]
+            tracker_hash.update(json.dumps(events, sort_keys=True,
+                                           default=_json_default)
+                                .encode("utf-8"))
+
+        return _hash_text(json.dumps({
+            "trackers": tracker_hash.hexdigest(),
+            "domain": _domain_fingerprint(domain),
+            "featurizer": jsonpickle.encode(featurizer),
+            "sparse": sparse
+        }, sort_keys=True))
+
+    def featurize_trackers(self,
+                           featurizer,  # type: TrackerFeaturizer
+                           trackers,  # type: List[DialogueStateTracker]
+                           domain,  # type: Domain
+                           sparse=False  # type: bool
+                           ):
+        # type: (...) -> Any
+        """Featurizes the trackers, unless the training data is cached.
+
+        In that case, the featurizer is restored to the state it would
+        have after featurizing the trackers. Sparse features are stored
+        as a compressed sparse matrix, which is loaded into memory."""
+
+        key = self.training_data_key(trackers, domain, featurizer, sparse)
+        path = os.path.join(self.cache_dir, key)
+        featurizer_file = os.path.join(path, "featurizer.json")
+
+        if os.path.isfile(featurizer_file):
+            with io.open(featurizer_file, "r") as f:
+                featurized = jsonpickle.decode(f.read())
+            featurizer.__dict__.update(featurized.__dict__)
+
+            logger.debug("Loaded cached training data from '{}'."
+                         "".format(path))
+            if sparse:
+                X = scipy.sparse.load_npz(os.path.join(path, "X.npz"))
+            else:
+                X = self._load_array(path, "X")
+            return DialogueTrainingData(X,
+                                        self._load_array(path, "y"),
+                                        self._load_array(path, "true_length"))
+
+        training_data = featurizer.featurize_trackers(trackers, domain,
+                                                      sparse=sparse)
+
+        utils.create_dir_for_file(featurizer_file)
+        if sparse:
+            scipy.sparse.save_npz(os.path.join(path, "X.npz"),
+                                  training_data.X)
+        else:
+            np.save(os.path.join(path, "X.npy"), training_data.X)
+        np.save(os.path.join(path, "y.npy"), training_data.y)
+        np.save(os.path.join(path, "true_length.npy"),
+                np.array(training_data.true_length))
+        # written last, marks the entry as complete
+        with io.open(featurizer_file, "w") as f:
+            f.write(str(jsonpickle.encode(featurizer)))
+
+        return training_data
+
+    @staticmethod
+    def _load_array(path, name):
+        # type: (Text, Text) -> np.ndarray
+        """Memory-maps an array, modifications are not written back."""
+
+        array_file = os.path.join(path, name + ".npy")
+        try:
+            return np.load(array_file, mmap_mode="c")
+        except ValueError:
+            # arrays of python objects (e.g. dialogues of different
+            # lengths) can't be memory-mapped
+            return np.load(array_file, allow_pickle=True)
@@ -45,3 +45,70 @@ class DialogueTrainingData(object):
     def append(self, X, y):
         self.X = np.vstack((self.X, X))
         self.y = np.vstack((self.y, y))
+
+
+class DialogueTrainingDataBatches(object):
+    """Training data which is featurized one batch at a time.
+
+    Only the states and actions of the training examples are kept in
+    memory, so the memory needed for the features is bounded by the batch
+    size instead of the size of the whole padded training data."""
+
+    def __init__(self, featurizer, trackers_as_states, trackers_as_actions,
+                 domain, batch_size, indices=None):
+        self.featurizer = featurizer
+        self.trackers_as_states = trackers_as_states
+        self.trackers_as_actions = trackers_as_actions
+        self.domain = domain
+        self.batch_size = batch_size
+        if indices is None:
+            indices = np.arange(len(trackers_as_states))
+        self.indices = indices
+
+    def __len__(self):
+        """Number of batches."""
+        return -(-self.num_examples() // self.batch_size)
+
+    def __getitem__(self, batch_idx):
+        """Featurizes the batch with the index `batch_idx`, returns X, y."""
+
+        start = batch_idx * self.batch_size
+        idx = self.indices[start:start + self.batch_size]
+        return self.featurizer.featurize_batch(
+                [self.trackers_as_states[i] for i in idx],
+                [self.trackers_as_actions[i] for i in idx],
+                self.domain)
+
+    def limit_training_data_to(self, max_samples):
+        self.indices = self.indices[:max_samples]
+
+    def is_empty(self):
+        """Check if the training data does contain training samples."""
+        return self.num_examples() == 0
+
+    def num_examples(self):
+        return len(self.indices)
+
+    def shuffle(self):
+        np.random.shuffle(self.indices)
+
+    def split(self, validation_split):
+        """Splits off the last examples as validation data.
+
+        Works like the `validation_split` of keras, returns `None` as
+        validation data if there are no validation examples."""
+
+        split_at = int(self.num_examples() * (1. - validation_split))
+        if split_at == self.num_examples():
+            return self, None
+
+        return (self._with_indices(self.indices[:split_at]),
+                self._with_indices(self.indices[split_at:]))
+
+    def _with_indices(self, indices):
+        return DialogueTrainingDataBatches(self.featurizer,
+                                           self.trackers_as_states,
+                                           self.trackers_as_actions,
+                                           self.domain,
+                                           self.batch_size,
+                                           indices)
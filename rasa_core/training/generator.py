@@ -7,18 +7,19 @@ from __future__ import unicode_literals
 import copy
 import json
 import logging
+import multiprocessing
 import random
 from collections import defaultdict, namedtuple
 
 import typing
 from tqdm import tqdm
-from typing import Optional, List, Text, Set, Dict
+from typing import Optional, List, Text, Set, Dict, Tuple, Any
 
 from rasa_core import utils
 from rasa_core.channels import UserMessage
 from rasa_core.events import (
     ActionExecuted, UserUttered,
-    ActionReverted, UserUtteranceReverted)
+    ActionReverted, UserUtteranceReverted, Event)
 from rasa_core.trackers import DialogueStateTracker
 from rasa_core.training.structures import (
     StoryGraph, STORY_END, STORY_START, StoryStep,
@@ -39,6 +40,64 @@ ExtractorConfig = namedtuple("ExtractorConfig", "remove_duplicates "
 # define types
 TrackerLookupDict = Dict[Optional[Text], List[DialogueStateTracker]]
 
+# domain of the training data generator in a worker process
+_worker_domain = None
+
+
+def _init_worker(domain):
+    # type: (Domain) -> None
+    global _worker_domain
+    _worker_domain = domain
+
+
+def _apply_step_events(
+        incoming_trackers,  # type: List[DialogueStateTracker]
+        events,  # type: List[Event]
+        offset=0  # type: int
+):
+    # type: (...) -> Tuple[List[DialogueStateTracker], List[Tuple]]
+    """Applies the events of a story step to copies of the trackers.
+
+    Returns the updated trackers and the trackers copied before a
+    revert event. The copies are keyed by the index of the event and
+    the index of the tracker (counted from `offset`), so the results of
+    different chunks of trackers can be merged in order."""
+
+    # need to copy the tracker as multiple story steps
+    # might start with the same checkpoint and all of them
+    # will use the same set of incoming trackers
+    trackers = [tracker.copy() for tracker in incoming_trackers]
+    new_trackers = []
+    for i, event in enumerate(events):
+        for j, tracker in enumerate(trackers):
+            if isinstance(event, (ActionReverted, UserUtteranceReverted)):
+                new_trackers.append(((i, offset + j), tracker.copy()))
+
+            tracker.update(event)
+
+    return trackers, new_trackers
+
+
+def _process_chunk(args):
+    # type: (Tuple) -> Tuple[List[DialogueStateTracker], List[Tuple], Any]
+    """Applies the events of a story step to a chunk of trackers in a
+    worker process. Also computes the featurization hashes of the
+    resulting trackers if duplicates need to be removed."""
+
+    incoming_trackers, events, offset, remove_duplicates = args
+    for tracker in incoming_trackers:
+        tracker.restore_past_states_domain(_worker_domain)
+
+    trackers, new_trackers = _apply_step_events(incoming_trackers,
+                                                events, offset)
+    if remove_duplicates:
+        hashes = ([t.past_states_hash(_worker_domain) for t in trackers],
+                  [t.past_states_hash(_worker_domain)
+                   for _, t in new_trackers])
+    else:
+        hashes = None
+    return trackers, new_trackers, hashes
+
 
 class TrainingDataGenerator(object):
     def __init__(
@@ -49,14 +108,20 @@ class TrainingDataGenerator(object):
             augmentation_factor=20,  # type: int
             max_number_of_trackers=2000,  # type: int
             tracker_limit=None,  # type: Optional[int]
-            use_story_concatenation=True  # type: bool
+            use_story_concatenation=True,  # type: bool
+            num_workers=1  # type: int
     ):
         """Given a set of story parts, generates all stories that are possible.
 
         The different story parts can end and start with checkpoints
         and this generator will match start and end checkpoints to
         connect complete stories. Afterwards, duplicate stories will be
-        removed and the data is augmented (if augmentation is enabled)."""
+        removed and the data is augmented (if augmentation is enabled).
+
+        With more than one worker, the trackers reaching a story step are
+        split into chunks which are processed by a pool of `num_workers`
+        processes. The generated trackers are the same as with a single
+        worker."""
 
         self.hashed_featurizations = set()
         self.story_graph = story_graph.with_cycles_removed()
@@ -68,10 +133,25 @@ class TrainingDataGenerator(object):
                 tracker_limit=tracker_limit,
                 use_story_concatenation=use_story_concatenation,
                 rand=random.Random(42))
+        self.num_workers = num_workers
 
     def generate(self):
         # type: () -> List[DialogueStateTracker]
 
+        if self.num_workers > 1:
+            pool = multiprocessing.Pool(self.num_workers,
+                                        initializer=_init_worker,
+                                        initargs=(self.domain,))
+            try:
+                return self._generate(pool)
+            finally:
+                pool.terminate()
+        else:
+            return self._generate()
+
+    def _generate(self, pool=None):
+        # type: (Optional[Any]) -> List[DialogueStateTracker]
+
         self._mark_first_action_in_story_steps_as_unpredictable()
 
         unused_checkpoints = set()  # type: Set[Text]
@@ -127,7 +207,8 @@ class TrainingDataGenerator(object):
                     incoming_trackers = self._subsample_trackers(
                             incoming_trackers)
 
-                    trackers = self._process_step(step, incoming_trackers)
+                    trackers = self._process_step(step, incoming_trackers,
+                                                  pool)
 
                     # update progress bar
                     pbar.set_postfix({
@@ -227,7 +308,8 @@ class TrainingDataGenerator(object):
     def _process_step(
             self,
             step,  # type: StoryStep
-            incoming_trackers  # type: List[DialogueStateTracker]
+            incoming_trackers,  # type: List[DialogueStateTracker]
+            pool=None  # type: Optional[Any]
     ):
         # type: (...) -> List[DialogueStateTracker]
         """Processes a steps events with all trackers.
@@ -237,42 +319,84 @@ class TrainingDataGenerator(object):
         data while processing the story step."""
 
         events = step.explicit_events(self.domain)
-        # need to copy the tracker as multiple story steps
-        # might start with the same checkpoint and all of them
-        # will use the same set of incoming trackers
-        trackers = [tracker.copy() for tracker in
-                    incoming_trackers] if events else []  # small optimization
-        new_trackers = []
-        for event in events:
-            for tracker in trackers:
-                if isinstance(event, (ActionReverted, UserUtteranceReverted)):
-                    new_trackers.append(tracker.copy())
+        if not events:
+            return []  # small optimization
 
-                tracker.update(event)
+        if pool is not None and len(incoming_trackers) > 1:
+            return self._process_step_in_pool(events, incoming_trackers,
+                                              pool)
 
-        trackers.extend(new_trackers)
+        trackers, new_trackers = _apply_step_events(incoming_trackers,
+                                                    events)
+        trackers.extend(t for _, t in new_trackers)
         if self.config.remove_duplicates:
             trackers = self._remove_duplicate_trackers(trackers)
 
         return trackers
 
-    def _remove_duplicate_trackers(self, trackers):
-        # type: (List[DialogueStateTracker]) -> List[DialogueStateTracker]
+    def _process_step_in_pool(
+            self,
+            events,  # type: List[Event]
+            incoming_trackers,  # type: List[DialogueStateTracker]
+            pool  # type: Any
+    ):
+        # type: (...) -> List[DialogueStateTracker]
+        """Processes a steps events with chunks of the trackers in the
+        worker processes of the pool.
+
+        The results are merged in the order in which the trackers would
+        have been processed by a single worker."""
+
+        chunk_size = -(-len(incoming_trackers) // self.num_workers)
+        chunks = [(incoming_trackers[i:i + chunk_size], events, i,
+                   self.config.remove_duplicates)
+                  for i in range(0, len(incoming_trackers), chunk_size)]
+
+        trackers = []
+        new_trackers = []
+        hashes = []
+        new_hashes = []
+        for ts, new_ts, hs in pool.map(_process_chunk, chunks):
+            trackers.extend(ts)
+            new_trackers.extend(new_ts)
+            if hs is not None:
+                hashes.extend(hs[0])
+                new_hashes.extend(zip((k for k, _ in new_ts), hs[1]))
+
+        new_trackers.sort(key=lambda x: x[0])
+        trackers.extend(t for _, t in new_trackers)
+        for tracker in trackers:
+            tracker.restore_past_states_domain(self.domain)
+
+        if self.config.remove_duplicates:
+            new_hashes.sort(key=lambda x: x[0])
+            hashes.extend(h for _, h in new_hashes)
+            trackers = self._remove_duplicate_trackers(trackers, hashes)
+
+        return trackers
+
+    def _remove_duplicate_trackers(self, trackers, hashes=None):
+        # type: (List[DialogueStateTracker], Optional[List[Text]]) -> ...
         """Removes trackers that create equal featurizations.
 
         From multiple trackers that create equal featurizations
         we only need to keep one. Because as we continue processing
         events and story steps, all trackers that created the
         same featurization once will do so in the future (as we
-        feed the same events to all trackers)."""
+        feed the same events to all trackers).
+
+        The featurizations are compared by the hashes of the trackers
+        states, which the trackers extend as they get updated. The
+        hashes can be passed if they were already computed (e.g. in a
+        worker process)."""
+
+        if hashes is None:
+            hashes = [t.past_states_hash(self.domain) for t in trackers]
 
         # collected trackers that created different featurizations
         unique_trackers = []
 
-        for tracker in trackers:
-            states = self.domain.states_for_tracker_history(tracker)
-            hashed = hash(tuple((frozenset(s) for s in states)))
-
+        for tracker, hashed in zip(trackers, hashes):
             # only continue with trackers that created a
             # hashed_featurization we haven't observed
             if hashed not in self.hashed_featurizations:
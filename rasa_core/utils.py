@@ -15,7 +15,7 @@ import six
 import yaml
 from builtins import input, range, str
 from numpy import all, array
-from typing import Text, Any, List, Optional
+from typing import Text, Any, List, Optional, Iterable
 
 
 def configure_file_logging(loglevel, logfile):
@@ -319,6 +319,159 @@ class HashableNDArray(object):
         return self.__wrapped
 
 
+class _Link(object):
+    """Immutable link of a `SharedList`, holding an item and the link of
+    the item before it."""
+
+    __slots__ = ('item', 'previous', 'length')
+
+    def __init__(self, item, previous):
+        self.item = item
+        self.previous = previous
+        self.length = previous.length + 1 if previous is not None else 1
+
+
+class SharedList(object):
+    """List that shares its items with its copies.
+
+    The items are stored in immutable links pointing to the link of the
+    previous item. A copy takes over the latest link, so copying is O(1)
+    and copies share all the items they have in common. Appending to or
+    popping from one of the copies only replaces its latest link and never
+    affects the others.
+
+    Like a ``deque``, the list keeps only the newest `maxlen` items if
+    `maxlen` is given."""
+
+    def __init__(self, items=(), maxlen=None):
+        self._latest = None
+        self._length = 0
+        self._maxlen = maxlen
+        # items as a python list, created when needed, see `_as_list`
+        self._items = None
+        self.extend(items)
+
+    @property
+    def maxlen(self):
+        # type: () -> Optional[int]
+        return self._maxlen
+
+    def copy(self, unlimited=False):
+        # type: (bool) -> SharedList
+        """Creates a copy sharing the items of this list.
+
+        If `unlimited` is set, the copy keeps all items appended to it
+        instead of only the newest `maxlen` ones."""
+
+        duplicate = SharedList.__new__(SharedList)
+        duplicate.__dict__.update(self.__dict__)
+        if unlimited:
+            duplicate._maxlen = None
+        return duplicate
+
+    __copy__ = copy
+
+    def append(self, item):
+        # type: (Any) -> None
+
+        self._latest = _Link(item, self._latest)
+        self._items = None
+        if self._maxlen is None or self._length < self._maxlen:
+            self._length += 1
+        elif self._latest.length > 2 * self._maxlen:
+            # lets go of the links of the dropped items
+            self._relink()
+
+    def extend(self, items):
+        # type: (Iterable[Any]) -> None
+
+        for item in items:
+            self.append(item)
+
+    def pop(self):
+        # type: () -> Any
+
+        if not self._length:
+            raise IndexError("pop from an empty list")
+        item = self._latest.item
+        self._latest = self._latest.previous
+        self._length -= 1
+        self._items = None
+        return item
+
+    def _relink(self):
+        # type: () -> None
+
+        items = self._as_list()
+        self._latest = None
+        for item in items:
+            self._latest = _Link(item, self._latest)
+        self._items = items
+
+    def _as_list(self):
+        # type: () -> List[Any]
+        """The items as a python list, which must not be modified."""
+
+        if self._items is None:
+            items = list(reversed(self))
+            items.reverse()
+            self._items = items
+        return self._items
+
+    def __len__(self):
+        return self._length
+
+    def __iter__(self):
+        return iter(self._as_list())
+
+    def __reversed__(self):
+        link = self._latest
+        for _ in range(self._length):
+            yield link.item
+            link = link.previous
+
+    def __getitem__(self, index):
+        if isinstance(index, slice) or self._items is not None:
+            return self._as_list()[index]
+
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError("list index out of range")
+        link = self._latest
+        for _ in range(self._length - 1 - index):
+            link = link.previous
+        return link.item
+
+    def __eq__(self, other):
+        if isinstance(other, SharedList):
+            if (self._latest is other._latest and
+                    self._length == other._length):
+                return True
+            return (self._length == other._length and
+                    self._as_list() == other._as_list())
+        elif isinstance(other, (list, tuple, deque)):
+            return self._as_list() == list(other)
+        else:
+            return NotImplemented
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    __hash__ = None
+
+    def __getstate__(self):
+        return {"items": self._as_list(), "maxlen": self._maxlen}
+
+    def __setstate__(self, state):
+        self.__init__(state["items"], state["maxlen"])
+
+    def __repr__(self):
+        return "SharedList({!r}, maxlen={!r})".format(self._as_list(),
+                                                     self._maxlen)
+
+
 def fix_yaml_loader():
     """Ensure that any string read by yaml is represented as unicode."""
     from yaml import Loader, SafeLoader
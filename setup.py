@@ -73,7 +73,7 @@ setup(
         "Programming Language :: Python :: 3.6",
         "Topic :: Software Development :: Libraries",
     ],
-    packages=find_packages(exclude=["tests", "tools"]),
+    packages=find_packages(exclude=["tests", "tools", "benchmarks"]),
     version=__version__,
     install_requires=install_requires,
     tests_require=tests_requires,
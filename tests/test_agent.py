@@ -5,11 +5,17 @@ from __future__ import unicode_literals
 
 import pytest
 
+try:  # py3
+    from unittest.mock import patch
+except ImportError:  # py2
+    from mock import patch
+
 import rasa_core
 from rasa_core.agent import Agent
 from rasa_core.interpreter import RegexInterpreter, INTENT_MESSAGE_PREFIX
 from rasa_core.policies.augmented_memoization import \
     AugmentedMemoizationPolicy
+from rasa_core.policies.sklearn_policy import SklearnPolicy
 from rasa_core.tracker_store import InMemoryTrackerStore
 
 
@@ -39,6 +45,67 @@ def test_agent_train(tmpdir, default_domain):
            [type(p) for p in agent.policy_ensemble.policies]
 
 
+def test_agent_loads_policies_lazily(tmpdir):
+    training_data_file = 'examples/moodbot/data/stories.md'
+    agent = Agent("examples/moodbot/domain.yml",
+                  policies=[AugmentedMemoizationPolicy(), SklearnPolicy()])
+
+    training_data = agent.load_data(training_data_file)
+    agent.train(training_data)
+    agent.persist(tmpdir.strpath)
+
+    loaded = Agent.load(tmpdir.strpath, lazy_policy_loading=True)
+    # the memoization policy doesn't wait for the sklearn model
+    assert type(loaded.policy_ensemble.policies[0]) is \
+        AugmentedMemoizationPolicy
+
+    assert loaded.policy_ensemble.wait_until_ready(timeout=60)
+    assert loaded.policy_ensemble.loading_status()["status"] == "ready"
+    assert [type(p) for p in loaded.policy_ensemble.policies] == \
+           [AugmentedMemoizationPolicy, SklearnPolicy]
+
+
+def test_agent_waits_for_lazily_loaded_policies(tmpdir):
+    training_data_file = 'examples/moodbot/data/stories.md'
+    agent = Agent("examples/moodbot/domain.yml",
+                  policies=[SklearnPolicy()])
+
+    training_data = agent.load_data(training_data_file)
+    agent.train(training_data)
+    agent.persist(tmpdir.strpath)
+
+    loaded = Agent.load(tmpdir.strpath, lazy_policy_loading=True)
+    # none of the policies can be loaded right away, so the prediction
+    # waits for the background load
+    result = loaded.handle_message(INTENT_MESSAGE_PREFIX + 'greet',
+                                   sender_id="test_lazy_loading")
+
+    assert loaded.policy_ensemble.is_ready
+    assert result == agent.handle_message(INTENT_MESSAGE_PREFIX + 'greet',
+                                          sender_id="test_lazy_loading")
+
+
+def test_agent_reports_failed_lazy_loading(tmpdir):
+    training_data_file = 'examples/moodbot/data/stories.md'
+    agent = Agent("examples/moodbot/domain.yml",
+                  policies=[SklearnPolicy()])
+
+    training_data = agent.load_data(training_data_file)
+    agent.train(training_data)
+    agent.persist(tmpdir.strpath)
+
+    with patch.object(SklearnPolicy, 'load', side_effect=IOError("broken")):
+        loaded = Agent.load(tmpdir.strpath, lazy_policy_loading=True)
+        assert not loaded.policy_ensemble.wait_until_ready(timeout=60)
+
+    status = loaded.policy_ensemble.loading_status()
+    assert status["status"] == "failed"
+    assert status["error"] == "broken"
+    assert not loaded.policy_ensemble.can_predict
+    with pytest.raises(Exception):
+        loaded.handle_message(INTENT_MESSAGE_PREFIX + 'greet')
+
+
 def test_agent_handle_message(default_agent):
     message = INTENT_MESSAGE_PREFIX + 'greet{"name":"Rasa"}'
     result = default_agent.handle_message(message,
@@ -82,3 +149,19 @@ def test_agent_wrong_use_of_load(tmpdir, default_domain):
         # try to load a model file from a data path, which is nonsense and
         # should fail properly
         agent.load(training_data_file)
+
+
+def test_agent_predict_next_actions(default_agent):
+    trackers = []
+    for sender_id, intent in [("batch_1", "greet"), ("batch_2", "goodbye")]:
+        default_agent.start_message_handling(INTENT_MESSAGE_PREFIX + intent,
+                                             sender_id)
+        trackers.append(default_agent.tracker_store.retrieve(sender_id))
+
+    actions = default_agent.predict_next_actions(trackers)
+
+    ensemble = default_agent.policy_ensemble
+    domain = default_agent.domain
+    assert actions == [
+        domain.action_for_index(ensemble.predict_next_action(t, domain)).name()
+        for t in trackers]
@@ -0,0 +1,79 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import threading
+import time
+
+import pytest
+
+from rasa_core.batching import MicroBatchScheduler
+
+
+def test_scheduler_flushes_full_batches():
+    batches = []
+
+    def process(requests):
+        batches.append(list(requests))
+        return [r * 2 for r in requests]
+
+    scheduler = MicroBatchScheduler(process, max_batch_size=3,
+                                    max_latency=60, num_workers=1)
+    scheduled = [scheduler.submit("sender_{}".format(i), i)
+                 for i in range(3)]
+
+    assert [s.wait(timeout=5) for s in scheduled] == [0, 2, 4]
+    assert batches == [[0, 1, 2]]
+    scheduler.stop()
+
+
+def test_scheduler_flushes_after_latency():
+    scheduler = MicroBatchScheduler(lambda requests: requests,
+                                    max_batch_size=10, max_latency=0.05,
+                                    num_workers=1)
+    scheduled = scheduler.submit("sender", "request")
+
+    assert scheduled.wait(timeout=5) == "request"
+    assert scheduler.metrics()["last_batch_size"] == 1
+    scheduler.stop()
+
+
+def test_scheduler_keeps_order_of_sender():
+    processed = []
+    lock = threading.Lock()
+
+    def process(requests):
+        # a sender never has more than one request in a batch
+        assert len({sender for sender, _ in requests}) == len(requests)
+        time.sleep(0.01)
+        with lock:
+            processed.extend(requests)
+        return requests
+
+    scheduler = MicroBatchScheduler(process, max_batch_size=4,
+                                    max_latency=0.01, num_workers=4)
+    for i in range(20):
+        for sender in ["a", "b"]:
+            scheduler.submit(sender, (sender, i))
+    scheduler.stop()
+
+    for sender in ["a", "b"]:
+        assert [i for s, i in processed if s == sender] == list(range(20))
+    assert scheduler.queue_depth == 0
+    assert scheduler.metrics()["num_processed"] == 40
+
+
+def test_scheduler_returns_failures():
+    def process(requests):
+        return [ValueError(r) if r == "bad" else r for r in requests]
+
+    scheduler = MicroBatchScheduler(process, max_batch_size=2,
+                                    max_latency=0.01, num_workers=1)
+    good = scheduler.submit("a", "good")
+    bad = scheduler.submit("b", "bad")
+
+    assert good.wait(timeout=5) == "good"
+    with pytest.raises(ValueError):
+        bad.wait(timeout=5)
+    scheduler.stop()
@@ -5,14 +5,18 @@ from __future__ import unicode_literals
 
 import glob
 import json
+import time
 
 import io
 import jsonpickle
 import pytest
+import six.moves.cPickle as pickler
 
 from rasa_core.conversation import QuestionTopic
 from rasa_core.domain import TemplateDomain
-from rasa_core.tracker_store import InMemoryTrackerStore
+from rasa_core.events import SlotSet, UserUttered, ActionExecuted
+from rasa_core.tracker_store import (
+    InMemoryTrackerStore, RedisEventLogTrackerStore, CachedTrackerStore)
 from tests.utilities import tracker_from_dialogue_file
 
 
@@ -37,6 +41,118 @@ def test_inmemory_tracker_store(filename):
     assert restored == tracker
 
 
+def test_inmemory_tracker_store_loads_trackers_without_snapshot():
+    domain = TemplateDomain.load("data/test_domains/default_with_slots.yml")
+    filename = 'data/test_dialogues/enter_name.json'
+    tracker = tracker_from_dialogue_file(filename, domain)
+    tracker_store = InMemoryTrackerStore(domain)
+    # trackers used to be stored as pickled dialogues
+    tracker_store.store[tracker.sender_id] = pickler.dumps(
+            tracker.as_dialogue())
+
+    restored = tracker_store.retrieve(tracker.sender_id)
+    assert restored == tracker
+    assert restored.get_slot("name") == "holger"
+
+    tracker_store.save(restored)
+    restored = tracker_store.retrieve(tracker.sender_id)
+    assert restored == tracker
+    assert restored.get_slot("name") == "holger"
+
+
+@pytest.mark.parametrize("filename", glob.glob('data/test_dialogues/*json'))
+def test_event_log_tracker_store(filename):
+    domain = TemplateDomain.load("data/test_domains/default_with_topic.yml")
+    tracker = tracker_from_dialogue_file(filename, domain)
+    tracker_store = RedisEventLogTrackerStore(domain, mock=True,
+                                              snapshot_interval=3)
+    tracker_store.save(tracker)
+    restored = tracker_store.retrieve(tracker.sender_id)
+    assert restored == tracker
+    assert restored.current_slot_values() == tracker.current_slot_values()
+    assert restored.latest_message == tracker.latest_message
+    assert restored.latest_action_name == tracker.latest_action_name
+    assert restored.topic.name == tracker.topic.name
+
+
+def test_event_log_tracker_store_appends_new_events():
+    domain = TemplateDomain.load("data/test_domains/default_with_slots.yml")
+    filename = 'data/test_dialogues/enter_name.json'
+    tracker = tracker_from_dialogue_file(filename, domain)
+    tracker_store = RedisEventLogTrackerStore(domain, mock=True,
+                                              snapshot_interval=4)
+    events_key = tracker_store.EVENTS_PREFIX + tracker.sender_id
+    tracker_store.save(tracker)
+    num_events = len(tracker.events)
+
+    tracker = tracker_store.retrieve(tracker.sender_id)
+    tracker.update(ActionExecuted("action_listen"))
+    tracker.update(UserUttered("/greet", {"intent": {"name": "greet"}}))
+    tracker.update(SlotSet("name", "rasa"))
+    tracker_store.save(tracker)
+
+    assert tracker_store.red.llen(events_key) == num_events + 3
+    snapshot_key = tracker_store.SNAPSHOT_PREFIX + tracker.sender_id
+    assert tracker_store.red.get(snapshot_key) is not None
+    restored = tracker_store.retrieve(tracker.sender_id)
+    assert restored == tracker
+    assert restored.get_slot("name") == "rasa"
+    assert restored.latest_message.text == "/greet"
+
+    # a tracker with different events replaces the stored events
+    replaced = tracker_store.init_tracker(tracker.sender_id)
+    replaced.update(SlotSet("name", "core"))
+    tracker_store.save(replaced)
+
+    assert tracker_store.red.llen(events_key) == 1
+    restored = tracker_store.retrieve(tracker.sender_id)
+    assert restored == replaced
+    assert restored.get_slot("name") == "core"
+    assert tracker.sender_id in tracker_store.keys()
+
+
+def test_cached_tracker_store_returns_copies():
+    domain = TemplateDomain.load("data/test_domains/default_with_slots.yml")
+    tracker_store = CachedTrackerStore(InMemoryTrackerStore(domain))
+    tracker = tracker_store.get_or_create_tracker("cached")
+    tracker.update(SlotSet("name", "rasa"))
+    tracker_store.save(tracker)
+
+    cached = tracker_store.retrieve("cached")
+    assert cached is not tracker
+    assert cached == tracker
+    assert cached.sender_id == "cached"
+    assert tracker_store.stats()["hits"] == 1
+
+    # changes that weren't saved are not returned from the cache
+    tracker.update(SlotSet("name", "unsaved"))
+    cached.update(SlotSet("name", "unsaved"))
+    restored = tracker_store.retrieve("cached")
+    assert restored.get_slot("name") == "rasa"
+    assert len(restored.events) == len(tracker.events) - 1
+    assert tracker_store.stats()["hits"] == 2
+    assert list(tracker_store.keys()) == ["cached"]
+
+
+def test_cached_tracker_store_evicts_trackers():
+    domain = TemplateDomain.load("data/test_domains/default_with_slots.yml")
+    tracker_store = CachedTrackerStore(InMemoryTrackerStore(domain),
+                                       max_size=2, ttl=0.05)
+    trackers = [tracker_store.get_or_create_tracker(sender_id)
+                for sender_id in ["first", "second", "third"]]
+
+    assert tracker_store.stats()["size"] == 2
+    assert tracker_store.stats()["evictions"] == 1
+    assert tracker_store.retrieve("first") is not trackers[0]
+    assert tracker_store.retrieve("third") == trackers[2]
+    assert tracker_store.stats()["hits"] == 1
+
+    time.sleep(0.1)
+    restored = tracker_store.retrieve("third")
+    assert restored == trackers[2]
+    assert tracker_store.stats()["hits"] == 1
+
+
 def test_tracker_restaurant():
     domain = TemplateDomain.load("data/test_domains/default_with_slots.yml")
     filename = 'data/test_dialogues/enter_name.json'
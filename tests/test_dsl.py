@@ -220,3 +220,18 @@ def test_load_training_data_handles_hidden_files(tmpdir, default_domain):
 
     assert len(data.X) == 0
     assert len(data.y) == 0
+
+
+def test_generate_training_data_with_several_workers(default_domain):
+    from rasa_core.training.generator import TrainingDataGenerator
+
+    graph = training.extract_story_graph(
+            "data/test_stories/stories.md", default_domain)
+
+    trackers = TrainingDataGenerator(graph, default_domain).generate()
+    trackers_mul = TrainingDataGenerator(graph, default_domain,
+                                         num_workers=2).generate()
+
+    assert len(trackers) == len(trackers_mul)
+    for tracker, tracker_mul in zip(trackers, trackers_mul):
+        assert tracker.as_dialogue().events == tracker_mul.as_dialogue().events
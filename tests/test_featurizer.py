@@ -3,9 +3,14 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+from rasa_core import training
 from rasa_core.featurizers import TrackerFeaturizer, \
-    BinarySingleStateFeaturizer, ProbabilisticSingleStateFeaturizer
+    BinarySingleStateFeaturizer, ProbabilisticSingleStateFeaturizer, \
+    FullDialogueTrackerFeaturizer, MaxHistoryTrackerFeaturizer, \
+    LabelTokenizerSingleStateFeaturizer
 import numpy as np
+import pytest
+from tests.conftest import DEFAULT_STORIES_FILE
 
 
 def test_fail_to_load_non_existent_featurizer():
@@ -50,3 +55,93 @@ def test_probabilistic_featurizer_handles_intent_probs():
     f.num_features = len(f.input_state_map)
     encoded = f.encode({"intent_a": 0.5, "b": 0.2, "intent_c": 1.0})
     assert (encoded == np.array([0.5, 0, 1.0, 0.2])).all()
+
+
+@pytest.mark.parametrize("state_featurizer", [
+    BinarySingleStateFeaturizer,
+    ProbabilisticSingleStateFeaturizer,
+    LabelTokenizerSingleStateFeaturizer])
+def test_encode_batch_matches_encode(default_domain, state_featurizer):
+    trackers = training.load_data(DEFAULT_STORIES_FILE, default_domain)
+    f = state_featurizer()
+    f.prepare_from_domain(default_domain)
+    states = [state
+              for tracker in trackers
+              for state in default_domain.states_for_tracker_history(tracker)]
+    states.append(None)
+
+    encoded = f.encode_batch(states)
+
+    assert encoded.shape == (len(states), f.num_features)
+    for row, state in zip(encoded, states):
+        assert (row == f.encode(state)).all()
+
+
+def test_label_tokenizer_featurizer_counts_tokens():
+    f = LabelTokenizerSingleStateFeaturizer()
+    f.user_labels = ["intent_greet", "intent_goodbye"]
+    f.slot_labels = ["slot_name_0"]
+    f.bot_labels = ["action_listen", "utter_greet"]
+    f.user_vocab = {"goodbye": 0, "greet": 1, "intent": 2}
+    f.bot_vocab = {"action": 0, "greet": 1, "listen": 2, "utter": 3}
+    f.num_features = 8
+    encoded = f.encode({"intent_greet": 1.0,
+                        "slot_name_0": 1.0,
+                        "prev_action_listen": 1.0})
+    assert (encoded == np.array([0, 1, 1, 1, 1, 0, 1, 0])).all()
+
+    # user labels only count directly after listening
+    encoded = f.encode({"intent_greet": 1.0, "prev_utter_greet": 1.0})
+    assert (encoded == np.array([0, 0, 0, 0, 0, 1, 0, 1])).all()
+
+
+def test_full_dialogue_batch_is_padded_to_longest_dialogue(default_domain):
+    trackers = training.load_data(DEFAULT_STORIES_FILE, default_domain)
+    f = FullDialogueTrackerFeaturizer(BinarySingleStateFeaturizer())
+    f.featurize_trackers(trackers[:1], default_domain)
+
+    X, true_lengths = f.create_batch_X(trackers, default_domain)
+
+    assert X.shape[:2] == (len(trackers), max(true_lengths))
+    for tracker, x, length in zip(trackers, X, true_lengths):
+        single = f.create_X([tracker], default_domain)[0]
+        assert (x[:length] == single).all()
+        assert (x[length:] == -1).all()
+
+
+def test_full_dialogue_training_data_is_padded(default_domain):
+    trackers = training.load_data(DEFAULT_STORIES_FILE, default_domain)
+    f = FullDialogueTrackerFeaturizer(BinarySingleStateFeaturizer())
+    data = f.featurize_trackers(trackers, default_domain)
+
+    assert data.X.shape[:2] == data.y.shape[:2] == (len(trackers), f.max_len)
+    for x, y, length in zip(data.X, data.y, data.true_length):
+        assert (x[length:] == -1).all() and (y[length:] == -1).all()
+        assert (x[:length] >= 0).all()
+        assert (y[:length].sum(axis=-1) == 1).all()
+
+
+def test_batches_match_featurized_trackers(default_domain):
+    trackers = training.load_data(DEFAULT_STORIES_FILE, default_domain)
+    f = FullDialogueTrackerFeaturizer(BinarySingleStateFeaturizer())
+    data = f.featurize_trackers(trackers, default_domain)
+
+    batches = f.featurize_trackers_in_batches(trackers, default_domain, 3)
+    assert len(batches) == -(-data.num_examples() // 3)
+
+    Xs, ys = zip(*[batches[i] for i in range(len(batches))])
+    assert (np.concatenate(Xs) == data.X).all()
+    assert (np.concatenate(ys) == data.y).all()
+
+
+def test_sparse_features_match_flattened_dense_features(default_domain):
+    trackers = training.load_data(DEFAULT_STORIES_FILE, default_domain)
+    f = MaxHistoryTrackerFeaturizer(BinarySingleStateFeaturizer(),
+                                    max_history=3)
+    dense = f.featurize_trackers(trackers, default_domain)
+    sparse = f.featurize_trackers(trackers, default_domain, sparse=True)
+
+    n = dense.X.shape[0]
+    assert sparse.X.shape == (n, dense.X[0].size)
+    assert (sparse.X.toarray() == dense.X.reshape(n, -1)).all()
+    assert (sparse.y == dense.y).all()
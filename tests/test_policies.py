@@ -3,6 +3,12 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import base64
+import io
+import json
+import os
+import zlib
+
 from rasa_core import training
 from rasa_core.policies.embedding_policy import EmbeddingPolicy
 
@@ -12,6 +18,7 @@ except ImportError:  # py2
     from mock import patch
 import numpy as np
 import pytest
+import tensorflow as tf
 
 from rasa_core.channels import UserMessage
 from rasa_core.domain import TemplateDomain
@@ -21,6 +28,8 @@ from rasa_core.policies.augmented_memoization import \
     AugmentedMemoizationPolicy
 from rasa_core.policies.sklearn_policy import SklearnPolicy
 from rasa_core.policies.fallback import FallbackPolicy
+from rasa_core.policies.ensemble import SimplePolicyEnsemble
+from rasa_core.policies.conversation_cache import ConversationCache
 from rasa_core.trackers import DialogueStateTracker
 from tests.conftest import DEFAULT_DOMAIN_PATH, DEFAULT_STORIES_FILE
 from rasa_core.featurizers import (
@@ -90,6 +99,18 @@ class PolicyTestCollection(object):
         assert max(probabilities) <= 1.0
         assert min(probabilities) >= 0.0
 
+    def test_batch_prediction(self, trained_policy, default_domain):
+        trackers = train_trackers(default_domain)
+        batch_probabilities = \
+            trained_policy.predict_batch_action_probabilities(trackers,
+                                                              default_domain)
+
+        assert len(batch_probabilities) == len(trackers)
+        for tracker, probabilities in zip(trackers, batch_probabilities):
+            single = trained_policy.predict_action_probabilities(
+                    tracker, default_domain)
+            assert np.allclose(probabilities, single)
+
     def test_persist_and_load_empty_policy(self, tmpdir):
         empty_policy = self.create_policy(None)
         empty_policy.persist(tmpdir.strpath)
@@ -103,6 +124,38 @@ class TestKerasPolicy(PolicyTestCollection):
         p = KerasPolicy(featurizer)
         return p
 
+    def test_train_on_streamed_batches(self, featurizer, default_domain):
+        policy = KerasPolicy(featurizer)
+        trackers = train_trackers(default_domain)
+        policy.train(trackers, default_domain, stream_training_data=True,
+                     batch_size=4, validation_split=0.2)
+
+        probabilities = policy.predict_action_probabilities(trackers[0],
+                                                            default_domain)
+        assert len(probabilities) == default_domain.num_actions
+
+    def test_stateful_prediction_matches_full_dialogue(self, default_domain):
+        policy = KerasPolicy(
+                FullDialogueTrackerFeaturizer(BinarySingleStateFeaturizer()),
+                stateful_prediction=True)
+        trackers = train_trackers(default_domain)
+        policy.train(trackers, default_domain)
+
+        tracker = max(trackers, key=lambda t: len(t.events))
+        partial = DialogueStateTracker("stateful",
+                                       default_domain.slots,
+                                       default_domain.topics,
+                                       default_domain.default_topic)
+        for event in tracker.events:
+            if isinstance(event, ActionExecuted):
+                # the rnn continues from the state of the previous turn
+                stateful = policy.predict_action_probabilities(
+                        partial, default_domain)
+                full = policy.predict_batch_action_probabilities(
+                        [partial], default_domain)[0]
+                assert np.allclose(stateful, full, atol=1e-5)
+            partial.update(event)
+
 
 class TestEmbeddingPolicy(PolicyTestCollection):
     @pytest.fixture(scope="module")
@@ -114,6 +167,47 @@ class TestEmbeddingPolicy(PolicyTestCollection):
         p = EmbeddingPolicy(featurizer)
         return p
 
+    def test_loads_frozen_prediction_graph(self, trained_policy, tmpdir):
+        trained_policy.persist(tmpdir.strpath)
+        assert os.path.exists(tmpdir.join(
+                "tensorflow_embedding_frozen.pb").strpath)
+
+        loaded = EmbeddingPolicy.load(tmpdir.strpath)
+        with loaded.graph.as_default():
+            # variables are frozen and training ops pruned
+            assert not tf.global_variables()
+            assert not [op for op in loaded.graph.get_operations()
+                        if op.type.startswith("Apply")]
+
+    def test_incremental_prediction_matches_full_dialogue(
+            self, trained_policy, default_domain):
+        tracker = max(train_trackers(default_domain),
+                      key=lambda t: len(t.events))
+        partial = DialogueStateTracker("incremental",
+                                       default_domain.slots,
+                                       default_domain.topics,
+                                       default_domain.default_topic)
+        for event in tracker.events:
+            if isinstance(event, ActionExecuted):
+                # the rnn continues from the state of the previous turn
+                incremental = trained_policy.predict_action_probabilities(
+                        partial, default_domain)
+                full = trained_policy.predict_batch_action_probabilities(
+                        [partial], default_domain)[0]
+                assert np.allclose(incremental, full, atol=1e-5)
+            partial.update(event)
+
+    def test_batches_are_bucketed_by_length(self, featurizer):
+        policy = EmbeddingPolicy(featurizer)
+        policy._load_params(batch_size=3, bucket_by_length=True)
+        true_length = np.array([5, 1, 3, 3, 2, 7, 1, 4])
+
+        batch_ids = policy._create_batch_ids(true_length)
+
+        assert sorted(np.concatenate(batch_ids)) == list(range(8))
+        lengths = sorted([sorted(true_length[ids]) for ids in batch_ids])
+        assert lengths == [[1, 1, 2], [3, 3, 4], [5, 7]]
+
 
 class TestFallbackPolicy(PolicyTestCollection):
     @pytest.fixture(scope="module")
@@ -170,6 +264,13 @@ class TestSklearnPolicy(PolicyTestCollection):
         with patch('rasa_core.policies.sklearn_policy.GridSearchCV') as gs:
             gs.best_estimator_ = 'mockmodel'
             gs.best_score_ = 0.123
+            gs.best_params_ = {}
+            gs.cv_results_ = {'params': [{}],
+                              'mean_fit_time': [0.1],
+                              'std_fit_time': [0.01],
+                              'mean_score_time': [0.02],
+                              'mean_test_score': [0.123],
+                              'split0_test_score': [0.123]}
             gs.return_value = gs  # for __init__
             yield gs
 
@@ -227,6 +328,28 @@ class TestSklearnPolicy(PolicyTestCollection):
         assert mock_search.call_args_list[0][1]['param_grid'] == param_grid
         assert policy.model == 'mockmodel'
 
+    def test_search_runs_in_parallel_and_is_reported(
+            self, default_domain, trackers, featurizer, tmpdir):
+        policy = self.create_policy(
+            featurizer=featurizer,
+            cv=2,
+            param_grid={'C': [0.1, 1.0]},
+            n_jobs=2
+        )
+        policy.train(trackers, domain=default_domain)
+        policy.persist(tmpdir.strpath)
+
+        with io.open(tmpdir.join('sklearn_search_report.json').strpath) as f:
+            report = json.load(f)
+        assert report['n_jobs'] == 2
+        assert report['best_params']['C'] in [0.1, 1.0]
+        assert len(report['candidates']) == 2
+        assert all(len(c['split_test_scores']) == 2
+                   for c in report['candidates'])
+
+        loaded = SklearnPolicy.load(tmpdir.strpath)
+        assert loaded.search_report == report
+
     def test_missing_classes_filled_correctly(
             self, default_domain, trackers, tracker, featurizer):
         # Pretend that a couple of classes are missing and check that
@@ -274,3 +397,121 @@ class TestSklearnPolicy(PolicyTestCollection):
         policy = self.create_policy(featurizer=featurizer, shuffle=False)
         # does not raise
         policy.train(trackers, domain=default_domain)
+
+    def test_sparse_features_give_same_predictions(
+            self, default_domain, trackers, tracker, featurizer):
+        dense = self.create_policy(featurizer=featurizer, shuffle=False)
+        dense.train(trackers, domain=default_domain)
+        sparse = self.create_policy(featurizer=featurizer, shuffle=False,
+                                    sparse=True)
+        sparse.train(trackers, domain=default_domain)
+
+        assert np.allclose(
+            dense.predict_action_probabilities(tracker, default_domain),
+            sparse.predict_action_probabilities(tracker, default_domain))
+
+    def test_sparse_training_data_is_cached(
+            self, default_domain, trackers, tracker, featurizer, tmpdir):
+        policy = self.create_policy(featurizer=featurizer, shuffle=False,
+                                    sparse=True)
+        policy.train(trackers, domain=default_domain,
+                     cache_dir=tmpdir.strpath)
+        cached = self.create_policy(featurizer=featurizer, shuffle=False,
+                                    sparse=True)
+        cached.train(trackers, domain=default_domain,
+                     cache_dir=tmpdir.strpath)
+
+        assert len(tmpdir.listdir()) == 1
+        assert tmpdir.listdir()[0].join("X.npz").check()
+        assert np.allclose(
+            policy.predict_action_probabilities(tracker, default_domain),
+            cached.predict_action_probabilities(tracker, default_domain))
+
+
+def test_ensemble_shares_featurized_history(default_domain):
+    trackers = train_trackers(default_domain)
+    ensemble = SimplePolicyEnsemble([
+        MemoizationPolicy(max_history=3),
+        AugmentedMemoizationPolicy(max_history=2)])
+    ensemble.train(trackers, default_domain)
+
+    ensemble.probabilities_using_best_policy(trackers[0], default_domain)
+    # both policies reuse the states computed by the ensemble
+    assert ensemble.num_shared_featurizations == 2
+
+
+@pytest.mark.parametrize("compressed", [True, False])
+def test_memoization_loads_legacy_lookup(default_domain, tmpdir, compressed):
+    trackers = train_trackers(default_domain)
+    policy = MemoizationPolicy(max_history=3)
+    policy.train(trackers, default_domain)
+    policy.persist(tmpdir.strpath)
+
+    # rewrite the lookup using the old json based feature keys
+    (all_states, all_actions) = policy.featurizer.training_states_and_actions(
+            trackers, default_domain)
+    legacy_lookup = {}
+    for states, actions in zip(all_states, all_actions):
+        feature_key = json.dumps(states, sort_keys=True).replace("\"", "")
+        if compressed:
+            feature_key = base64.b64encode(
+                    zlib.compress(feature_key.encode("utf-8"))).decode("utf-8")
+        assert MemoizationPolicy._parse_legacy_feature_key(
+                feature_key) == states
+        legacy_lookup[feature_key] = default_domain.index_for_action(
+                actions[0])
+    memorized_file = os.path.join(tmpdir.strpath, "memorized_turns.json")
+    with io.open(memorized_file, "w") as f:
+        f.write(json.dumps({"max_history": 3, "lookup": legacy_lookup}))
+
+    loaded = MemoizationPolicy.load(tmpdir.strpath)
+    for tracker in trackers:
+        assert (loaded.predict_action_probabilities(tracker, default_domain) ==
+                policy.predict_action_probabilities(tracker, default_domain))
+
+
+def test_augmented_memoization_recalls_partial_history(default_domain):
+    trackers = train_trackers(default_domain)
+    policy = AugmentedMemoizationPolicy(max_history=3)
+    policy.train(trackers, default_domain)
+
+    (all_states, all_actions) = policy.featurizer.training_states_and_actions(
+            trackers, default_domain)
+    for states, actions in zip(all_states, all_actions):
+        # a first turn that was never seen falls back to the recent turns
+        unseen_states = [{"intent_unseen": 1.0}] + states[1:]
+        recalled = policy._recall_states(unseen_states)
+        assert recalled == policy._recall_states([None] + states[1:])
+        assert recalled is not None
+
+
+def test_ensemble_predicts_batch_of_trackers(default_domain):
+    trackers = train_trackers(default_domain)
+    ensemble = SimplePolicyEnsemble([
+        MemoizationPolicy(max_history=3),
+        SklearnPolicy(MaxHistoryTrackerFeaturizer(
+                BinarySingleStateFeaturizer(), max_history=3))])
+    ensemble.train(trackers, default_domain)
+
+    predicted = ensemble.predict_next_actions(trackers, default_domain)
+    assert predicted == [ensemble.predict_next_action(t, default_domain)
+                         for t in trackers]
+
+
+def test_conversation_cache_evicts_least_recently_used():
+    cache = ConversationCache(max_size=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+
+
+def test_conversation_cache_expires_entries():
+    cache = ConversationCache(ttl=-1)
+    cache.set("a", 1)
+    assert cache.get("a") is None
+    assert len(cache) == 0
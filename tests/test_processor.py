@@ -3,9 +3,13 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import threading
+
 from rasa_core.channels import UserMessage
 from rasa_core.channels.direct import CollectingOutputChannel
 from rasa_core.dispatcher import Button
+from rasa_core.events import UserUttered
+from rasa_core.processor import PredictionRequest
 
 
 def test_message_processor(default_processor):
@@ -35,3 +39,77 @@ def test_logging_of_bot_utterances_on_tracker(default_processor,
     default_processor.log_bot_utterances_on_tracker(
             tracker, default_dispatcher_collecting)
     assert not default_dispatcher_collecting.latest_bot_messages
+
+
+def test_handle_prediction_requests(default_processor):
+    responses = default_processor.handle_prediction_requests([
+        PredictionRequest("batch_greet", text="/greet"),
+        PredictionRequest("batch_continue",
+                          executed_action="utter_greet"),
+        PredictionRequest("batch_invalid",
+                          executed_action="non_existent_action")])
+
+    assert responses[0]["next_action"] == "utter_greet"
+    assert responses[1]["next_action"] is not None
+    assert isinstance(responses[2], ValueError)
+
+    # a batch predicts the same actions as single requests
+    single = default_processor.continue_message_handling(
+            "batch_greet", "utter_greet", [])
+    batch = default_processor.handle_prediction_requests([
+        PredictionRequest("batch_greet_2", text="/greet")])[0]
+    assert batch["next_action"] == "utter_greet"
+    follow_up = default_processor.handle_prediction_requests([
+        PredictionRequest("batch_greet_2", executed_action="utter_greet")])[0]
+    assert follow_up["next_action"] == single["next_action"]
+
+
+def test_concurrent_messages_of_a_sender_are_kept(default_processor):
+    sender_id = "concurrent_sender"
+    threads = [threading.Thread(target=default_processor.handle_message,
+                                args=(UserMessage("/greet", None, sender_id),))
+               for _ in range(10)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    tracker = default_processor.tracker_store.retrieve(sender_id)
+    utterances = [e for e in tracker.events if isinstance(e, UserUttered)]
+    assert len(utterances) == 10
+    # locks of senders that aren't handled anymore are dropped
+    assert len(default_processor.tracker_store.sender_locks) == 0
+
+
+class StopListening(Exception):
+    pass
+
+
+class ListQueue(object):
+    def __init__(self, messages):
+        self.messages = list(messages)
+
+    def dequeue(self):
+        if not self.messages:
+            raise StopListening()
+        return self.messages.pop(0)
+
+
+def test_handle_channel_asynchronous_with_workers(default_processor):
+    messages = []
+    for i in range(3):
+        for sender_id in ["alice", "bob", "carol"]:
+            messages.append(UserMessage("/greet{{\"name\": \"{}\"}}"
+                                        "".format(i), None, sender_id))
+
+    try:
+        default_processor.handle_channel_asynchronous(ListQueue(messages),
+                                                      num_workers=3)
+    except StopListening:
+        pass
+
+    for sender_id in ["alice", "bob", "carol"]:
+        tracker = default_processor.tracker_store.retrieve(sender_id)
+        names = [e.entities[0]["value"] for e in tracker.events
+                 if isinstance(e, UserUttered)]
+        assert names == ["0", "1", "2"]
@@ -76,6 +76,14 @@ def test_version(app):
     assert content.get("version") == rasa_core.__version__
 
 
+@pytest.inlineCallbacks
+def test_status(app):
+    response = yield app.get("http://dummy/status")
+    content = yield response.json()
+    assert response.code == 200
+    assert content.get("status") == "ready"
+
+
 @freeze_time("2018-01-01")
 @pytest.inlineCallbacks
 def test_requesting_non_existent_tracker(app):
@@ -5,6 +5,7 @@ from __future__ import unicode_literals
 
 import glob
 import json
+import pickle
 
 import pytest
 
@@ -324,6 +325,152 @@ def test_traveling_back_in_time(default_domain):
     assert len(list(tracker.generate_all_prior_trackers())) == 2
 
 
+def test_past_states_are_updated_incrementally(default_domain):
+    tracker = DialogueStateTracker("default", default_domain.slots,
+                                   default_domain.topics,
+                                   default_domain.default_topic)
+
+    def replayed_states():
+        return [default_domain.get_active_states(tr)
+                for tr in tracker.generate_all_prior_trackers()]
+
+    intent = {"name": "greet", "confidence": 1.0}
+    tracker.update(ActionExecuted(ACTION_LISTEN_NAME))
+    assert tracker.past_states(default_domain) == replayed_states()
+
+    tracker.update(UserUttered("/greet", intent, []))
+    tracker.update(ActionExecuted("utter_greet"))
+    tracker.update(ActionExecuted(ACTION_LISTEN_NAME))
+    assert tracker.past_states(default_domain) == replayed_states()
+    assert len(tracker.past_states(default_domain)) == 4
+
+    tracker.update(ActionReverted())
+    assert tracker.past_states(default_domain) == replayed_states()
+    assert len(tracker.past_states(default_domain)) == 3
+
+    tracker.update(ActionExecuted(ACTION_LISTEN_NAME))
+    tracker.update(UserUttered("/goodbye", {"name": "goodbye"}, []))
+    tracker.update(UserUtteranceReverted())
+    assert tracker.past_states(default_domain) == replayed_states()
+
+    tracker.update(Restarted())
+    assert tracker.past_states(default_domain) == replayed_states()
+    assert len(tracker.past_states(default_domain)) == 1
+
+
+def test_past_states_are_shared_until_next_update(default_domain):
+    tracker = DialogueStateTracker("default", default_domain.slots,
+                                   default_domain.topics,
+                                   default_domain.default_topic)
+    tracker.update(ActionExecuted(ACTION_LISTEN_NAME))
+    tracker.update(UserUttered("/greet", {"name": "greet"}, []))
+
+    states = tracker.past_states(default_domain)
+    assert tracker.past_states(default_domain) == states
+    assert tracker.num_reused_states == 1
+
+    tracker.update(ActionExecuted("utter_greet"))
+    assert len(tracker.past_states(default_domain)) == len(states) + 1
+    assert tracker.num_reused_states == 1
+
+
+def test_past_states_hash_is_updated_incrementally(default_domain):
+    tracker = DialogueStateTracker("default", default_domain.slots,
+                                   default_domain.topics,
+                                   default_domain.default_topic)
+
+    def replayed_hash():
+        replayed = tracker.travel_back_in_time(float("inf"))
+        return replayed.past_states_hash(default_domain)
+
+    tracker.update(ActionExecuted(ACTION_LISTEN_NAME))
+    tracker.update(UserUttered("/greet", {"name": "greet"}, []))
+    greet_hash = tracker.past_states_hash(default_domain)
+    assert greet_hash == replayed_hash()
+
+    tracker.update(ActionExecuted("utter_greet"))
+    assert tracker.past_states_hash(default_domain) != greet_hash
+    assert tracker.past_states_hash(default_domain) == replayed_hash()
+
+    tracker.update(ActionReverted())
+    assert tracker.past_states_hash(default_domain) == greet_hash
+
+
+def test_applied_events_are_updated_incrementally(default_domain):
+    tracker = DialogueStateTracker("default", default_domain.slots,
+                                   default_domain.topics,
+                                   default_domain.default_topic)
+    listen = ActionExecuted(ACTION_LISTEN_NAME)
+    greet = UserUttered("/greet", {"name": "greet"}, [])
+    utter_greet = ActionExecuted("utter_greet")
+    for e in [listen, greet, utter_greet]:
+        tracker.update(e)
+    assert tracker.applied_events() == [listen, greet, utter_greet]
+
+    tracker.update(ActionReverted())
+    assert tracker.applied_events() == [listen, greet]
+
+    tracker.update(UserUtteranceReverted())
+    assert tracker.applied_events() == []
+
+    restart = Restarted()
+    goodbye = UserUttered("/goodbye", {"name": "goodbye"}, [])
+    for e in [restart, listen, goodbye]:
+        tracker.update(e)
+    assert tracker.applied_events() == [listen, goodbye]
+    assert tracker.idx_after_latest_restart() == 6
+    assert tracker.events_after_latest_restart() == [listen, goodbye]
+
+    # the returned events are a copy
+    tracker.applied_events().append(utter_greet)
+    assert tracker.applied_events() == [listen, goodbye]
+
+
+def test_copies_share_events(default_domain):
+    tracker = DialogueStateTracker("default", default_domain.slots,
+                                   default_domain.topics,
+                                   default_domain.default_topic)
+    listen = ActionExecuted(ACTION_LISTEN_NAME)
+    greet = UserUttered("/greet", {"name": "greet"}, [])
+    for e in [listen, greet]:
+        tracker.update(e)
+
+    copied = tracker.copy()
+    assert copied == tracker.travel_back_in_time(float("inf"))
+
+    utter_greet = ActionExecuted("utter_greet")
+    copied.update(utter_greet)
+    copied._set_slot(default_domain.slots[0].name, "copied")
+    utter_goodbye = ActionExecuted("utter_goodbye")
+    tracker.update(utter_goodbye)
+
+    assert list(tracker.events) == [listen, greet, utter_goodbye]
+    assert tracker.applied_events() == [listen, greet, utter_goodbye]
+    assert tracker.latest_action_name == "utter_goodbye"
+    assert tracker.get_slot(default_domain.slots[0].name) is None
+    assert list(copied.events) == [listen, greet, utter_greet]
+    assert copied.applied_events() == [listen, greet, utter_greet]
+    assert copied.latest_action_name == "utter_greet"
+    # both trackers still share the events they have in common
+    assert (tracker.events._latest.previous is
+            copied.events._latest.previous)
+
+
+def test_shared_list_keeps_newest_items():
+    items = utils.SharedList([1, 2, 3], maxlen=3)
+    copied = items.copy()
+    for i in range(4, 10):
+        items.append(i)
+    copied.append(0)
+    copied.pop()
+
+    assert items == [7, 8, 9]
+    assert items[0] == 7 and items[-1] == 9
+    assert list(reversed(items)) == [9, 8, 7]
+    assert copied == [2, 3]
+    assert pickle.loads(pickle.dumps(items)) == items
+
+
 def test_dump_and_restore_as_json(default_agent, tmpdir_factory):
     trackers = default_agent.load_data(DEFAULT_STORIES_FILE)
 
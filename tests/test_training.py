@@ -3,9 +3,17 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import numpy as np
+import scipy.sparse
+
+from rasa_core import training
+from rasa_core.events import SlotSet
+from rasa_core.featurizers import (
+    MaxHistoryTrackerFeaturizer, BinarySingleStateFeaturizer)
 from rasa_core.interpreter import RegexInterpreter
 from rasa_core.train import train_dialogue_model
 
+from rasa_core.training.cache import TrainingDataCache
 from rasa_core.training.dsl import StoryFileReader
 from rasa_core.training.visualization import visualize_stories
 from tests.conftest import DEFAULT_DOMAIN_PATH, DEFAULT_STORIES_FILE
@@ -51,3 +59,97 @@ def test_training_script(tmpdir):
                          nlu_model_path=None,
                          kwargs={})
     assert True
+
+
+def test_training_data_cache(default_domain, tmpdir):
+    trackers = training.load_data(DEFAULT_STORIES_FILE, default_domain,
+                                  cache_dir=tmpdir.strpath)
+    cached_trackers = training.load_data(DEFAULT_STORIES_FILE, default_domain,
+                                         cache_dir=tmpdir.strpath)
+
+    assert len(trackers) == len(cached_trackers)
+    for tracker, cached_tracker in zip(trackers, cached_trackers):
+        assert list(tracker.events) == list(cached_tracker.events)
+        assert tracker.current_state() == cached_tracker.current_state()
+
+    featurizer = MaxHistoryTrackerFeaturizer(BinarySingleStateFeaturizer(),
+                                             max_history=3)
+    data = TrainingDataCache(tmpdir.strpath).featurize_trackers(
+            featurizer, trackers, default_domain)
+
+    cached_featurizer = MaxHistoryTrackerFeaturizer(
+            BinarySingleStateFeaturizer(), max_history=3)
+    cached_data = TrainingDataCache(tmpdir.strpath).featurize_trackers(
+            cached_featurizer, cached_trackers, default_domain)
+
+    assert isinstance(cached_data.X, np.memmap)
+    assert np.all(data.X == cached_data.X)
+    assert np.all(data.y == cached_data.y)
+    assert (cached_featurizer.state_featurizer.num_features ==
+            featurizer.state_featurizer.num_features)
+
+
+def test_cached_trackers_match_generated_trackers_with_limit(default_domain,
+                                                             tmpdir):
+    trackers = training.load_data(DEFAULT_STORIES_FILE, default_domain,
+                                  tracker_limit=5,
+                                  cache_dir=tmpdir.strpath)
+    cached_trackers = training.load_data(DEFAULT_STORIES_FILE, default_domain,
+                                         tracker_limit=5,
+                                         cache_dir=tmpdir.strpath)
+
+    featurizer = MaxHistoryTrackerFeaturizer(BinarySingleStateFeaturizer(),
+                                             max_history=3)
+    for tracker, cached_tracker in zip(trackers, cached_trackers):
+        assert list(tracker.events) == list(cached_tracker.events)
+        assert tracker.events.maxlen == cached_tracker.events.maxlen
+        assert (featurizer.prediction_states([tracker], default_domain) ==
+                featurizer.prediction_states([cached_tracker],
+                                             default_domain))
+
+
+def test_sparse_training_data_cache(default_domain, tmpdir):
+    trackers = training.load_data(DEFAULT_STORIES_FILE, default_domain)
+
+    featurizer = MaxHistoryTrackerFeaturizer(BinarySingleStateFeaturizer(),
+                                             max_history=3)
+    data = TrainingDataCache(tmpdir.strpath).featurize_trackers(
+            featurizer, trackers, default_domain, sparse=True)
+
+    cached_featurizer = MaxHistoryTrackerFeaturizer(
+            BinarySingleStateFeaturizer(), max_history=3)
+    cached_data = TrainingDataCache(tmpdir.strpath).featurize_trackers(
+            cached_featurizer, trackers, default_domain, sparse=True)
+
+    assert scipy.sparse.issparse(cached_data.X)
+    assert (data.X != cached_data.X).nnz == 0
+    assert np.all(data.y == cached_data.y)
+
+
+def test_training_data_cache_with_non_json_slot_values(default_domain, tmpdir):
+    trackers = training.load_data(DEFAULT_STORIES_FILE, default_domain)
+
+    def with_slot_values():
+        tracker = trackers[0].copy()
+        tracker.update(SlotSet("name", {"rasa", "core", 3}))
+        tracker.update(SlotSet("name", np.float32(1.5)))
+        tracker.update(SlotSet("name", StoryFileReader))
+        return trackers + [tracker]
+
+    featurizer = MaxHistoryTrackerFeaturizer(BinarySingleStateFeaturizer(),
+                                             max_history=3)
+    key = TrainingDataCache.training_data_key(with_slot_values(),
+                                              default_domain, featurizer)
+    assert key == TrainingDataCache.training_data_key(with_slot_values(),
+                                                      default_domain,
+                                                      featurizer)
+
+    data = TrainingDataCache(tmpdir.strpath).featurize_trackers(
+            featurizer, with_slot_values(), default_domain)
+    cached_featurizer = MaxHistoryTrackerFeaturizer(
+            BinarySingleStateFeaturizer(), max_history=3)
+    cached_data = TrainingDataCache(tmpdir.strpath).featurize_trackers(
+            cached_featurizer, with_slot_values(), default_domain)
+
+    assert isinstance(cached_data.X, np.memmap)
+    assert np.all(data.X == cached_data.X)